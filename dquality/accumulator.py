@@ -64,9 +64,11 @@ import pyinotify
 from pyinotify import WatchManager
 from multiprocessing import Process, Queue
 import json
-import numpy as np
 import dquality.common.utilities as utils
+import dquality.common.framebuffer as framebuffer
+import dquality.common.transport as transport
 import dquality.handler as datahandler
+import dquality.data as dataver
 import dquality.common.report as report
 import dquality.common.constants as const
 from dquality.common.containers import Data
@@ -114,6 +116,9 @@ def init(config):
     consumers : dict
         a dictionary containing consumer processes to run, and their parameters
 
+    processing : Processing
+        parameters of frames processing, see utilities.get_processing
+
     """
     conf = utils.get_config(config)
     if conf is None:
@@ -155,7 +160,12 @@ def init(config):
         with open(consumersfile) as consumers_file:
             consumers = json.loads(consumers_file.read())
 
-    return logger, limits, quality_checks, extensions, report_type, consumers
+    processing = utils.get_processing(conf, logger)
+
+    # configure the hdf metadata cache and file pool
+    utils.init_hdf(conf, logger)
+
+    return logger, limits, quality_checks, extensions, report_type, consumers, processing
 
 
 def directory(directory, patterns):
@@ -247,7 +257,7 @@ def verify(conf, folder, data_type, num_files, report_by_files=True):
         a dictionary or list containing bad indexes
 
     """
-    logger, limits, quality_checks, extensions, report_type, consumers = init(conf)
+    logger, limits, quality_checks, extensions, report_type, consumers, processing = init(conf)
     if not os.path.isdir(folder):
         logger.error(
             'parameter error: directory ' +
@@ -259,9 +269,14 @@ def verify(conf, folder, data_type, num_files, report_by_files=True):
     interrupted = False
     file_list = []
     offset_list = []
-    dataq = Queue()
+    dataq = transport.get_data_queue()
     aggregateq = Queue()
-    p = Process(target=datahandler.handle_data, args=(dataq, limits, aggregateq, quality_checks, consumers))
+    frame_buffer = None
+    if processing.frame_buffer_slots is not None:
+        frame_buffer = framebuffer.FrameBuffer(processing.frame_buffer_slots)
+    p = Process(target=datahandler.handle_data, args=(dataq, limits, aggregateq, quality_checks, None, consumers, None,
+                                                      processing.num_workers, frame_buffer,
+                                                      processing.reorder_window))
     p.start()
 
     file_index = 0
@@ -287,14 +302,21 @@ def verify(conf, folder, data_type, num_files, report_by_files=True):
             else:
                 if file_index == 0:
                     report_file = file.rsplit(".",)[0] + '.report'
-                fp, tags = utils.get_data_hdf(file)
-                data_tag = tags['/exchange/'+data_type]
-                data = np.asarray(fp[data_tag])
-                slice_index += data.shape[0]
-                file_list.append(file)
-                offset_list.append(slice_index)
-                for i in range(0, data.shape[0]):
-                    dataq.put(Data(const.DATA_STATUS_DATA, data[i], data_type))
+                with utils.get_data_hdf(file) as (fp, tags):
+                    data_tag = tags['/exchange/'+data_type]
+                    dt = fp[data_tag]
+                    num_frames = dt.shape[0]
+                    slice_index += num_frames
+                    file_list.append(file)
+                    offset_list.append(slice_index)
+                    # the frames are passed on before the next read, unless the queue pickles them in a background
+                    # thread
+                    read = utils.get_hdf_reader(dt, not transport.is_supported())
+                    frames = dataver.get_data_items(read, num_frames, data_type, processing.batch_size)
+                    for frame in frames:
+                        if frame_buffer is not None:
+                            frame_buffer.put(frame)
+                        dataq.put(frame)
                 file_index += 1
                 if file_index == num_files:
                     dataq.put(Data(const.DATA_STATUS_END))
@@ -303,6 +325,8 @@ def verify(conf, folder, data_type, num_files, report_by_files=True):
                     break
 
     aggregate = aggregateq.get()
+    if frame_buffer is not None:
+        frame_buffer.close(True)
 
     #report.report_results(logger, aggregate, data_type, None, report_file, report_type)
 
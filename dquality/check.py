@@ -51,6 +51,7 @@ To use Please make sure the installation :ref:`pre-requisite-reference-label` ar
 
 """
 
+import os
 import json
 import dquality.hdf as dqhdf
 import dquality.data as dqdata
@@ -59,6 +60,7 @@ import dquality.accumulator as acc
 import dquality.monitor as dqdmonitor
 import dquality.monitor_polling as dqpolmonitor
 import dquality.pv as dqpv
+from dquality.common.hdfindex import HdfIndex
 
 __author__ = "Barbara Frosik"
 __copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
@@ -68,7 +70,10 @@ __all__ = ['hdf',
            'monitor',
            'accumulator',
            'data',
-           'hdf_dependency']
+           'data_batch',
+           'reevaluate',
+           'hdf_dependency',
+           'hdf_all']
 
 def hdf(conf, fname):
     """
@@ -223,6 +228,56 @@ def data(conf, fname):
     return bad_indexes
 
 
+def data_batch(conf, files, workers=None):
+    """
+    Data Quality verifier of many files, verifying the files concurrently.
+
+    Parameters
+    ----------
+    conf : str
+        name of the configuration file including path
+
+    files : str or list
+        a file name or glob pattern, or a list of file names or glob patterns
+
+    workers : int
+        number of files verified at the same time, defaulted to None, meaning number of cpus
+
+    Returns
+    -------
+    bad_indexes : Dict
+        bad indexes dictionaries keyed by file name
+    """
+
+    if workers is not None:
+        workers = int(workers)
+    bad_indexes = dqdata.verify_files(conf, files, workers)
+    print (json.dumps(bad_indexes))
+    return bad_indexes
+
+
+def reevaluate(conf, fname):
+    """
+    Data Quality evaluator of results saved by the data verifier, against the configured limits.
+
+    Parameters
+    ----------
+    conf : str
+        name of the configuration file including path
+
+    fname : str
+        results file name, saved by the data verifier
+
+    Returns
+    -------
+    bad_indexes : Dict
+    """
+
+    bad_indexes = dqdata.reevaluate(conf, fname)
+    print (json.dumps(bad_indexes))
+    return bad_indexes
+
+
 def hdf_dependency(conf, fname):
     """
     Dependency verifier.
@@ -247,4 +302,39 @@ def hdf_dependency(conf, fname):
         print ('Some dependecies are not satisfied, see log file')
 
 
+def hdf_all(conf, fname):
+    """
+    HDF file structure and dependency verifier.
+
+    The structure, or tags, and the dependencies configured in the configuration file are verified against one index of
+    the file, built here and passed to both verifiers, so each data set metadata is read once. The looked up data sets
+    are added to the metadata cache.
+
+    Parameters
+    ----------
+    conf : str
+        configuration file name, including path
 
+    file : str
+        File Name to verify including path
+
+    Returns
+    -------
+    boolean
+
+    """
+
+    index = None
+    if os.path.isfile(fname):
+        index = HdfIndex(fname)
+    structure_res = dqhdf.verify(conf, fname, index)
+    if structure_res:
+        print ('All tags exist and meet conditions')
+    else:
+        print ('Some of the tags do not exist or do not meet conditions, check log file')
+    dependency_res = dqdependency.verify(conf, fname, index)
+    if dependency_res:
+        print ('All dependecies are satisfied')
+    else:
+        print ('Some dependecies are not satisfied, see log file')
+    return bool(structure_res) and dependency_res
@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright (c) 2016, UChicago Argonne, LLC. All rights reserved.         #
+#                                                                         #
+# Copyright 2016. UChicago Argonne, LLC. This software was produced       #
+# under U.S. Government contract DE-AC02-06CH11357 for Argonne National   #
+# Laboratory (ANL), which is operated by UChicago Argonne, LLC for the    #
+# U.S. Department of Energy. The U.S. Government has rights to use,       #
+# reproduce, and distribute this software.  NEITHER THE GOVERNMENT NOR    #
+# UChicago Argonne, LLC MAKES ANY WARRANTY, EXPRESS OR IMPLIED, OR        #
+# ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  If software is     #
+# modified to produce derivative works, such modified software should     #
+# be clearly marked, so as not to confuse it with the version available   #
+# from ANL.                                                               #
+#                                                                         #
+# Additionally, redistribution and use in source and binary forms, with   #
+# or without modification, are permitted provided that the following      #
+# conditions are met:                                                     #
+#                                                                         #
+#     * Redistributions of source code must retain the above copyright    #
+#       notice, this list of conditions and the following disclaimer.     #
+#                                                                         #
+#     * Redistributions in binary form must reproduce the above copyright #
+#       notice, this list of conditions and the following disclaimer in   #
+#       the documentation and/or other materials provided with the        #
+#       distribution.                                                     #
+#                                                                         #
+#     * Neither the name of UChicago Argonne, LLC, Argonne National       #
+#       Laboratory, ANL, the U.S. Government, nor the names of its        #
+#       contributors may be used to endorse or promote products derived   #
+#       from this software without specific prior written permission.     #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY UChicago Argonne, LLC AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS       #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL UChicago     #
+# Argonne, LLC OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,        #
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,    #
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;        #
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER        #
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT      #
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN       #
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE         #
+# POSSIBILITY OF SUCH DAMAGE.                                             #
+# #########################################################################
+
+"""
+This file contains a persistent cache of verification results, and a cache of hdf file metadata.
+
+The cache is a sqlite database in a configured directory. The entries are keyed by the file path, size and
+modification time, and by the verification configuration. Each entry holds the limits the file was verified with, the
+bad indexes, and the values of the basic quality checks of each frame, so the file can be evaluated against changed
+limits without reading the data.
+
+The metadata cache keeps indexes of hdf files, keyed by the file path, size and modification time, in memory with the
+least recently used entries evicted. If a cache directory is set, the indexes are also stored in the cache database,
+so they are reused by following runs. The indexes are stored as JSON documents, so loading the cache does not execute
+any code.
+
+"""
+
+import os
+import json
+import sqlite3
+from collections import OrderedDict
+import numpy as np
+
+__author__ = "Barbara Frosik"
+__copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
+__docformat__ = 'restructuredtext en'
+__all__ = ['get_key',
+           'ResultsCache',
+           'MetadataCache']
+
+# name of the cache database file in the cache directory
+CACHE_FILE = 'dquality_cache.db'
+
+# number of file indexes kept in memory by the metadata cache
+METADATA_CACHE_SIZE = 256
+
+
+def get_key(file):
+    """
+    This function returns the file identity: absolute path, size, and modification time.
+    """
+    stat = os.stat(file)
+    return os.path.abspath(file), stat.st_size, stat.st_mtime
+
+
+class ResultsCache:
+    """
+    This class is a persistent cache of verification results.
+
+    """
+
+    def __init__(self, cache_dir):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        cache_dir : str
+            a directory where the cache database is located
+        """
+        self.connection = sqlite3.connect(os.path.join(cache_dir, CACHE_FILE), timeout=60)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT, size INTEGER, '
+                                'mtime REAL, config TEXT, limits TEXT, bad_indexes TEXT, '
+                                'UNIQUE (path, size, mtime, config))')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS results (file_id INTEGER, type TEXT, idx BLOB, '
+                                'checks BLOB, vals BLOB)')
+        self.connection.commit()
+
+    def get_key(self, file):
+        """
+        This function returns the file identity: absolute path, size, and modification time.
+        """
+        return get_key(file)
+
+    def get(self, file, config):
+        """
+        This function finds the cache entry of the file verified with the given configuration.
+
+        Parameters
+        ----------
+        file : str
+            a file name including path
+
+        config : str
+            the verification configuration, other than limits, serialized
+
+        Returns
+        -------
+        id : int
+            the entry id, or None if the file is not cached
+
+        limits : dict
+            the limits the file was verified with
+
+        bad_indexes : dict
+            the bad indexes of the file
+        """
+        path, size, mtime = self.get_key(file)
+        row = self.connection.execute('SELECT id, limits, bad_indexes FROM files WHERE path=? AND size=? AND mtime=? '
+                                      'AND config=?', (path, size, mtime, config)).fetchone()
+        if row is None:
+            return None, None, None
+        return row[0], json.loads(row[1]), json.loads(row[2])
+
+    def get_results(self, id):
+        """
+        This function returns the stored values of the basic quality checks.
+
+        Parameters
+        ----------
+        id : int
+            the entry id
+
+        Returns
+        -------
+        results : dict
+            a dictionary keyed by data type of tuples of arrays: frame index, quality check id and value of each result
+        """
+        results = {}
+        for type, index, check, value in self.connection.execute('SELECT type, idx, checks, vals FROM results '
+                                                                 'WHERE file_id=?', (id,)):
+            results[type] = (np.frombuffer(index, 'int64'), np.frombuffer(check, 'int16'),
+                             np.frombuffer(value, 'float64'))
+        return results
+
+    def update(self, id, limits, bad_indexes):
+        """
+        This function replaces the limits and bad indexes of the entry, after the results were evaluated against
+        changed limits.
+
+        Parameters
+        ----------
+        id : int
+            the entry id
+
+        limits : dict
+            the limits
+
+        bad_indexes : dict
+            the bad indexes
+        """
+        self.connection.execute('UPDATE files SET limits=?, bad_indexes=? WHERE id=?',
+                                (json.dumps(limits), json.dumps(bad_indexes), id))
+        self.connection.commit()
+
+    def add(self, file, config, limits, bad_indexes, aggregates):
+        """
+        This function adds an entry for the verified file.
+
+        Parameters
+        ----------
+        file : str
+            a file name including path
+
+        config : str
+            the verification configuration, other than limits, serialized
+
+        limits : dict
+            the limits
+
+        bad_indexes : dict
+            the bad indexes
+
+        aggregates : dict <data_type : ResultsStore>
+            dictionary with stores holding result values keyed by data type
+        """
+        path, size, mtime = self.get_key(file)
+        with self.connection:
+            # the entries of previous versions of the file are replaced
+            self.connection.execute('DELETE FROM results WHERE file_id IN (SELECT id FROM files WHERE path=? AND '
+                                    'config=?)', (path, config))
+            self.connection.execute('DELETE FROM files WHERE path=? AND config=?', (path, config))
+            cursor = self.connection.execute('INSERT INTO files (path, size, mtime, config, limits, bad_indexes) '
+                                             'VALUES (?, ?, ?, ?, ?, ?)',
+                                             (path, size, mtime, config, json.dumps(limits), json.dumps(bad_indexes)))
+            id = cursor.lastrowid
+            for type in aggregates:
+                index, check, value, error = aggregates[type].get_rows()
+                self.connection.execute('INSERT INTO results VALUES (?, ?, ?, ?, ?)',
+                                        (id, type, index.astype('int64').tobytes(), check.astype('int16').tobytes(),
+                                         value.astype('float64').tobytes()))
+
+    def close(self):
+        """
+        This function closes the cache database.
+        """
+        self.connection.close()
+
+
+class MetadataCache:
+    """
+    This class is a cache of hdf file indexes.
+
+    The stored index is converted to a dictionary of plain values by its to_dict function, and created from the
+    dictionary by the load function given to the cache.
+    """
+
+    def __init__(self, load, size=METADATA_CACHE_SIZE):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        load : function
+            a function creating an index from the dictionary returned by the index to_dict function
+
+        size : int
+            maximum number of indexes kept in memory
+        """
+        self.load = load
+        self.size = size
+        self.entries = OrderedDict()
+        self.connection = None
+        self.cache_dir = None
+
+    def set_dir(self, cache_dir):
+        """
+        This function sets the directory where the indexes are stored. Storing is disabled if the directory is None.
+
+        Parameters
+        ----------
+        cache_dir : str
+            a directory where the cache database is located
+        """
+        if cache_dir == self.cache_dir:
+            return
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            self.connection = sqlite3.connect(os.path.join(cache_dir, CACHE_FILE), timeout=60)
+            self.connection.execute('CREATE TABLE IF NOT EXISTS metadata (path TEXT PRIMARY KEY, size INTEGER, '
+                                    'mtime REAL, idx TEXT)')
+            self.connection.commit()
+
+    def get(self, file):
+        """
+        This function returns the cached index of the file.
+
+        Parameters
+        ----------
+        file : str
+            a file name including path
+
+        Returns
+        -------
+        index : HdfIndex
+            the index of the file, or None if the file is not cached
+        """
+        key = get_key(file)
+        index = self.entries.get(key)
+        if index is not None:
+            # the entry is moved to the end, python 2 OrderedDict has no move_to_end
+            self.entries[key] = self.entries.pop(key)
+            return index
+        if self.connection is not None:
+            row = self.connection.execute('SELECT idx FROM metadata WHERE path=? AND size=? AND mtime=?',
+                                          key).fetchone()
+            if row is not None:
+                try:
+                    index = self.load(json.loads(row[0]))
+                except (ValueError, KeyError, TypeError):
+                    # the entry was stored in another format, and is replaced when the file is indexed
+                    return None
+                self.add_entry(key, index)
+        return index
+
+    def add_entry(self, key, index):
+        """
+        This function adds the index to the memory, evicting the least recently used index if the cache is full.
+        """
+        self.entries.pop(key, None)
+        self.entries[key] = index
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def put(self, file, index):
+        """
+        This function adds, or replaces the index of the file.
+
+        Parameters
+        ----------
+        file : str
+            a file name including path
+
+        index : HdfIndex
+            the index of the file
+        """
+        key = get_key(file)
+        self.add_entry(key, index)
+        if self.connection is not None:
+            try:
+                stored = json.dumps(index.to_dict())
+            except ValueError:
+                # the index has values that cannot be stored without pickling, so it is kept in memory only
+                return
+            with self.connection:
+                # the index of a previous version of the file is replaced
+                self.connection.execute('INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?)', key + (stored,))
@@ -1,3 +1,4 @@
+QUALITYCHECK_ERROR = 0
 QUALITYCHECK_MEAN = 1
 QUALITYCHECK_STD = 2
 QUALITYCHECK_SAT = 3
@@ -10,6 +11,7 @@ ACC_SAT = 101
 
 QUALITYERROR_LOW = -1
 QUALITYERROR_HIGH = -2
+QUALITYERROR_CHECK = -3
 NO_ERROR = 0
 
 FILE_TYPE_HDF = 'FILE_TYPE_HDF'
@@ -26,8 +28,10 @@ FEEDBACK_PV = 'pv'
 DATA_STATUS_DATA = 0
 DATA_STATUS_MISSING = 1
 DATA_STATUS_END = 2
+DATA_STATUS_BATCH = 3
 
 mapper = {
+    'QUALITYCHECK_ERROR' : 0,
     'QUALITYCHECK_MEAN' : 1,
     'QUALITYCHECK_STD' : 2,
     'QUALITYCHECK_SAT' : 3,
@@ -40,6 +44,7 @@ mapper = {
 
     'QUALITYERROR_LOW' : -1,
     'QUALITYERROR_HIGH' : -2,
+    'QUALITYERROR_CHECK' : -3,
     'NO_ERROR' : 0,
 }
 
@@ -47,7 +52,8 @@ def get_id(name):
     return mapper[name]
 
 def to_string(qualitycheck):
-    qc_map = {1:'mean',
+    qc_map = {0:'check_error',
+              1:'mean',
               2:'st_dev',
               3:'saturation',
               4:'sum',
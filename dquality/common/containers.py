@@ -4,11 +4,16 @@ from multiprocessing import Process
 import importlib
 from os import path
 import sys
+import time
+from collections import deque
+import numpy as np
 import dquality.realtime.pv_feedback_driver as drv
 if sys.version[0] == '2':
     import thread as thread
+    import Queue as queue
 else:
     import _thread as thread
+    import queue as queue
 
 
 class Result:
@@ -16,6 +21,8 @@ class Result:
     This class is a container of result and parameters linked to the subject of the verification, and the
     verification type.
     """
+    __slots__ = ('res', 'quality_id', 'error', 'index', 'type')
+
     def __init__(self, res, quality_id, error):
         self.res = res
         self.quality_id = quality_id
@@ -27,6 +34,8 @@ class Results:
     This class is a container of results of all quality checks for a single frame, and attributes such as flag
     indicating if all quality checks passed, dat type, and index.
     """
+    __slots__ = ('type', 'index', 'failed', 'results')
+
     def __init__(self, type, index, failed, results):
         self.type = type
         self.index = index
@@ -39,21 +48,59 @@ class Results:
 class Data:
     """
     This class is a container of data.
+
+    If the frame is passed in a shared memory frame buffer, the slice is None and the slot field holds the slot
+    handle. Otherwise the slot is None.
+    If the status is batch, the slice is a stack of frames, with frame number as the first dimension.
+    The features field holds frame features calculated by the quality checks, or None if not calculated yet.
     """
     def __init__(self, status, slice=None, type=None, acq_time = None):
         self.status = status
-        if status == const.DATA_STATUS_DATA:
+        if status == const.DATA_STATUS_DATA or status == const.DATA_STATUS_BATCH:
             self.slice = slice
             self.type = type
+            self.slot = None
+            self.features = None
             if acq_time is not None:
                 self.acq_time = acq_time
 
 
+class Features:
+    """
+    This class is a container of frame features calculated in a single pass over the frame data.
+
+    The features are the number of pixels in a frame, and arrays with one element for each frame: sum and sum of
+    squares of the pixels intensities, minimum and maximum intensity, and number of pixels above saturation limit.
+    The saturation count is None if the saturation limit is not configured.
+    """
+    def __init__(self, num_pixels, sum, sumsq, min, max, sat):
+        self.num_pixels = num_pixels
+        self.sum = sum
+        self.sumsq = sumsq
+        self.min = min
+        self.max = max
+        self.sat = sat
+
+    def get_mean(self):
+        """
+        Returns mean intensity of each frame.
+        """
+        return self.sum / self.num_pixels
+
+    def get_std(self):
+        """
+        Returns standard deviation of intensity of each frame.
+        """
+        mean = self.get_mean()
+        variance = self.sumsq / self.num_pixels - mean * mean
+        return np.sqrt(np.maximum(variance, 0))
+
+
 class Feedback:
     """
     This class is a container of real-time feedback related information.
     """
-    def __init__(self, feedback_type, ):
+    def __init__(self, feedback_type, interval=None):
         """
         Constructor
 
@@ -61,8 +108,13 @@ class Feedback:
         ----------
         feedback_type : list
             a list of configured feedbac types. Possible options: console, log, and pv
+
+        interval : float
+            a time in seconds during which failed results are collected and reported together, or None if the
+            results are reported as soon as they are dequeued
         """
         self.feedback_type = feedback_type
+        self.interval = interval
 
     def set_feedback_pv(self, feedback_pvs, detector):
         """
@@ -101,7 +153,7 @@ class Feedback:
         """
         self.driver = driver
 
-    def write_to_pv(self, pv, index):
+    def write_to_pv(self, pv, index, count=1):
         """
         This function calls write method on driver field to update pv.
 
@@ -111,16 +163,48 @@ class Feedback:
             a name of the pv, contains information about the data type and quality check (i.e. data_white_mean)
         index : int
             index of failed frame
+        count : int
+            number of failed frames reported by this update
         """
-        self.driver.write(pv, index)
+        self.driver.write(pv, index, count)
+
+    def send_feedback(self, failed):
+        """
+        This function reports collected failed results to all feedback types that have been configured.
+
+        The failed results are reported once for each data type and quality check, with the number of failed frames
+        and the last failed result.
+
+        Parameters
+        ----------
+        failed : dict
+            a dictionary keyed by a tuple of data type and quality check id, with values being a list of the number
+            of failed frames and the last failed Result
+        """
+        for key in sorted(failed):
+            count, result = failed[key]
+            quality_check = const.to_string(result.quality_id)
+            if count == 1:
+                message = 'failed frame '+str(result.index)+ ' result of '+quality_check+ ' is '+ str(result.res)
+            else:
+                message = str(count) + ' failed frames of ' + result.type + ' ' + quality_check + \
+                          ', last failed frame ' + str(result.index) + ' result is ' + str(result.res)
+            if const.FEEDBACK_CONSOLE in self.feedback_type:
+                print (message)
+            if const.FEEDBACK_LOG in self.feedback_type:
+                self.logger.info(message)
+            if const.FEEDBACK_PV in self.feedback_type:
+                self.write_to_pv(result.type + '_' + quality_check, result.index, count)
 
     def quality_feedback(self, feedbackq):
         """
         This function provides feedback as defined by the feedback_type in a real time.
 
         If the feedback type contains pv type, this function creates server and initiates driver handling the feedback
-        pvs.It dequeues results from the 'feedbackq' queue and processes all feedback types that have been configured.
-        It will stop processing the queue when it dequeues data indicating end status.
+        pvs. It blocks on the 'feedbackq' queue, and dequeues all results that are available at once. The failed
+        results are collected for each data type and quality check, and reported together to all feedback types that
+        have been configured, when the interval since the last report elapsed, so a burst of failed frames results in
+        a single update. It will stop processing the queue when it dequeues data indicating end status.
 
         Parameters
         ----------
@@ -137,37 +221,353 @@ class Feedback:
             thread.start_new_thread(server.activate_pv, ())
             self.set_driver(driver)
 
+        failed = {}
+        last_sent = time.time()
         evaluating = True
         while evaluating:
-            while not feedbackq.empty():
-                try:
-                    result = feedbackq.get_nowait()
-                    if result == const.DATA_STATUS_END:
-                        evaluating = False
+            # block until results arrive, or until the collected results are due to be reported
+            timeout = None
+            if len(failed) > 0 and self.interval is not None:
+                timeout = max(0, last_sent + self.interval - time.time())
+            received = []
+            try:
+                received.append(feedbackq.get(timeout=timeout))
+                while not feedbackq.empty():
+                    received.append(feedbackq.get_nowait())
+            except queue.Empty:
+                pass
+
+            for result in received:
+                if result == const.DATA_STATUS_END:
+                    evaluating = False
+                else:
+                    key = (result.type, result.quality_id)
+                    if key in failed:
+                        failed[key][0] += 1
+                        failed[key][1] = result
                     else:
-                        if const.FEEDBACK_CONSOLE in self.feedback_type:
-                            print ('failed frame '+str(result.index)+ ' result of '+const.to_string(result.quality_id)+ ' is '+ str(result.res))
-                        if const.FEEDBACK_LOG in self.feedback_type:
-                            self.logger.info('failed frame '+str(result.index)+ ' result of '+const.to_string(result.quality_id)+ ' is '+ str(result.res))
-                        if const.FEEDBACK_PV in self.feedback_type:
-                            quality_check = const.to_string(result.quality_id)
-                            self.write_to_pv(result.type + '_' + quality_check, result.index)
-                except:
-                    pass
+                        failed[key] = [1, result]
+
+            if len(failed) > 0:
+                if not evaluating or self.interval is None or time.time() - last_sent >= self.interval:
+                    self.send_feedback(failed)
+                    failed = {}
+                    last_sent = time.time()
+
+
+class Statistics:
+    """
+    This class is a container of running statistics of results of one quality check.
+
+    The statistics are updated incrementally with each added value, so reading them takes constant time regardless
+    of how many values were added. The mean and variance are calculated with Welford's algorithm.
+    If the window size is given, the statistics additionally keep the last 'window' values in a ring, with running
+    sum and sum of squares updated on insert and evict. The window mean and variance follow a slow drift of the
+    values. The count, sum, min and max always relate to all added values.
+    """
+    def __init__(self, window=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        window : int
+            optional, number of the most recent values the window statistics are calculated from
+        """
+        self.count = 0
+        self.sum = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+        self.window = window
+        if window is not None:
+            self.ring = deque()
+            self.window_sum = 0.0
+            self.window_sumsq = 0.0
+            self.evicted = 0
+
+    def add(self, value):
+        """
+        This function updates the statistics with a new value.
+
+        Parameters
+        ----------
+        value : numeric
+            a result value
+
+        Returns
+        -------
+        none
+        """
+        self.count += 1
+        self.sum += value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+        if self.window is not None:
+            self.ring.append(value)
+            self.window_sum += value
+            self.window_sumsq += value * value
+            if len(self.ring) > self.window:
+                old = self.ring.popleft()
+                self.window_sum -= old
+                self.window_sumsq -= old * old
+                self.evicted += 1
+                # recalculate the sums once per window length, so the rounding errors do not accumulate
+                if self.evicted == self.window:
+                    self.window_sum = float(sum(self.ring))
+                    self.window_sumsq = float(sum(v * v for v in self.ring))
+                    self.evicted = 0
+
+    def get_mean(self):
+        """
+        Returns mean of the values in the window if the window is set, otherwise mean of all added values.
+        """
+        if self.window is not None and len(self.ring) > 0:
+            return self.window_sum / len(self.ring)
+        return self.mean
+
+    def get_variance(self):
+        """
+        Returns variance of the values in the window if the window is set, otherwise variance of all added values.
+        Returns 0 if less than two values were added.
+        """
+        if self.window is not None:
+            length = len(self.ring)
+            if length < 2:
+                return 0.0
+            mean = self.window_sum / length
+            return max(self.window_sumsq / length - mean * mean, 0.0)
+        if self.count < 2:
+            return 0.0
+        return self.m2 / self.count
+
+
+class ResultsStore:
+    """
+    This class is a columnar store of results of quality checks for one data type.
+
+    The results are kept in numpy arrays, with one row for each result of a quality check: frame index, quality check
+    id, result value, and error code. The arrays are preallocated and grow by doubling when full. The evaluated frames
+    and the frames that failed quality checks are marked in bitmaps, one bit per frame index.
+
+    If the window is set, the rows are retained for the last window frames that passed, and the last window frames
+    that failed quality checks. The rows of older frames are removed when the arrays are full. The bitmaps always mark
+    all frames.
+    """
+
+    def __init__(self, window=None, capacity=1024):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        window : int
+            number of the most recent good and bad frames the results are retained for, or None if all results are
+            retained
+
+        capacity : int
+            initial number of rows
+        """
+        self.window = window
+        self.size = 0
+        self.num_frames = 0
+        self.index = np.empty(capacity, dtype=np.int64)
+        self.check = np.empty(capacity, dtype=np.int16)
+        self.value = np.empty(capacity, dtype=np.float64)
+        self.error = np.empty(capacity, dtype=np.int8)
+        self.evaluated = np.zeros(capacity // 8 + 1, dtype=np.uint8)
+        self.failed = np.zeros(capacity // 8 + 1, dtype=np.uint8)
+        if window is not None:
+            self.good_order = deque()
+            self.bad_order = deque()
+
+    def __getstate__(self):
+        # only the filled part of the arrays is sent to another process
+        state = self.__dict__.copy()
+        for name in ('index', 'check', 'value', 'error'):
+            state[name] = state[name][:self.size].copy()
+        return state
+
+    def grow(self, size):
+        """
+        This function makes room for at least given number of rows.
+
+        If the window is set, the rows of frames that are not retained are removed first.
+
+        Parameters
+        ----------
+        size : int
+            required number of rows
+        """
+        if size <= len(self.index):
+            return
+        if self.window is not None:
+            self.compact()
+            if size <= len(self.index) // 2:
+                return
+        capacity = max(size, 2 * len(self.index))
+        for name in ('index', 'check', 'value', 'error'):
+            array = getattr(self, name)
+            grown = np.empty(capacity, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            setattr(self, name, grown)
+
+    def compact(self):
+        """
+        This function removes rows of frames that are outside of the window.
+        """
+        retained = np.array(list(self.good_order) + list(self.bad_order), dtype=np.int64)
+        keep = np.flatnonzero(np.isin(self.index[:self.size], retained))
+        for name in ('index', 'check', 'value', 'error'):
+            array = getattr(self, name)
+            array[:len(keep)] = array[keep]
+        self.size = len(keep)
+
+    def mark(self, index, failed):
+        """
+        This function marks the frame index as evaluated, and as failed if the frame failed quality checks.
+
+        Both bitmaps are grown together, so they always have equal length.
+        """
+        byte = index >> 3
+        if byte >= len(self.evaluated):
+            length = max(byte + 1, 2 * len(self.evaluated))
+            for name in ('evaluated', 'failed'):
+                bitmap = getattr(self, name)
+                grown = np.zeros(length, dtype=np.uint8)
+                grown[:len(bitmap)] = bitmap
+                setattr(self, name, grown)
+        bit = 1 << (index & 7)
+        self.evaluated[byte] |= bit
+        if failed:
+            self.failed[byte] |= bit
+
+    def add(self, results):
+        """
+        This function adds results of one frame.
+
+        Parameters
+        ----------
+        results : Results
+            a Results container that holds results for the frame
+        """
+        index = results.index
+        self.grow(self.size + len(results.results))
+        for result in results.results:
+            row = self.size
+            self.index[row] = index
+            self.check[row] = result.quality_id
+            self.value[row] = result.res
+            self.error[row] = result.error
+            self.size += 1
+        self.num_frames += 1
+        self.mark(index, results.failed)
+
+        if self.window is not None:
+            if results.failed:
+                order = self.bad_order
+            else:
+                order = self.good_order
+            order.append(index)
+            if len(order) > self.window:
+                order.popleft()
+
+    def get_bitmap(self, bitmap):
+        """
+        Returns the bitmap unpacked to an array of booleans indexed by frame index.
+        """
+        return np.unpackbits(bitmap, bitorder='little').astype(bool)
+
+    def get_bad_indexes(self):
+        """
+        Returns a sorted array of indexes of frames that failed quality checks.
+        """
+        return np.flatnonzero(self.get_bitmap(self.failed))
+
+    def get_good_indexes(self):
+        """
+        Returns a sorted array of indexes of frames that passed quality checks. If the window is set, only the
+        retained frames are returned.
+        """
+        if self.window is not None:
+            return np.array(sorted(self.good_order), dtype=np.int64)
+        return np.flatnonzero(self.get_bitmap(self.evaluated) & ~self.get_bitmap(self.failed))
+
+    def is_failed(self, indexes):
+        """
+        Returns an array of booleans, True for each given frame index that failed quality checks.
+        """
+        failed = self.get_bitmap(self.failed)
+        return failed[indexes]
+
+    def get_rows(self, indexes=None):
+        """
+        This function returns the result rows ordered by frame index and quality check id.
+
+        Parameters
+        ----------
+        indexes : ndarray
+            frame indexes the rows are returned for, or None for all retained rows
+
+        Returns
+        -------
+        index, check, value, error : ndarray
+            the columns of the selected rows
+        """
+        index = self.index[:self.size]
+        selected = np.arange(self.size)
+        if indexes is not None:
+            selected = selected[np.isin(index, indexes)]
+        order = selected[np.lexsort((self.check[selected], index[selected]))]
+        return index[order], self.check[order], self.value[order], self.error[order]
+
+    def get_values(self, check):
+        """
+        Returns an array of result values of the given quality check for the retained frames that passed quality
+        checks, in order the frames were added.
+
+        Parameters
+        ----------
+        check : int
+            a value indication quality check id
+
+        Returns
+        -------
+        values : ndarray
+            result values of the good frames
+        """
+        selected = np.flatnonzero(self.check[:self.size] == check)
+        selected = selected[~self.is_failed(self.index[selected])]
+        if self.window is not None:
+            selected = selected[np.isin(self.index[selected], list(self.good_order))]
+        return self.value[selected]
 
 
 class Aggregate:
     """
     This class is a container of results.
 
-    The results are organized in three dictionaries.
-    "bad_indexes": dictionary contains keys that are indexes of slices that not pass one or more quality checks.
-    The values are results organized in dictionaries, where the keays are quality check method index.
-    "good_indexes" is a similarly organized dictionary that contains indexes for which all quality checks passed.
-    "results": a dictionary keyed by quality check id and a value of list of all results for "good" indexes.
+    The results of all frames are kept in "store", a ResultsStore instance, that holds the results in columns, and
+    marks indexes of frames that did not pass one or more quality checks ("bad" indexes) and frames for which all
+    quality checks passed ("good" indexes).
+    "statistics": a dictionary keyed by quality check id and a value of Statistics instance, that keeps running
+    statistics of the "good" results, used by the statistical quality checks.
+
+    The aggregate_limit controls how much is retained. If it is -1, the results are not aggregated. If it is a
+    positive number, the statistical baseline is a window of the last aggregate_limit "good" results, and the store
+    retains the results of the last aggregate_limit "good" and "bad" frames, while all bad indexes are kept.
+    Otherwise everything is retained.
 
-    The class has locks, for each quality check type. The lock are used to access the results. One thread is adding
-    to the results, and another thread (statistical checks) are reading the stored data to do statistical calculations.
+    The class has a lock used to access the results. One thread is adding to the results, and another thread
+    (statistical checks) are reading the stored data to do statistical calculations.
 
     """
 
@@ -181,6 +581,8 @@ class Aggregate:
             data type related to the aggregate
         quality_checks : list
             a list of quality checks that apply for this data type
+        aggregate_limit : int
+            -1 if the results are not aggregated, a positive number defining size of window, or None if not limited
         feedbackq : Queue
             optional, if the real time feedback is requested, the queue will be used to pass results to the process
             responsible for delivering the feedback in areal time
@@ -188,15 +590,16 @@ class Aggregate:
         self.data_type = data_type
         self.feedbackq = feedbackq
         self.aggregate_limit = aggregate_limit
+        window = None
+        if aggregate_limit is not None and aggregate_limit > 0:
+            window = aggregate_limit
+        self.window = window
 
-        self.bad_indexes = {}
-        self.good_indexes = {}
-
-        self.results = {}
+        self.store = ResultsStore(window)
+        self.statistics = {}
         self.lock = Lock()
         for qc in quality_checks:
-            self.results[qc] = []
-
+            self.statistics[qc] = Statistics(window)
 
     def get_results(self, check):
         """
@@ -211,25 +614,42 @@ class Aggregate:
 
         Returns
         -------
-        res : list
-            a list containing results that passed the given quality check
+        res : ndarray
+            an array containing results that passed the given quality check
         """
         self.lock.acquire()
-        res = self.results[check]
+        res = self.store.get_values(check)
         self.lock.release()
         return res
 
 
+    def get_statistics(self, check):
+        """
+        This returns the running statistics of results of a given quality check.
+
+        Parameters
+        ----------
+        check : int
+            a value indication quality check id
+
+        Returns
+        -------
+        statistics : Statistics
+            a Statistics instance of results that passed the given quality check
+        """
+        return self.statistics[check]
+
+
     def add_result(self, result, check):
         """
-        This add a new result for a given quality check to results.
+        This updates the running statistics of a given quality check with a new result.
 
         This operation uses lock, as other process reads the results.
 
         Parameters
         ----------
-        result : Result
-            a result instance
+        result : float
+            a result value
 
         check : int
             a value indication quality check id
@@ -239,7 +659,7 @@ class Aggregate:
         none
         """
         self.lock.acquire()
-        self.results[check].append(result)
+        self.statistics[check].add(result)
         self.lock.release()
 
 
@@ -247,17 +667,14 @@ class Aggregate:
         """
         This handles all results for one frame.
 
-        If the flag indicates that at least one quality check failed the index will be added into 'bad_indexes'
-        dictionary, otherwise into 'good_indexes'. It also delivers the failed results to the feedback process
-        using the feedbackq, if real time feedback was requasted.
+        The results are added to the store, which marks the index as bad if the flag indicates that at least one
+        quality check failed, and as good otherwise. The results of good frames update the running statistics. It also
+        delivers the failed results to the feedback process using the feedbackq, if real time feedback was requasted.
 
         Parameters
         ----------
-        result : Result
-            a result instance
-
-        check : int
-            a value indication quality check id
+        results : Results
+            a Results container that holds results for the frame
 
         Returns
         -------
@@ -275,11 +692,12 @@ class Aggregate:
             if results.failed:
                 send_feedback()
         else:
+            self.lock.acquire()
+            self.store.add(results)
+            self.lock.release()
             if results.failed:
-                self.bad_indexes[results.index] = results.results
                 send_feedback()
             else:
-                self.good_indexes[results.index] = results.results
                 for result in results.results:
                     self.add_result(result.res, result.quality_id)
 
@@ -296,7 +714,123 @@ class Aggregate:
         -------
         True if empty, False otherwise
         """
-        return len(self.bad_indexes) == 0 and len(self.good_indexes) == 0
+        return self.store.num_frames == 0
+
+
+class ReorderBuffer:
+    """
+    This class delivers frames to consumers in order of frame indexes, as soon as results of the frames arrive.
+
+    The frames are kept in a dictionary keyed by frame index, and the index of the next frame to deliver is tracked.
+    When results of the next frame arrive, the frame and all following frames that have results are delivered. Missing
+    frames are delivered without results. If the window is set, a frame which results arrive more than window frames
+    ahead of the next frame to deliver is delivered right away, out of order, and skipped when its turn comes.
+    """
+
+    def __init__(self, consumers_q, frame_buffer=None, window=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        consumers_q : list
+            a list of Queues on which the frames are delivered to consumers
+
+        frame_buffer : FrameBuffer
+            a shared memory frame buffer, or None if frames are passed by value
+
+        window : int
+            a number of frames the delivered frame can be ahead of the oldest waiting frame, or None if the frames
+            are always delivered in order
+        """
+        self.consumers_q = consumers_q
+        self.frame_buffer = frame_buffer
+        self.window = window
+        self.frames = {}
+        self.failed = {}
+        self.sent = set()
+        self.next_index = 0
+
+    def send(self, data, failed=None):
+        """
+        This function delivers the frame to the consumers.
+
+        If the frame is in a shared memory slot, the consumers receive a copy of the frame, and the slot is released.
+
+        Parameters
+        ----------
+        data : Data
+            a Data instance to deliver
+
+        failed : boolean
+            True if the frame failed quality checks
+        """
+        if data.status == const.DATA_STATUS_DATA:
+            data.failed = failed
+            if data.slot is not None:
+                data.slice = np.array(self.frame_buffer.get(data))
+                self.frame_buffer.release(data)
+                data.slot = None
+        for consumerq in self.consumers_q:
+            consumerq.put(data)
+
+    def release(self):
+        """
+        This function delivers frames that are ready, starting from the next frame in order.
+        """
+        while True:
+            index = self.next_index
+            if index in self.failed:
+                self.send(self.frames.pop(index), self.failed.pop(index))
+            elif index in self.sent:
+                self.sent.remove(index)
+            else:
+                break
+            self.next_index += 1
+
+    def add_frame(self, data):
+        """
+        This function adds a frame waiting for results. The frame index is set in the Data instance.
+
+        Parameters
+        ----------
+        data : Data
+            a Data instance with index
+        """
+        self.frames[data.index] = data
+        if data.status == const.DATA_STATUS_MISSING:
+            self.failed[data.index] = None
+            self.release()
+
+    def add_results(self, results):
+        """
+        This function marks the frame with results as ready, and delivers all frames that are ready in order.
+
+        Parameters
+        ----------
+        results : Results
+            a Results container that holds results for the frame
+        """
+        index = results.index
+        if self.window is not None and index - self.next_index > self.window:
+            self.send(self.frames.pop(index), results.failed)
+            self.sent.add(index)
+        else:
+            self.failed[index] = results.failed
+            self.release()
+
+    def close(self, data):
+        """
+        This function delivers all remaining frames in order, followed by the end of data marker.
+
+        Parameters
+        ----------
+        data : Data
+            a Data instance with end status
+        """
+        for index in sorted(self.frames):
+            self.send(self.frames.pop(index), self.failed.pop(index, None))
+        self.send(data)
 
 
 class Consumer_adapter():
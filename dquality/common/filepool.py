@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright (c) 2016, UChicago Argonne, LLC. All rights reserved.         #
+#                                                                         #
+# Copyright 2016. UChicago Argonne, LLC. This software was produced       #
+# under U.S. Government contract DE-AC02-06CH11357 for Argonne National   #
+# Laboratory (ANL), which is operated by UChicago Argonne, LLC for the    #
+# U.S. Department of Energy. The U.S. Government has rights to use,       #
+# reproduce, and distribute this software.  NEITHER THE GOVERNMENT NOR    #
+# UChicago Argonne, LLC MAKES ANY WARRANTY, EXPRESS OR IMPLIED, OR        #
+# ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  If software is     #
+# modified to produce derivative works, such modified software should     #
+# be clearly marked, so as not to confuse it with the version available   #
+# from ANL.                                                               #
+#                                                                         #
+# Additionally, redistribution and use in source and binary forms, with   #
+# or without modification, are permitted provided that the following      #
+# conditions are met:                                                     #
+#                                                                         #
+#     * Redistributions of source code must retain the above copyright    #
+#       notice, this list of conditions and the following disclaimer.     #
+#                                                                         #
+#     * Redistributions in binary form must reproduce the above copyright #
+#       notice, this list of conditions and the following disclaimer in   #
+#       the documentation and/or other materials provided with the        #
+#       distribution.                                                     #
+#                                                                         #
+#     * Neither the name of UChicago Argonne, LLC, Argonne National       #
+#       Laboratory, ANL, the U.S. Government, nor the names of its        #
+#       contributors may be used to endorse or promote products derived   #
+#       from this software without specific prior written permission.     #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY UChicago Argonne, LLC AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS       #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL UChicago     #
+# Argonne, LLC OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,        #
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,    #
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;        #
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER        #
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT      #
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN       #
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE         #
+# POSSIBILITY OF SUCH DAMAGE.                                             #
+# #########################################################################
+
+"""
+This file contains a pool of open hdf files.
+
+The files are opened for reading and kept open, so repeated reads of the same file reuse the handle. The pool is
+bounded, and the least recently used files that are not in use are closed when the pool is full. A file is used
+within a context, and is released when the context exits. A file that changed since it was opened, i.e. has different
+size or modification time, is opened again.
+
+The files are opened without the hdf file locking, where the hdf library supports it. A file kept open by the pool
+would otherwise hold the lock, and a process writing the file, e.g. an acquisition appending data, would fail to open
+it. The trade-off is that nothing prevents a file from being written while it is read, in which case the read may see
+inconsistent data. The pool opens a changed file again the next time it is used, so the verification of a file that
+is written should be repeated after the writer closed it, or the file should be written and read in SWMR mode.
+
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import h5py
+
+__author__ = "Barbara Frosik"
+__copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
+__docformat__ = 'restructuredtext en'
+__all__ = ['FilePool',
+           'set_pool',
+           'open_file',
+           'close_files']
+
+# maximum number of open files kept in the pool
+FILE_POOL_SIZE = 16
+
+# the file locking can be disabled since h5py 3.5
+FILE_LOCKING_OPTION = h5py.version.version_tuple >= (3, 5)
+
+
+class FilePool:
+    """
+    This class is a bounded pool of hdf files open for reading.
+
+    """
+
+    def __init__(self, size=FILE_POOL_SIZE, chunk_cache_size=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        size : int
+            maximum number of files kept open when not in use
+
+        chunk_cache_size : int
+            size in bytes of the chunk cache of each data set in an open file; defaulted to None, meaning the hdf
+            library default
+        """
+        self.size = size
+        self.chunk_cache_size = chunk_cache_size
+        # open files keyed by path and open mode, each entry is a list of the file, its identity, and number of users
+        self.files = OrderedDict()
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def get_file(self, path, swmr):
+        """
+        This function opens the file.
+        """
+        kwargs = {}
+        if FILE_LOCKING_OPTION:
+            kwargs['locking'] = False
+        if self.chunk_cache_size is not None:
+            kwargs['rdcc_nbytes'] = self.chunk_cache_size
+        if swmr:
+            return h5py.File(path, 'r', libver='latest', swmr=True, **kwargs)
+        return h5py.File(path, 'r', **kwargs)
+
+    def acquire(self, file, swmr=False):
+        """
+        This function returns the open file, opening it if it is not in the pool, and marks it as used.
+
+        Parameters
+        ----------
+        file : str
+            a file name including path
+
+        swmr : bool
+            if True, the file is opened in SWMR read mode; defaulted to False
+
+        Returns
+        -------
+        file_h5 : h5py.File
+            the open file
+        """
+        path = os.path.abspath(file)
+        key = (path, swmr)
+        stat = os.stat(path)
+        # a file written in SWMR mode changes while open
+        identity = None if swmr else (stat.st_size, stat.st_mtime)
+        with self.lock:
+            if self.pid != os.getpid():
+                # the files were opened by the parent process, and cannot be used by this one
+                self.files = OrderedDict()
+                self.pid = os.getpid()
+            entry = self.files.get(key)
+            # a changed file is opened again, unless it is still in use
+            if entry is not None and entry[1] != identity and entry[2] == 0:
+                entry[0].close()
+                entry = None
+            if entry is None:
+                entry = [self.get_file(path, swmr), identity, 0]
+                self.files[key] = entry
+            entry[2] += 1
+            # the entry is moved to the end, python 2 OrderedDict has no move_to_end
+            self.files[key] = self.files.pop(key)
+            self.evict()
+            return entry[0]
+
+    def release(self, file_h5):
+        """
+        This function marks the file as not used by one user.
+
+        Parameters
+        ----------
+        file_h5 : h5py.File
+            the file returned by acquire function
+
+        Returns
+        -------
+        None
+        """
+        with self.lock:
+            for entry in self.files.values():
+                if entry[0] is file_h5:
+                    entry[2] -= 1
+                    break
+            self.evict()
+
+    def evict(self):
+        """
+        This function closes the least recently used files that are not in use, until the pool size is not exceeded.
+        """
+        for key in list(self.files.keys()):
+            if len(self.files) <= self.size:
+                break
+            entry = self.files[key]
+            if entry[2] == 0:
+                entry[0].close()
+                del self.files[key]
+
+    def close(self):
+        """
+        This function closes all files that are not in use.
+        """
+        with self.lock:
+            for key in list(self.files.keys()):
+                entry = self.files[key]
+                if entry[2] == 0:
+                    entry[0].close()
+                    del self.files[key]
+
+    @contextmanager
+    def open(self, file, swmr=False):
+        """
+        This function is a context manager that provides the open file, and releases it at the exit.
+
+        Parameters
+        ----------
+        file : str
+            a file name including path
+
+        swmr : bool
+            if True, the file is opened in SWMR read mode; defaulted to False
+
+        Returns
+        -------
+        file_h5 : h5py.File
+            the open file
+        """
+        file_h5 = self.acquire(file, swmr)
+        try:
+            yield file_h5
+        finally:
+            self.release(file_h5)
+
+
+# the pool shared by the verifiers
+file_pool = FilePool()
+
+
+def set_pool(size=FILE_POOL_SIZE, chunk_cache_size=None):
+    """
+    This function sets the size and the chunk cache size of the shared pool. If the chunk cache size changed, the
+    files that are not in use are closed, so they are opened again with the new chunk cache size.
+
+    Parameters
+    ----------
+    size : int
+        maximum number of files kept open when not in use
+
+    chunk_cache_size : int
+        size in bytes of the chunk cache of each data set in an open file; defaulted to None, meaning the hdf library
+        default
+
+    Returns
+    -------
+    None
+    """
+    if chunk_cache_size != file_pool.chunk_cache_size:
+        file_pool.close()
+        file_pool.chunk_cache_size = chunk_cache_size
+    with file_pool.lock:
+        file_pool.size = size
+        file_pool.evict()
+
+
+def open_file(file, swmr=False):
+    """
+    This function returns a context manager that provides the file open by the shared pool.
+
+    Parameters
+    ----------
+    file : str
+        a file name including path
+
+    swmr : bool
+        if True, the file is opened in SWMR read mode; defaulted to False
+
+    Returns
+    -------
+    context manager providing h5py.File
+    """
+    return file_pool.open(file, swmr)
+
+
+def close_files():
+    """
+    This function closes the files of the shared pool that are not in use.
+    """
+    file_pool.close()
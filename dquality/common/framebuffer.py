@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright (c) 2016, UChicago Argonne, LLC. All rights reserved.         #
+#                                                                         #
+# Copyright 2016. UChicago Argonne, LLC. This software was produced       #
+# under U.S. Government contract DE-AC02-06CH11357 for Argonne National   #
+# Laboratory (ANL), which is operated by UChicago Argonne, LLC for the    #
+# U.S. Department of Energy. The U.S. Government has rights to use,       #
+# reproduce, and distribute this software.  NEITHER THE GOVERNMENT NOR    #
+# UChicago Argonne, LLC MAKES ANY WARRANTY, EXPRESS OR IMPLIED, OR        #
+# ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  If software is     #
+# modified to produce derivative works, such modified software should     #
+# be clearly marked, so as not to confuse it with the version available   #
+# from ANL.                                                               #
+#                                                                         #
+# Additionally, redistribution and use in source and binary forms, with   #
+# or without modification, are permitted provided that the following      #
+# conditions are met:                                                     #
+#                                                                         #
+#     * Redistributions of source code must retain the above copyright    #
+#       notice, this list of conditions and the following disclaimer.     #
+#                                                                         #
+#     * Redistributions in binary form must reproduce the above copyright #
+#       notice, this list of conditions and the following disclaimer in   #
+#       the documentation and/or other materials provided with the        #
+#       distribution.                                                     #
+#                                                                         #
+#     * Neither the name of UChicago Argonne, LLC, Argonne National       #
+#       Laboratory, ANL, the U.S. Government, nor the names of its        #
+#       contributors may be used to endorse or promote products derived   #
+#       from this software without specific prior written permission.     #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY UChicago Argonne, LLC AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS       #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL UChicago     #
+# Argonne, LLC OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,        #
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,    #
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;        #
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER        #
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT      #
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN       #
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE         #
+# POSSIBILITY OF SUCH DAMAGE.                                             #
+# #########################################################################
+
+"""
+This file contains a ring buffer of frames in shared memory.
+
+The frames are copied once into preallocated slots of a shared memory segment, and only a slot handle with frame
+metadata travels between processes. Each slot has a reference count. The slot is returned to the free list when all
+holders released it.
+
+"""
+
+from multiprocessing import Queue, Array
+import numpy as np
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+    shared_memory = None
+
+__author__ = "Barbara Frosik"
+__copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
+__docformat__ = 'restructuredtext en'
+__all__ = ['is_supported',
+           'FrameBuffer']
+
+
+def is_supported():
+    """
+    Returns True if shared memory is supported by the python version, False otherwise.
+    """
+    return shared_memory is not None
+
+
+class FrameBuffer:
+    """
+    This class is a ring buffer of frame slots in shared memory.
+
+    The buffer is created by the producer of frames before the consuming processes are started, and is passed to
+    them as a process argument. The shared memory segment is allocated when the first frame is added, with the slot
+    size equal to the size of the first frame. Adding a frame blocks when all slots are in use, which throttles the
+    producer.
+    """
+
+    def __init__(self, num_slots):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        num_slots : int
+            number of frame slots
+        """
+        # start the resource tracker before the consuming processes are started, so they share it with the
+        # producer, and the segment is not destroyed when a consuming process exits
+        resource_tracker.ensure_running()
+        self.num_slots = num_slots
+        self.refs = Array('i', num_slots)
+        self.freeq = Queue()
+        for slot in range(num_slots):
+            self.freeq.put(slot)
+        self.name = None
+        self.slot_size = 0
+        self.shm = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # the consuming processes attach to the segment by name
+        state['shm'] = None
+        return state
+
+    def attach(self):
+        """
+        This function attaches to the shared memory segment, if not attached yet.
+        """
+        if self.shm is None:
+            self.shm = shared_memory.SharedMemory(name=self.name)
+
+    def put(self, data, refs=1):
+        """
+        This function copies the frame of the given Data instance into a free slot.
+
+        The function blocks until a slot is free. The frame is replaced in the Data instance by a slot handle. If the
+        frame does not fit into a slot, the Data instance is not changed and the frame will be passed by value.
+
+        Parameters
+        ----------
+        data : Data
+            a Data instance holding a frame
+
+        refs : int
+            initial reference count of the slot
+
+        Returns
+        -------
+        none
+        """
+        frame = np.ascontiguousarray(data.slice)
+        if self.shm is None:
+            self.slot_size = frame.nbytes
+            self.shm = shared_memory.SharedMemory(create=True, size=self.slot_size * self.num_slots)
+            self.name = self.shm.name
+        if frame.nbytes > self.slot_size:
+            return
+
+        slot = self.freeq.get()
+        self.refs[slot] = refs
+        view = np.ndarray(frame.shape, frame.dtype, self.shm.buf, slot * self.slot_size)
+        view[...] = frame
+        data.slot = slot
+        data.name = self.name
+        data.slot_size = self.slot_size
+        data.shape = frame.shape
+        data.dtype = frame.dtype.str
+        data.slice = None
+
+    def get(self, data):
+        """
+        This function returns the frame of the given Data instance as a view of the shared memory slot.
+
+        Parameters
+        ----------
+        data : Data
+            a Data instance holding a slot handle
+
+        Returns
+        -------
+        frame : ndarray
+            the frame data; valid until the slot is released
+        """
+        if self.name is None:
+            self.name = data.name
+            self.slot_size = data.slot_size
+        self.attach()
+        return np.ndarray(data.shape, np.dtype(data.dtype), self.shm.buf, data.slot * self.slot_size)
+
+    def retain(self, data):
+        """
+        This function increments the reference count of the slot of the given Data instance.
+        """
+        with self.refs.get_lock():
+            self.refs[data.slot] += 1
+
+    def release(self, data):
+        """
+        This function decrements the reference count of the slot of the given Data instance.
+
+        When the count reaches zero the slot is returned to the free list.
+        """
+        with self.refs.get_lock():
+            self.refs[data.slot] -= 1
+            free = self.refs[data.slot] == 0
+        if free:
+            self.freeq.put(data.slot)
+
+    def close(self, unlink=False):
+        """
+        This function closes the shared memory segment in this process, and optionally destroys it.
+
+        Parameters
+        ----------
+        unlink : boolean
+            if True, the segment is destroyed; should be called by the producer after all processes finished
+        """
+        if self.shm is not None:
+            self.shm.close()
+            if unlink:
+                self.shm.unlink()
+            self.shm = None
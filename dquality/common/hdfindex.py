@@ -0,0 +1,554 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright (c) 2016, UChicago Argonne, LLC. All rights reserved.         #
+#                                                                         #
+# Copyright 2016. UChicago Argonne, LLC. This software was produced       #
+# under U.S. Government contract DE-AC02-06CH11357 for Argonne National   #
+# Laboratory (ANL), which is operated by UChicago Argonne, LLC for the    #
+# U.S. Department of Energy. The U.S. Government has rights to use,       #
+# reproduce, and distribute this software.  NEITHER THE GOVERNMENT NOR    #
+# UChicago Argonne, LLC MAKES ANY WARRANTY, EXPRESS OR IMPLIED, OR        #
+# ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  If software is     #
+# modified to produce derivative works, such modified software should     #
+# be clearly marked, so as not to confuse it with the version available   #
+# from ANL.                                                               #
+#                                                                         #
+# Additionally, redistribution and use in source and binary forms, with   #
+# or without modification, are permitted provided that the following      #
+# conditions are met:                                                     #
+#                                                                         #
+#     * Redistributions of source code must retain the above copyright    #
+#       notice, this list of conditions and the following disclaimer.     #
+#                                                                         #
+#     * Redistributions in binary form must reproduce the above copyright #
+#       notice, this list of conditions and the following disclaimer in   #
+#       the documentation and/or other materials provided with the        #
+#       distribution.                                                     #
+#                                                                         #
+#     * Neither the name of UChicago Argonne, LLC, Argonne National       #
+#       Laboratory, ANL, the U.S. Government, nor the names of its        #
+#       contributors may be used to endorse or promote products derived   #
+#       from this software without specific prior written permission.     #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY UChicago Argonne, LLC AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS       #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL UChicago     #
+# Argonne, LLC OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,        #
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,    #
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;        #
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER        #
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT      #
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN       #
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE         #
+# POSSIBILITY OF SUCH DAMAGE.                                             #
+# #########################################################################
+
+"""
+This file contains an index of hdf file metadata.
+
+The name, shape, dtype, chunks, compression and attributes of each data set are kept in the index, together with
+values of small data sets. The structure, tags and dependency verifiers evaluate their rules against the index, so the
+file metadata is read once for all of them.
+
+The verifiers request the data sets named in their schemas. The requested paths are compiled into a lookup plan, a
+prefix tree of path components, and only the requested objects are opened. A missing group resolves all paths below it
+as missing, without further lookups. So the cost of verification scales with the schema size, not the file size.
+
+The indexes are kept in a metadata cache, keyed by the file path, size and modification time, so the verifiers
+checking the same file again do not read its metadata. The stored indexes hold plain values: the dtype is kept as its
+array protocol description, and the attributes and values are kept in npy format, which is read without pickling.
+
+"""
+
+import io
+import base64
+import h5py
+import numpy as np
+from dquality.common.cache import MetadataCache
+from dquality.common.filepool import open_file
+
+__author__ = "Barbara Frosik"
+__copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
+__docformat__ = 'restructuredtext en'
+__all__ = ['DatasetInfo',
+           'LookupPlan',
+           'HdfIndex',
+           'get_plan',
+           'set_cache_dir',
+           'get_index',
+           'get_file_index']
+
+# maximum number of elements of a data set which value is kept in the index
+INDEX_VALUE_SIZE = 1024
+
+# compiled lookup plans, keyed by the requested paths
+plans = {}
+
+
+def get_descr(dtype):
+    """
+    This function returns the array protocol description of the dtype, that can be stored as JSON. The description
+    does not include the dtype metadata, e.g. the string encoding added by h5py.
+
+    Parameters
+    ----------
+    dtype : numpy.dtype
+        a dtype
+
+    Returns
+    -------
+    descr : str or list
+        the description, converted to dtype by numpy.lib.format.descr_to_dtype function
+    """
+    if dtype.names is None:
+        return dtype.str
+    return dtype.descr
+
+
+def encode_value(value):
+    """
+    This function encodes a value of an attribute or a data set in npy format, without pickling.
+
+    Parameters
+    ----------
+    value : object
+        a value read from the file
+
+    Returns
+    -------
+    encoded : str
+        base64 text of the value in npy format
+
+    Raises
+    ------
+    ValueError
+        if the value holds objects other than strings, e.g. references
+    """
+    array = np.asarray(value)
+    if array.dtype.hasobject:
+        # variable length strings are encoded as fixed length strings
+        array = np.array(array.tolist())
+        if array.dtype.hasobject:
+            raise ValueError('value of objects cannot be encoded')
+    elif array.dtype.metadata is not None or array.dtype.names is not None:
+        # the metadata, also of the fields, is not saved in npy format
+        array = array.astype(np.lib.format.descr_to_dtype(get_descr(array.dtype)))
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def decode_value(encoded):
+    """
+    This function decodes a value encoded by encode_value function.
+
+    Parameters
+    ----------
+    encoded : str
+        base64 text of the value in npy format
+
+    Returns
+    -------
+    value : object
+        a numpy scalar, or array
+    """
+    array = np.load(io.BytesIO(base64.b64decode(encoded)), allow_pickle=False)
+    if array.ndim == 0:
+        return array[()]
+    return array
+
+
+class DatasetInfo:
+    """
+    This class holds metadata of one data set.
+
+    It has the same attributes as h5py Dataset used by the verifiers, i.e. name, shape, dtype, chunks, compression,
+    attrs, and value. The value is kept for data sets with at most INDEX_VALUE_SIZE elements. The value of a larger
+    data set is read from the file each time it is requested, through the file pool.
+    """
+    __slots__ = ('file', 'name', 'shape', 'dtype', 'chunks', 'compression', 'attrs', 'small_value')
+
+    def __init__(self, file, name, shape, dtype, chunks, compression, attrs, small_value):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        file : str
+            name of the file the data set belongs to
+
+        name : str
+            absolute path of the data set
+
+        shape : tuple
+            shape of the data set
+
+        dtype : numpy.dtype
+            type of the data set elements
+
+        chunks : tuple
+            shape of the data set chunks, or None if the data set is not chunked
+
+        compression : str
+            name of the compression filter, or None
+
+        attrs : dict
+            attributes of the data set
+
+        small_value : object
+            value of the data set, or None if the data set has more than INDEX_VALUE_SIZE elements
+        """
+        self.file = file
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+        self.chunks = chunks
+        self.compression = compression
+        self.attrs = attrs
+        self.small_value = small_value
+
+    @property
+    def value(self):
+        """
+        Returns the value of the data set, reading it from the file if the data set is not small.
+        """
+        if self.small_value is not None:
+            return self.small_value
+        with open_file(self.file) as file_h5:
+            return file_h5[self.name][()]
+
+    @classmethod
+    def from_dataset(cls, dset):
+        """
+        This function reads the metadata of the data set.
+
+        Parameters
+        ----------
+        dset : h5py.Dataset
+            the data set
+
+        Returns
+        -------
+        info : DatasetInfo
+            the metadata of the data set
+        """
+        small_value = None
+        if dset.size <= INDEX_VALUE_SIZE:
+            small_value = dset[()]
+        return cls(dset.file.filename, dset.name, dset.shape, dset.dtype, dset.chunks, dset.compression,
+                   dict(dset.attrs.items()), small_value)
+
+    def to_dict(self):
+        """
+        This function returns the metadata as a dictionary of plain values, that can be stored as JSON.
+
+        Raises
+        ------
+        ValueError
+            if an attribute or the value cannot be encoded
+        """
+        attrs = {}
+        for key in self.attrs:
+            attrs[key] = encode_value(self.attrs[key])
+        value = None
+        if self.small_value is not None:
+            value = encode_value(self.small_value)
+        chunks = None
+        if self.chunks is not None:
+            chunks = list(self.chunks)
+        return {'name': self.name, 'shape': list(self.shape), 'dtype': get_descr(self.dtype), 'chunks': chunks,
+                'compression': self.compression, 'attrs': attrs, 'value': value}
+
+    @classmethod
+    def from_dict(cls, file, info):
+        """
+        This function creates the metadata of a data set in the given file from a dictionary returned by to_dict
+        function.
+        """
+        attrs = {}
+        for key in info['attrs']:
+            attrs[key] = decode_value(info['attrs'][key])
+        value = None
+        if info['value'] is not None:
+            value = decode_value(info['value'])
+        chunks = None
+        if info['chunks'] is not None:
+            chunks = tuple(info['chunks'])
+        return cls(file, info['name'], tuple(info['shape']), np.lib.format.descr_to_dtype(info['dtype']), chunks,
+                   info['compression'], attrs, value)
+
+
+class LookupPlan:
+    """
+    This class is a lookup plan of data sets compiled from a list of absolute paths.
+
+    The paths are organized in a prefix tree of path components. The lookup walks the tree, opening only the groups
+    and data sets on the requested paths.
+    """
+
+    def __init__(self, paths):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        paths : list
+            a list of absolute paths of data sets
+        """
+        self.paths = sorted(set(paths))
+        self.requested = set(self.paths)
+        self.tree = {}
+        for path in self.paths:
+            node = self.tree
+            for part in path.split('/'):
+                if len(part) > 0:
+                    node = node.setdefault(part, {})
+
+    def set_missing(self, index, name):
+        """
+        This function marks the requested paths at or below the given name as missing in the index.
+        """
+        for path in self.paths:
+            if path == name or path.startswith(name + '/'):
+                index.missing.add(path)
+
+    def lookup(self, file_h5, index):
+        """
+        This function looks up the requested data sets in the open file and adds them to the index.
+
+        Parameters
+        ----------
+        file_h5 : h5py.File
+            an open hdf file
+
+        index : HdfIndex
+            the index the found data sets, and missing paths are added to
+
+        Returns
+        -------
+        None
+        """
+        def visit(group, prefix, node):
+            for part in node:
+                name = prefix + '/' + part
+                obj = group.get(part)
+                if isinstance(obj, h5py.Dataset):
+                    if name not in index.datasets:
+                        index.datasets[name] = DatasetInfo.from_dataset(obj)
+                    # there is nothing below a data set
+                    for child in node[part]:
+                        self.set_missing(index, name + '/' + child)
+                elif isinstance(obj, h5py.Group):
+                    if name in self.requested:
+                        index.missing.add(name)
+                    visit(obj, name, node[part])
+                else:
+                    self.set_missing(index, name)
+
+        visit(file_h5, '', self.tree)
+
+
+class HdfIndex:
+    """
+    This class is an index of data sets in hdf file, keyed by the data set name.
+
+    The index is filled on request, with the data sets looked up by lookup function, or all data sets of the file added
+    by add_file function. The paths that were looked up and not found are kept as missing.
+    """
+
+    def __init__(self, file=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        file : str
+            a file name including path; defaulted to None, creating an index that is filled by add_file
+        """
+        self.file = file
+        self.datasets = {}
+        self.missing = set()
+        self.complete = False
+
+    def add_file(self, file_h5):
+        """
+        This function traverses the open file and adds all data sets to the index.
+
+        Parameters
+        ----------
+        file_h5 : h5py.File
+            an open hdf file
+
+        Returns
+        -------
+        None
+        """
+        def func(name, dset):
+            if isinstance(dset, h5py.Dataset):
+                self.datasets[dset.name] = DatasetInfo.from_dataset(dset)
+
+        if self.file is None:
+            self.file = file_h5.filename
+        file_h5.visititems(func)
+        self.complete = True
+
+    def lookup(self, paths):
+        """
+        This function adds the data sets with the given paths to the index.
+
+        The file is opened only if any of the paths was not looked up before.
+
+        Parameters
+        ----------
+        paths : list
+            a list of absolute paths of data sets
+
+        Returns
+        -------
+        None
+        """
+        if self.complete:
+            return
+        plan = get_plan(paths)
+        for path in plan.paths:
+            if path not in self.datasets and path not in self.missing:
+                with open_file(self.file) as file_h5:
+                    plan.lookup(file_h5, self)
+                return
+
+    def get(self, name):
+        """
+        Returns the DatasetInfo of data set with the given name, or None if the file does not have the data set.
+        """
+        return self.datasets.get(name)
+
+    def __contains__(self, name):
+        return name in self.datasets
+
+    def names(self):
+        """
+        Returns a list of names of all data sets in the index.
+        """
+        return list(self.datasets.keys())
+
+    def to_dict(self):
+        """
+        This function returns the index as a dictionary of plain values, that can be stored as JSON.
+        """
+        return {'file': self.file, 'datasets': [info.to_dict() for info in self.datasets.values()],
+                'missing': sorted(self.missing), 'complete': self.complete}
+
+    @classmethod
+    def from_dict(cls, index_dict):
+        """
+        This function creates the index from a dictionary returned by to_dict function.
+        """
+        index = cls(index_dict['file'])
+        for info in index_dict['datasets']:
+            index.datasets[info['name']] = DatasetInfo.from_dict(index.file, info)
+        index.missing = set(index_dict['missing'])
+        index.complete = index_dict['complete']
+        return index
+
+
+# indexes of files, shared by the verifiers
+metadata_cache = MetadataCache(HdfIndex.from_dict)
+
+
+def get_plan(paths):
+    """
+    This function returns the lookup plan of the given paths, compiling it when the paths are requested first time.
+
+    Parameters
+    ----------
+    paths : list
+        a list of absolute paths of data sets
+
+    Returns
+    -------
+    plan : LookupPlan
+        the lookup plan
+    """
+    key = tuple(sorted(set(paths)))
+    plan = plans.get(key)
+    if plan is None:
+        plan = LookupPlan(key)
+        plans[key] = plan
+    return plan
+
+
+def set_cache_dir(cache_dir):
+    """
+    This function sets the directory where the file indexes are stored, so they are reused by following runs.
+
+    Parameters
+    ----------
+    cache_dir : str
+        a directory where the cache database is located
+
+    Returns
+    -------
+    None
+    """
+    metadata_cache.set_dir(cache_dir)
+
+
+def get_index(file, paths):
+    """
+    This function returns the index of the file, with the given data sets looked up.
+
+    The index of a file name is taken from the metadata cache. The cache is updated if any data set was looked up, also
+    when the index is given.
+
+    Parameters
+    ----------
+    file : str or HdfIndex
+        a file name including path, or an index of the file
+
+    paths : list
+        a list of absolute paths of data sets
+
+    Returns
+    -------
+    index : HdfIndex
+        index of the file
+    """
+    if isinstance(file, HdfIndex):
+        index = file
+    else:
+        index = metadata_cache.get(file)
+        if index is None:
+            index = HdfIndex(file)
+    num_known = len(index.datasets) + len(index.missing)
+    index.lookup(paths)
+    if len(index.datasets) + len(index.missing) > num_known:
+        metadata_cache.put(index.file, index)
+    return index
+
+
+def get_file_index(file_h5):
+    """
+    This function returns the index of all data sets in the open file.
+
+    The index is taken from the metadata cache, if the file was indexed before. Otherwise the file is traversed and
+    the index is added to the cache.
+
+    Parameters
+    ----------
+    file_h5 : h5py.File
+        an open hdf file
+
+    Returns
+    -------
+    index : HdfIndex
+        index of the file
+    """
+    index = metadata_cache.get(file_h5.filename)
+    if index is None or not index.complete:
+        index = HdfIndex(file_h5.filename)
+        index.add_file(file_h5)
+        metadata_cache.put(file_h5.filename, index)
+    return index
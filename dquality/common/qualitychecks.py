@@ -53,15 +53,22 @@ This file is a suite of verification functions for scientific data.
 
 import numpy as np
 import dquality.common.constants as const
-from dquality.common.containers import Result, Results
+from dquality.common.containers import Aggregate, Result, Results, Features
 
 __author__ = "Barbara Frosik"
 __copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
 __docformat__ = 'restructuredtext en'
 __all__ = ['find_result',
+           'calculate_features',
+           'get_features',
            'validate_mean_signal_intensity',
            'validate_signal_intensity_standard_deviation',
-           'validate_stat_mean']
+           'validate_stat_mean',
+           'run_quality_checks',
+           'run_batch_quality_checks',
+           'run_statistical_checks',
+           'get_sat_high',
+           'reevaluate_results']
 
 
 def find_result(res, quality_id, limits):
@@ -96,6 +103,119 @@ def find_result(res, quality_id, limits):
     return result
 
 
+# number of pixels of a frame processed at a time when calculating features; the block fits in the cache
+FEATURES_BLOCK_SIZE = 65536
+
+
+def calculate_features(frames, sat_high=None):
+    """
+    This function calculates features of each frame in a stack of frames in a single pass over the data.
+
+    The frames are processed in blocks of pixels. Each block is read from memory once, and the sum, sum of squares,
+    minimum, maximum, and number of pixels above saturation limit are accumulated from the block while it is in the
+    cache. Sum of integer data is calculated exactly.
+
+    Parameters
+    ----------
+    frames : ndarray
+        a stack of frames, with frame number as the first dimension
+
+    sat_high : float
+        saturation limit, or None if the saturated pixels are not counted
+
+    Returns
+    -------
+    features : Features
+        a Features object
+    """
+    num_frames = frames.shape[0]
+    frames = frames.reshape(num_frames, -1)
+    num_pixels = frames.shape[1]
+    if np.issubdtype(frames.dtype, np.integer):
+        sum_dtype = np.int64
+    else:
+        sum_dtype = np.float64
+
+    sum = np.zeros(num_frames, dtype=sum_dtype)
+    sumsq = np.zeros(num_frames)
+    min = None
+    max = None
+    sat = None
+    if sat_high is not None:
+        sat = np.zeros(num_frames, dtype=np.int64)
+
+    step = FEATURES_BLOCK_SIZE // num_frames + 1
+    for start in range(0, num_pixels, step):
+        block = frames[:, start:start + step]
+        float_block = block.astype(np.float64)
+        sum += block.sum(axis=1, dtype=sum_dtype)
+        sumsq += np.einsum('ij,ij->i', float_block, float_block)
+        block_min = block.min(axis=1)
+        block_max = block.max(axis=1)
+        if min is None:
+            min = block_min
+            max = block_max
+        else:
+            min = np.minimum(min, block_min)
+            max = np.maximum(max, block_max)
+        if sat is not None:
+            sat += np.count_nonzero(block > sat_high, axis=1)
+
+    return Features(num_pixels, sum, sumsq, min, max, sat)
+
+
+def get_features(data, limits):
+    """
+    This function returns features of the frame, or each frame in a stack of frames.
+
+    The features are calculated when requested first time by any quality check, and kept in the data instance, so all
+    quality checks of the frame use the same features, and the frame data is traversed once.
+
+    Parameters
+    ----------
+    data : Data
+        data instance that includes slice 2D data, or a stack of frames if the status is batch
+
+    limits : dictionary
+        a dictionary containing threshold values for the evaluated data type
+
+    Returns
+    -------
+    features : Features
+        a Features object
+    """
+    if data.features is None:
+        if data.status == const.DATA_STATUS_BATCH:
+            frames = data.slice
+        else:
+            frames = data.slice[np.newaxis]
+        data.features = calculate_features(frames, get_sat_high(limits))
+    return data.features
+
+
+def get_sat_high(limits):
+    """
+    This function returns the intensity above which a pixel is saturated.
+
+    The number of saturated pixels is a calculated value, that depends on this limit, and not a value compared with
+    limits.
+
+    Parameters
+    ----------
+    limits : dictionary
+        a dictionary containing threshold values for the evaluated data type
+
+    Returns
+    -------
+    sat_high : float
+        saturation intensity, or None if not configured
+    """
+    try:
+        return (limits['sat'])['high_limit']
+    except KeyError:
+        return None
+
+
 def validate_mean_signal_intensity(data, limits):
     """
     This method validates mean value of the frame.
@@ -119,7 +239,7 @@ def validate_mean_signal_intensity(data, limits):
     """
 
     this_limits = limits['mean']
-    res = np.mean(data.slice)
+    res = get_features(data, limits).get_mean()[0]
     result = find_result(res, const.QUALITYCHECK_MEAN, this_limits)
     return result
 
@@ -147,7 +267,7 @@ def validate_signal_intensity_standard_deviation(data, limits):
     """
 
     this_limits = limits['std']
-    res = np.std(data.slice)
+    res = get_features(data, limits).get_std()[0]
     result = find_result(res, const.QUALITYCHECK_STD, this_limits)
     return result
 
@@ -174,7 +294,7 @@ def validate_intensity_sum(data, limits):
         a Result object
     """
     this_limits = limits['sum']
-    res = data.slice.sum()
+    res = get_features(data, limits).sum[0]
     result = find_result(res, const.QUALITYCHECK_SUM, this_limits)
     return result
 
@@ -202,7 +322,7 @@ def validate_cnt_rate_sat(data, limits):
     """
     this_limits = limits['rate_sat']
     acq_time = data.acq_time
-    res = data.slice.sum()/acq_time
+    res = get_features(data, limits).sum[0]/acq_time
     result = find_result(res, const.QUALITYCHECK_RATE_SAT, this_limits)
     return result
 
@@ -229,9 +349,8 @@ def validate_frame_saturation(data, limits):
         a Result object
     """
     this_limits = limits['frame_sat']
-    sat_high = (limits['sat'])['high_limit']
-    res = (data.slice > sat_high).sum()
-    result = Result(res, const.QUALITYCHECK_FRAME_SAT, this_limits)
+    res = get_features(data, limits).sat[0]
+    result = find_result(res, const.QUALITYCHECK_FRAME_SAT, this_limits)
     return result
 
 
@@ -256,8 +375,7 @@ def validate_saturation(data, limits):
     result : Result
         a Result object
     """
-    sat_high = (limits['sat'])['high_limit']
-    res = (data.slice > sat_high).sum()
+    res = get_features(data, limits).sat[0]
     result = Result(res, const.QUALITYCHECK_SAT, const.NO_ERROR)
     return result
 
@@ -267,8 +385,9 @@ def validate_stat_mean(limits, aggregate, results):
     This is one of the statistical validation methods.
 
     It has a "quality_id"
-    This function evaluates current mean signal intensity with relation to statistical data captured
-    in the aggregate object. The delta is compared with threshhold values.
+    This function evaluates current mean signal intensity with relation to the running mean of mean signal
+    intensities of previous frames captured in the aggregate object. If the aggregate is limited, the running mean
+    is calculated from the window of recent frames. The delta is compared with threshhold values.
     The result, comparison result, index, and quality_id values are saved in a new Result object.
 
     Parameters
@@ -289,18 +408,12 @@ def validate_stat_mean(limits, aggregate, results):
     """
     this_limits = limits['stat_mean']
 
-    stat_data = aggregate.get_results(const.QUALITYCHECK_MEAN)
-    length = len(stat_data)
-    # calculate std od mean values in aggregate
-    if length == 0:
+    statistics = aggregate.get_statistics(const.QUALITYCHECK_MEAN)
+    if statistics.count == 0:
         return find_result(0, const.STAT_MEAN, this_limits)
-    elif length == 1:
-        mean_mean = np.mean(stat_data)
-    else:
-        mean_mean = np.mean(stat_data[0:(length -1)])
 
     result = results[const.QUALITYCHECK_MEAN]
-    delta = result.res - mean_mean
+    delta = result.res - statistics.get_mean()
 
     result = find_result(delta, const.STAT_MEAN, this_limits)
     return result
@@ -311,7 +424,7 @@ def validate_accumulated_saturation(limits, aggregate, results):
     This is one of the statistical validation methods.
 
     It has a "quality_id"
-    This function adds ecurrent saturated pixels number to the total kept in the aggregate object.
+    This function adds ecurrent saturated pixels number to the running total kept in the aggregate object.
     The total is compared with threshhold values. The result, comparison result, index, and quality_id values are
     saved in a new Result object.
 
@@ -332,10 +445,10 @@ def validate_accumulated_saturation(limits, aggregate, results):
         a Result object
     """
     this_limits = limits['sat_points']
-    stat_data = aggregate.get_results(const.QUALITYCHECK_SAT)
+    statistics = aggregate.get_statistics(const.QUALITYCHECK_SAT)
     # calculate total saturated points
     result = results[const.QUALITYCHECK_SAT]
-    total = np.sum(stat_data) + result.res
+    total = statistics.sum + result.res
 
     result = find_result(total, const.ACC_SAT, this_limits)
     return result
@@ -351,12 +464,155 @@ function_mapper = {const.QUALITYCHECK_MEAN : validate_mean_signal_intensity,
                    const.STAT_MEAN : validate_stat_mean,
                    const.ACC_SAT : validate_accumulated_saturation}
 
-def run_quality_checks(data, index, resultsq, aggregate, limits, quality_checks):
+def validate_mean_signal_intensity_batch(data, limits):
     """
-    This function runs validation methods applicable to the frame data type and enqueues results.
+    This method validates mean value of each frame in a stack of frames.
 
-    This function calls all the quality checks and creates Results object that holds results of each quality check, and
-    attributes, such data type, index, and status. This object is then enqueued into the "resultsq" queue.
+    Parameters
+    ----------
+    data : Data
+        data instance that includes slice 3D data, a stack of frames
+
+    limits : dictionary
+        a dictionary containing threshold values for the evaluated data type
+
+    Returns
+    -------
+    results : list
+        a list of Result objects, one for each frame
+    """
+    this_limits = limits['mean']
+    res = get_features(data, limits).get_mean()
+    return [find_result(r, const.QUALITYCHECK_MEAN, this_limits) for r in res]
+
+
+def validate_signal_intensity_standard_deviation_batch(data, limits):
+    """
+    This method validates standard deviation value of each frame in a stack of frames.
+
+    Parameters
+    ----------
+    data : Data
+        data instance that includes slice 3D data, a stack of frames
+
+    limits : dictionary
+        a dictionary containing threshold values for the evaluated data type
+
+    Returns
+    -------
+    results : list
+        a list of Result objects, one for each frame
+    """
+    this_limits = limits['std']
+    res = get_features(data, limits).get_std()
+    return [find_result(r, const.QUALITYCHECK_STD, this_limits) for r in res]
+
+
+def validate_intensity_sum_batch(data, limits):
+    """
+    This method validates a sum of all intensities value of each frame in a stack of frames.
+
+    Parameters
+    ----------
+    data : Data
+        data instance that includes slice 3D data, a stack of frames
+
+    limits : dictionary
+        a dictionary containing threshold values for the evaluated data type
+
+    Returns
+    -------
+    results : list
+        a list of Result objects, one for each frame
+    """
+    this_limits = limits['sum']
+    res = get_features(data, limits).sum
+    return [find_result(r, const.QUALITYCHECK_SUM, this_limits) for r in res]
+
+
+def validate_cnt_rate_sat_batch(data, limits):
+    """
+    This method validates count rate of each frame in a stack of frames.
+
+    Parameters
+    ----------
+    data : Data
+        data instance that includes slice 3D data, a stack of frames
+
+    limits : dictionary
+        a dictionary containing threshold values for the evaluated data type
+
+    Returns
+    -------
+    results : list
+        a list of Result objects, one for each frame
+    """
+    this_limits = limits['rate_sat']
+    acq_time = data.acq_time
+    res = get_features(data, limits).sum/acq_time
+    return [find_result(r, const.QUALITYCHECK_RATE_SAT, this_limits) for r in res]
+
+
+def validate_frame_saturation_batch(data, limits):
+    """
+    This method validates saturation value of each frame in a stack of frames.
+
+    Parameters
+    ----------
+    data : Data
+        data instance that includes slice 3D data, a stack of frames
+
+    limits : dictionary
+        a dictionary containing threshold values for the evaluated data type
+
+    Returns
+    -------
+    results : list
+        a list of Result objects, one for each frame
+    """
+    this_limits = limits['frame_sat']
+    res = get_features(data, limits).sat
+    return [find_result(r, const.QUALITYCHECK_FRAME_SAT, this_limits) for r in res]
+
+
+def validate_saturation_batch(data, limits):
+    """
+    This method calculates the number of saturated pixels in each frame in a stack of frames.
+
+    Parameters
+    ----------
+    data : Data
+        data instance that includes slice 3D data, a stack of frames
+
+    limits : dictionary
+        a dictionary containing threshold values for the evaluated data type
+
+    Returns
+    -------
+    results : list
+        a list of Result objects, one for each frame
+    """
+    res = get_features(data, limits).sat
+    return [Result(r, const.QUALITYCHECK_SAT, const.NO_ERROR) for r in res]
+
+
+# maps the quality check ID to the function object evaluating a stack of frames
+batch_function_mapper = {const.QUALITYCHECK_MEAN : validate_mean_signal_intensity_batch,
+                         const.QUALITYCHECK_STD : validate_signal_intensity_standard_deviation_batch,
+                         const.QUALITYCHECK_SAT : validate_saturation_batch,
+                         const.QUALITYCHECK_FRAME_SAT : validate_frame_saturation_batch,
+                         const.QUALITYCHECK_RATE_SAT: validate_cnt_rate_sat_batch,
+                         const.QUALITYCHECK_SUM: validate_intensity_sum_batch}
+
+
+def run_quality_checks(data, index, resultsq, limits, quality_checks):
+    """
+    This function runs basic validation methods applicable to the frame data type and enqueues results.
+
+    This function calls all the basic quality checks and creates Results object that holds results of each quality
+    check, and attributes, such data type, index, and status. This object is then enqueued into the "resultsq" queue.
+    The statistical quality checks depend on results of previous frames, and are run by the handler, see
+    run_statistical_checks.
 
     Parameters
     ----------
@@ -369,9 +625,6 @@ def run_quality_checks(data, index, resultsq, aggregate, limits, quality_checks)
     resultsq : Queue
          a queue to which the results are enqueued
 
-    aggregate : Aggregate
-        aggregate instance containing calculated results of previous slices
-
     limits : dictionary
         a dictionary containing threshold values for the evaluated data type
 
@@ -386,18 +639,171 @@ def run_quality_checks(data, index, resultsq, aggregate, limits, quality_checks)
     results_dir = {}
     failed = False
     for function_id in quality_checks:
-        function = function_mapper[function_id]
         if function_id < const.STAT_START:
+            function = function_mapper[function_id]
             result = function(data, limits)
             results_dir[function_id] = result
             if result.error != 0:
                 failed = True
-        else:
-            if not failed:
-                result = function(limits, aggregate, results_dir)
-                results_dir[function_id] = result
-                if result.error != 0:
-                    failed = True
 
     results = Results(data.type, index, failed, results_dir)
     resultsq.put(results)
+
+
+def run_statistical_checks(limits, aggregate, quality_checks, results):
+    """
+    This function runs statistical validation methods applicable to the frame data type.
+
+    The statistical quality checks evaluate the frame results with relation to the results of previous frames
+    accumulated in the aggregate instance. This function is called in the process that owns the aggregate, so the
+    checks always see the current state of the aggregate, and the aggregate does not need to be passed to the quality
+    check processes. The statistical checks are not run if any basic check failed, otherwise all of them are
+    evaluated. The results of the statistical checks are added to the given Results object.
+
+    Parameters
+    ----------
+    limits : dictionary
+        a dictionary containing threshold values for the evaluated data type
+
+    aggregate : Aggregate
+        aggregate instance containing calculated results of previous slices
+
+    quality_checks : list
+        a list of quality checks that apply to the data type
+
+    results : Results
+        a Results container that holds results of the basic checks for the frame
+
+    Returns
+    -------
+    none
+    """
+    if results.failed:
+        return
+
+    results_dir = {}
+    for result in results.results:
+        results_dir[result.quality_id] = result
+    for function_id in sorted(quality_checks):
+        if function_id >= const.STAT_START:
+            function = function_mapper[function_id]
+            result = function(limits, aggregate, results_dir)
+            results_dir[function_id] = result
+            results.results.append(result)
+            if result.error != 0:
+                results.failed = True
+
+
+def run_batch_quality_checks(data, index, resultsq, limits, quality_checks):
+    """
+    This function runs basic validation methods on a stack of frames and enqueues results for each frame.
+
+    Each quality check is calculated for all frames in the stack in one call, with reductions over the frame axes.
+    The results are then split into Results object for each frame, equal to the results that run_quality_checks
+    would produce for the frame. The frames in the stack have consecutive indexes, starting with the given index.
+
+    Parameters
+    ----------
+    data : Data
+        data instance that includes slice 3D data, a stack of frames
+
+    index : int
+        index of the first frame in the stack
+
+    resultsq : Queue
+         a queue to which the results are enqueued
+
+    limits : dictionary
+        a dictionary containing threshold values for the evaluated data type
+
+    quality_checks : list
+        a list of quality checks that apply to the data type
+
+    Returns
+    -------
+    none
+    """
+    batch_results = {}
+    for function_id in sorted(quality_checks):
+        if function_id < const.STAT_START:
+            function = batch_function_mapper[function_id]
+            batch_results[function_id] = function(data, limits)
+
+    for i in range(data.slice.shape[0]):
+        results_dir = {}
+        failed = False
+        for function_id in batch_results:
+            result = batch_results[function_id][i]
+            results_dir[function_id] = result
+            if result.error != 0:
+                failed = True
+        resultsq.put(Results(data.type, index + i, failed, results_dir))
+
+
+# maps the quality check ID to the name of limits the result is compared with
+limits_mapper = {const.QUALITYCHECK_MEAN : 'mean',
+                 const.QUALITYCHECK_STD : 'std',
+                 const.QUALITYCHECK_SUM : 'sum',
+                 const.QUALITYCHECK_FRAME_SAT : 'frame_sat',
+                 const.QUALITYCHECK_RATE_SAT : 'rate_sat'}
+
+
+def reevaluate_results(data_type, limits, quality_checks, index, check, value):
+    """
+    This function evaluates stored results of the basic quality checks against the given limits.
+
+    The stored values are compared with the limits for all frames at once. The frames which quality checks raised an
+    error, marked by QUALITYCHECK_ERROR result, remain failed. Then the statistical checks are run for each frame in
+    order of indexes, as the handler would run them. The frames are not read, so the values that depend
+    on limits, i.e. number of saturated pixels, must have been calculated with the same saturation limit.
+
+    Parameters
+    ----------
+    data_type : str
+        data type of the results
+
+    limits : dictionary
+        a dictionary containing threshold values for the evaluated data type
+
+    quality_checks : list
+        a list of quality checks that apply to the data type
+
+    index, check, value : ndarray
+        frame index, quality check id and value of each stored result; results of statistical checks are ignored
+
+    Returns
+    -------
+    aggregate : Aggregate
+        aggregate instance containing the results of all frames
+    """
+    basic = check < const.STAT_START
+    index = index[basic]
+    check = check[basic]
+    value = value[basic]
+    order = np.lexsort((check, index))
+    index = index[order]
+    check = check[order]
+    value = value[order]
+
+    error = np.full(len(value), const.NO_ERROR, dtype='int8')
+    for function_id, name in limits_mapper.items():
+        selected = check == function_id
+        if selected.any():
+            this_limits = limits[name]
+            error[selected & (value < this_limits['low_limit'])] = const.QUALITYERROR_LOW
+            error[selected & (value > this_limits['high_limit'])] = const.QUALITYERROR_HIGH
+    error[check == const.QUALITYCHECK_ERROR] = const.QUALITYERROR_CHECK
+
+    aggregate = Aggregate(data_type, quality_checks, None)
+    starts = np.flatnonzero(np.diff(index)) + 1
+    for frame in np.split(np.arange(len(index)), starts):
+        if len(frame) == 0:
+            continue
+        results_dir = {}
+        for row in frame:
+            results_dir[int(check[row])] = Result(float(value[row]), int(check[row]), int(error[row]))
+        failed = bool((error[frame] != const.NO_ERROR).any())
+        results = Results(data_type, int(index[frame[0]]), failed, results_dir)
+        run_statistical_checks(limits, aggregate, quality_checks, results)
+        aggregate.handle_results(results)
+    return aggregate
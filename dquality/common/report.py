@@ -52,15 +52,157 @@ facilitating logger.
 
 """
 import dquality.common.constants as const
+from dquality.common.containers import Result, Results
 import pprint
+import json
+import time
+import numpy as np
 
 __author__ = "Barbara Frosik"
 __copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
 __docformat__ = 'restructuredtext en'
-__all__ = ['report_results',
+__all__ = ['ReportWriter',
+           'report_results',
            'add_bad_indexes',
            'add_bad_indexes_per_file',
-           'report_bad_indexes']
+           'report_bad_indexes',
+           'write_results_file',
+           'read_results_file']
+
+
+class ReportWriter:
+    """
+    This class writes the report incrementally, as the results are produced.
+
+    Each evaluated frame is appended to the report file as one JSON line, holding the data type, frame index, failed
+    flag and results keyed by quality check id as [value, error] pairs. If the report type is REPORT_ERRORS only the
+    frames that did not pass quality checks are written. The file is flushed every flush_interval seconds, so the
+    report can be read while the data is being verified. The last line is a summary, built from counters of evaluated
+    and bad frames per data type.
+
+    The file is opened when the first line is written, so the writer can be created in one process and used in
+    another.
+    """
+
+    def __init__(self, logger, report_file, report_type, filename=None, flush_interval=1.0):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        logger : Logger
+            logger instance
+
+        report_file : str
+            a file name where the report will be written
+
+        report_type : int
+            report type, currently supporting 'none, 'errors', and 'full'
+
+        filename : str
+            name of the verified file, included in the summary, defaulted to None
+
+        flush_interval : float
+            a time in seconds between flushing the report file, defaulted to 1 second
+        """
+        self.logger = logger
+        self.report_file = report_file
+        self.report_type = report_type
+        self.filename = filename
+        self.flush_interval = flush_interval
+        self.file = None
+        self.last_flush = None
+        self.counters = {}
+
+    def write_line(self, record):
+        """
+        This function appends a record to the report file, opening the file on the first call.
+        """
+        if self.file is None:
+            try:
+                self.file = open(self.report_file, 'w')
+            except IOError:
+                self.logger.warning('Cannot open report file')
+                self.report_type = const.REPORT_NONE
+                return
+            self.last_flush = time.time()
+        self.file.write(json.dumps(record) + '\n')
+        now = time.time()
+        if now - self.last_flush >= self.flush_interval:
+            self.file.flush()
+            self.last_flush = now
+
+    def write(self, results):
+        """
+        This function counts the results of one frame and writes them to the report file, if required by the report
+        type.
+
+        Parameters
+        ----------
+        results : Results
+            a Results container that holds results for the frame
+
+        Returns
+        -------
+        None
+        """
+        counters = self.counters.setdefault(results.type, {'evaluated': 0, 'bad': 0})
+        counters['evaluated'] += 1
+        if results.failed:
+            counters['bad'] += 1
+
+        if self.report_type == const.REPORT_FULL or (self.report_type == const.REPORT_ERRORS and results.failed):
+            reported = {}
+            for result in results.results:
+                reported[result.quality_id] = [float(result.res), int(result.error)]
+            self.write_line({'type': results.type, 'index': int(results.index), 'failed': bool(results.failed),
+                             'results': reported})
+
+    def write_store(self, type, store):
+        """
+        This function writes the results of all frames kept in a results store, in order of frame indexes.
+
+        Parameters
+        ----------
+        type : str
+            data type of the results
+
+        store : ResultsStore
+            a store holding the results of the frames
+
+        Returns
+        -------
+        None
+        """
+        index, check, value, error = store.get_rows()
+        frames = np.flatnonzero(store.get_bitmap(store.evaluated))
+        failed = np.isin(frames, store.get_bad_indexes())
+        first = np.searchsorted(index, frames, 'left')
+        last = np.searchsorted(index, frames, 'right')
+        for i in range(len(frames)):
+            results_dir = {}
+            for row in range(first[i], last[i]):
+                results_dir[int(check[row])] = Result(float(value[row]), int(check[row]), int(error[row]))
+            self.write(Results(type, int(frames[i]), bool(failed[i]), results_dir))
+
+    def close(self):
+        """
+        This function writes the summary line and closes the report file.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        None
+        """
+        if self.report_type == const.REPORT_NONE:
+            return
+        self.write_line({'file': self.filename, 'summary': self.counters})
+        if self.file is not None:
+            self.file.close()
+            self.file = None
 
 
 def report_results(logger, aggregates, filename, report_file, report_type):
@@ -71,11 +213,8 @@ def report_results(logger, aggregates, filename, report_file, report_type):
 
     Parameters
     ----------
-    aggregates : dict <data_type : Aggregate>
-        dictionary with instances holding result values keyed by data type
-
-    type : str
-        a string characterizung the data type (i.e. data_dark, data_white or data)
+    aggregates : dict <data_type : ResultsStore>
+        dictionary with stores holding result values keyed by data type
 
     filename : str
         name of the verified file
@@ -96,12 +235,16 @@ def report_results(logger, aggregates, filename, report_file, report_type):
     try:
         report = open(report_file, 'w')
         for type in aggregates:
+            store = aggregates[type]
             if report_type == const.REPORT_FULL:
-                reported = aggregates[type]
+                rows = store.get_rows()
             elif report_type == const.REPORT_ERRORS:
-                reported = aggregates[type]['bad_indexes']
+                rows = store.get_rows(store.get_bad_indexes())
             else:
                 return
+            reported = {}
+            for index, check, value, error in zip(*rows):
+                reported.setdefault(int(index), {})[int(check)] = (float(value), int(error))
 
             if filename is not None:
                 report.write(filename+ '\n')
@@ -120,8 +263,8 @@ def add_bad_indexes(aggregates, bad_indexes):
 
     Parameters
     ----------
-    aggregates : dict <data_type : Aggregate>
-        dictionary with instances holding result values keyed by data type
+    aggregates : dict <data_type : ResultsStore>
+        dictionary with stores holding result values keyed by data type
 
     bad_indexes : dictionary
         a dictionary structure that the bad indexes will be written to
@@ -132,10 +275,7 @@ def add_bad_indexes(aggregates, bad_indexes):
     """
 
     for type in aggregates:
-        list = []
-        for key in aggregates[type]['bad_indexes'].keys():
-            list.append(key)
-        bad_indexes[type] = list
+        bad_indexes[type] = aggregates[type].get_bad_indexes().tolist()
 
 
 def add_bad_indexes_per_file(aggregates, bad_indexes, file_list, offset_list):
@@ -147,8 +287,8 @@ def add_bad_indexes_per_file(aggregates, bad_indexes, file_list, offset_list):
 
     Parameters
     ----------
-    aggregates : dict <data_type : Aggregate>
-        dictionary with instances holding result values keyed by data type
+    aggregates : dict <data_type : ResultsStore>
+        dictionary with stores holding result values keyed by data type
 
     bad_indexes : dictionary
         a dictionary structure that the bad indexes will be written to
@@ -172,7 +312,7 @@ def add_bad_indexes_per_file(aggregates, bad_indexes, file_list, offset_list):
     current_offset = offset_list[index]
 
     for type in aggregates:
-        for key in aggregates[type]['bad_indexes'].keys():
+        for key in aggregates[type].get_bad_indexes().tolist():
             if key == current_offset:
                 dict[current_file] = list
                 list = []
@@ -209,3 +349,63 @@ def report_bad_indexes(bad_indexes, report_file):
     else:
         report_file.write('bad indexes')
         pprint.pprint(bad_indexes, report_file)
+
+
+def write_results_file(results_file, limits, results):
+    """
+    This function writes the values of quality checks of each frame to a file, so the frames can be evaluated against
+    different limits without reading the data.
+
+    The file is a numpy npz archive, with arrays of frame index, quality check id, and value for each data type, and
+    the limits the values were calculated with.
+
+    Parameters
+    ----------
+    results_file : str
+        a file name where the results are written
+
+    limits : dict
+        the limits the results were evaluated with
+
+    results : dict
+        a dictionary keyed by data type of tuples of arrays: frame index, quality check id and value of each result
+
+    Returns
+    -------
+    None
+    """
+    arrays = {'limits' : np.array(json.dumps(limits))}
+    for type in results:
+        index, check, value = results[type][:3]
+        arrays[type + '.index'] = np.asarray(index, dtype='int64')
+        arrays[type + '.check'] = np.asarray(check, dtype='int16')
+        arrays[type + '.value'] = np.asarray(value, dtype='float64')
+    with open(results_file, 'wb') as file:
+        np.savez(file, **arrays)
+
+
+def read_results_file(results_file):
+    """
+    This function reads the values of quality checks of each frame written by write_results_file.
+
+    Parameters
+    ----------
+    results_file : str
+        a file name the results were written to
+
+    Returns
+    -------
+    limits : dict
+        the limits the results were evaluated with
+
+    results : dict
+        a dictionary keyed by data type of tuples of arrays: frame index, quality check id and value of each result
+    """
+    results = {}
+    with np.load(results_file) as arrays:
+        limits = json.loads(str(arrays['limits']))
+        for name in arrays.files:
+            if name.endswith('.index'):
+                type = name[:-len('.index')]
+                results[type] = (arrays[type + '.index'], arrays[type + '.check'], arrays[type + '.value'])
+    return limits, results
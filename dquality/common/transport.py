@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright (c) 2016, UChicago Argonne, LLC. All rights reserved.         #
+#                                                                         #
+# Copyright 2016. UChicago Argonne, LLC. This software was produced       #
+# under U.S. Government contract DE-AC02-06CH11357 for Argonne National   #
+# Laboratory (ANL), which is operated by UChicago Argonne, LLC for the    #
+# U.S. Department of Energy. The U.S. Government has rights to use,       #
+# reproduce, and distribute this software.  NEITHER THE GOVERNMENT NOR    #
+# UChicago Argonne, LLC MAKES ANY WARRANTY, EXPRESS OR IMPLIED, OR        #
+# ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  If software is     #
+# modified to produce derivative works, such modified software should     #
+# be clearly marked, so as not to confuse it with the version available   #
+# from ANL.                                                               #
+#                                                                         #
+# Additionally, redistribution and use in source and binary forms, with   #
+# or without modification, are permitted provided that the following      #
+# conditions are met:                                                     #
+#                                                                         #
+#     * Redistributions of source code must retain the above copyright    #
+#       notice, this list of conditions and the following disclaimer.     #
+#                                                                         #
+#     * Redistributions in binary form must reproduce the above copyright #
+#       notice, this list of conditions and the following disclaimer in   #
+#       the documentation and/or other materials provided with the        #
+#       distribution.                                                     #
+#                                                                         #
+#     * Neither the name of UChicago Argonne, LLC, Argonne National       #
+#       Laboratory, ANL, the U.S. Government, nor the names of its        #
+#       contributors may be used to endorse or promote products derived   #
+#       from this software without specific prior written permission.     #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY UChicago Argonne, LLC AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS       #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL UChicago     #
+# Argonne, LLC OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,        #
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,    #
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;        #
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER        #
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT      #
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN       #
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE         #
+# POSSIBILITY OF SUCH DAMAGE.                                             #
+# #########################################################################
+
+"""
+This file contains a transport of data between processes that does not copy frame data into the pickle stream.
+
+The objects are pickled with pickle protocol 5. The numpy buffers are passed out-of-band: the pickle stream holds only
+the buffer metadata, and the buffers are written into the pipe directly from the array memory, and read on the other
+side directly into the memory of the new array. The buffers are written and read with raw file descriptor operations,
+as multiprocessing.Connection copies the received bytes.
+
+"""
+
+from multiprocessing import Pipe, Lock, Queue
+import pickle
+import os
+import io
+import time
+import sys
+if sys.version[0] == '2':
+    import Queue as queue
+else:
+    import queue as queue
+
+__author__ = "Barbara Frosik"
+__copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
+__docformat__ = 'restructuredtext en'
+__all__ = ['is_supported',
+           'DataPipe',
+           'get_data_queue']
+
+
+def is_supported():
+    """
+    Returns True if pickle protocol 5 is supported by the python version, and pipes are file descriptors, False
+    otherwise.
+    """
+    return pickle.HIGHEST_PROTOCOL >= 5 and os.name == 'posix'
+
+
+class DataPipe:
+    """
+    This class is a queue-like channel passing objects between processes with out-of-band buffers.
+
+    It can be used in place of multiprocessing.Queue by the producers and consumers of data, as it supports put, get
+    with block and timeout, get_nowait, and empty methods. Multiple processes can put and get at the same time.
+
+    Unlike the Queue, which buffers unlimited data in a feeder thread, the put blocks when the pipe is full, until the
+    receiving process gets the data. This throttles the producer to the speed of the receiving process, but a receiving
+    process that stopped reading blocks the producer. Therefore the pipe is used only between the processes of the
+    verification, and the frames are delivered to external consumer processes on a Queue.
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        # the names of the connections are the same as in multiprocessing.Queue, so the handler can wait on them
+        self._reader, self._writer = Pipe(duplex=False)
+        self.rlock = Lock()
+        self.wlock = Lock()
+
+    def put(self, obj):
+        """
+        This function sends the object.
+
+        The numpy arrays contained in the object are sent out-of-band, directly from the array memory.
+
+        Parameters
+        ----------
+        obj : object
+            an object to send, typically a Data instance
+
+        Returns
+        -------
+        none
+        """
+        buffers = []
+        stream = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+        views = [buffer.raw() for buffer in buffers]
+        with self.wlock:
+            self._writer.send((stream, [view.nbytes for view in views]))
+            fd = self._writer.fileno()
+            for view in views:
+                view = view.cast('B')
+                while len(view) > 0:
+                    view = view[os.write(fd, view):]
+
+    def get(self, block=True, timeout=None):
+        """
+        This function returns a received object.
+
+        The out-of-band buffers are received directly into writable memory used by the numpy arrays of the object.
+
+        Parameters
+        ----------
+        block : boolean
+            if True, the function waits for the object, otherwise raises queue.Empty if no object is waiting
+
+        timeout : float
+            a maximum time in seconds to wait for the object, None to wait as long as needed; if the time elapsed,
+            queue.Empty is raised
+
+        Returns
+        -------
+        obj : object
+            a received object
+
+        Raises
+        ------
+        EOFError
+            if the sending process closed the pipe before sending the whole object
+        """
+        if not block:
+            timeout = 0
+        if timeout is None:
+            self.rlock.acquire()
+        else:
+            deadline = time.time() + timeout
+            if not self.rlock.acquire(True, timeout):
+                raise queue.Empty
+        try:
+            if timeout is not None and not self._reader.poll(max(0, deadline - time.time())):
+                raise queue.Empty
+            stream, sizes = self._reader.recv()
+            reader = io.FileIO(self._reader.fileno(), closefd=False)
+            buffers = []
+            for size in sizes:
+                buffer = bytearray(size)
+                view = memoryview(buffer)
+                while len(view) > 0:
+                    num_read = reader.readinto(view)
+                    if not num_read:
+                        raise EOFError
+                    view = view[num_read:]
+                buffers.append(buffer)
+        finally:
+            self.rlock.release()
+        return pickle.loads(stream, buffers=buffers)
+
+    def get_nowait(self):
+        """
+        This function returns a received object if one is waiting, otherwise raises queue.Empty.
+        """
+        return self.get(False)
+
+    def empty(self):
+        """
+        Returns True if there is no data waiting in the pipe, False otherwise.
+        """
+        return not self._reader.poll()
+
+
+def get_data_queue():
+    """
+    This function creates a queue for passing data between processes.
+
+    Returns
+    -------
+    queue : DataPipe or Queue
+        DataPipe if supported by the python version, otherwise multiprocessing Queue
+    """
+    if is_supported():
+        return DataPipe()
+    return Queue()
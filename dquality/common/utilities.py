@@ -51,18 +51,47 @@ This file is a suite of utility functions.
 
 """
 import os
+import sys
+import mmap
+import zlib
+import itertools
 import h5py
+import numpy as np
 import struct as st
 import logging
 from configobj import ConfigObj
 import pytz
 import datetime
+from contextlib import contextmanager
+from collections import namedtuple
+from multiprocessing import cpu_count
 import dquality.common.constants as const
+import dquality.common.filepool as filepool
+import dquality.common.framebuffer as framebuffer
+from dquality.common.hdfindex import set_cache_dir
 
 
 __author__ = "Barbara Frosik"
 __copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
 __docformat__ = 'restructuredtext en'
+# number of bytes read at once from a contiguous data set
+READ_BLOCK_SIZE = 1 << 24
+
+# size of GE file header, the frames follow the header
+GE_HEADER_SIZE = 8192
+
+# filters of compressed data sets which chunks are decompressed in parallel
+CHUNK_FILTERS = (h5py.h5z.FILTER_DEFLATE, h5py.h5z.FILTER_SHUFFLE)
+
+# number of threads decompressing chunks; on a single core the chunks are decompressed by the hdf library
+try:
+    DECOMPRESS_WORKERS = cpu_count()
+except NotImplementedError:
+    DECOMPRESS_WORKERS = 1
+
+# threads decompressing chunks, created when first used in a process
+decompress_pool = {'pid' : None, 'workers' : 0, 'executor' : None}
+
 __all__ = ['lt',
            'le',
            'eq',
@@ -72,7 +101,16 @@ __all__ = ['lt',
            'get_logger',
            'get_directory',
            'get_file',
+           'Processing',
+           'get_positive',
+           'get_processing',
+           'init_hdf',
            'get_data_hdf',
+           'get_chunk_filters',
+           'decode_chunk',
+           'get_hdf_reader',
+           'get_data_ge',
+           'get_ge_reader',
            'copy_list',
            'key_list']
 
@@ -261,6 +299,46 @@ def get_logger(name, conf):
     return logger
 
 
+def get_directory(conf, config_name, logger, log_error=True):
+    """
+    This function returns a directory name. It reads the directory from a configuration file.
+    If the directory is not configured or does not exist a message is logged into a log file,
+    and None is returned.
+
+    Parameters
+    ----------
+    conf : config Object
+        a configuration object
+
+    config_name : str
+        a key string defining the directory in a configuration
+
+    logger : Logger Object
+        a logger object
+
+    log_error : bool
+        if True, an error is logged when the directory is not configured
+
+    Returns
+    -------
+    directory : str
+    """
+    try:
+        directory = conf[config_name]
+        if not os.path.isdir(directory):
+            logger.error(
+                'configuration error: directory ' +
+                directory + ' does not exist')
+            return None
+    except KeyError:
+        if log_error:
+            logger.error(
+                'configuration error: ' +
+                config_name + ' is not configured')
+        return None
+    return directory
+
+
 def get_file(conf, config_name, logger, log_error=True):
     """
     This function returns a file object. It reads the file from a configuration file.
@@ -298,18 +376,151 @@ def get_file(conf, config_name, logger, log_error=True):
     return file
 
 
-def get_data_hdf(file):
+# parameters of frames processing, common to the data verifiers; a parameter that is not configured is None
+Processing = namedtuple('Processing', ['num_workers', 'frame_buffer_slots', 'batch_size', 'reorder_window',
+                                       'replay_fps', 'follow_timeout', 'feedback_interval'])
+Processing.__new__.__defaults__ = (None,) * len(Processing._fields)
+
+
+def get_positive(conf, config_name, logger, type=int):
+    """
+    This function returns a positive number read from a configuration file.
+
+    If the parameter is not configured, None is returned. If the configured value is not a positive number, an error
+    is logged, and the script exits.
+
+    Parameters
+    ----------
+    conf : config Object
+        a configuration object
+
+    config_name : str
+        a key string defining the parameter in a configuration
+
+    logger : Logger Object
+        a logger object
+
+    type : type
+        type of the number, int or float; defaulted to int
+
+    Returns
+    -------
+    value : int or float
+    """
+    try:
+        value = type(conf[config_name])
+    except KeyError:
+        return None
+    except ValueError:
+        value = 0
+    if value <= 0:
+        logger.error('parameter error: ' + config_name + ' must be a positive number')
+        sys.exit(-1)
+    return value
+
+
+def get_processing(conf, logger):
+    """
+    This function reads the parameters of frames processing from a configuration file.
+
+    Parameters
+    ----------
+    conf : config Object
+        a configuration object
+
+    logger : Logger Object
+        a logger object
+
+    Returns
+    -------
+    processing : Processing
+        the processing parameters: num_workers, number of quality check processes, frame_buffer_slots, number of
+        slots in shared memory frame buffer, batch_size, number of frames evaluated together as a stack,
+        reorder_window, a number of frames a frame can be delivered to consumers out of order, replay_fps, a rate in
+        frames per second the frames are read at to simulate acquisition, follow_timeout, a time in seconds to wait
+        for new frames of a file written in SWMR mode, and feedback_interval, a time in seconds during which failed
+        results are collected and reported together
+    """
+    frame_buffer_slots = get_positive(conf, 'frame_buffer_slots', logger)
+    if frame_buffer_slots is not None and not framebuffer.is_supported():
+        logger.warning('shared memory is not supported, frames will be passed by value')
+        frame_buffer_slots = None
+
+    return Processing(get_positive(conf, 'num_workers', logger),
+                      frame_buffer_slots,
+                      get_positive(conf, 'batch_size', logger),
+                      get_positive(conf, 'reorder_window', logger),
+                      get_positive(conf, 'replay_fps', logger, float),
+                      get_positive(conf, 'follow_timeout', logger, float),
+                      get_positive(conf, 'feedback_interval', logger, float))
+
+
+def init_hdf(conf, logger):
+    """
+    This function configures the hdf metadata cache and the pool of open hdf files shared by the verifiers.
+
+    The configuration parameters are 'cache_dir', a directory where the metadata of hdf files is stored,
+    'file_pool_size', maximum number of open files kept in the pool, and 'chunk_cache_size', size in bytes of the
+    chunk cache of each data set in an open file. All parameters are optional.
+
+    Parameters
+    ----------
+    conf : config Object
+        a configuration object
+
+    logger : Logger Object
+        a logger object
+
+    Returns
+    -------
+    cache_dir : str
+        the cache directory, or None if not configured
+    """
+    cache_dir = get_directory(conf, 'cache_dir', logger, False)
+    set_cache_dir(cache_dir)
+
+    try:
+        pool_size = int(conf['file_pool_size'])
+        if pool_size < 0:
+            logger.error('parameter error: file_pool_size must not be negative')
+            sys.exit(-1)
+    except KeyError:
+        pool_size = filepool.FILE_POOL_SIZE
+
+    try:
+        chunk_cache_size = int(conf['chunk_cache_size'])
+        if chunk_cache_size < 0:
+            logger.error('parameter error: chunk_cache_size must not be negative')
+            sys.exit(-1)
+    except KeyError:
+        chunk_cache_size = None
+
+    filepool.set_pool(pool_size, chunk_cache_size)
+    return cache_dir
+
+
+@contextmanager
+def get_data_hdf(file, swmr=False):
     """
     This function takes a file of HDF format, traverses through tags,
     finds "shape" data sets and returns the sets in a dictionary.
 
+    The function is a context manager. The file is taken from the shared file pool, and is released when the context
+    exits.
+
     Parameters
     ----------
     file : str
         File Name
 
+    swmr : bool
+        if True, the file is opened in SWMR read mode, so the data appended by a writer can be read; defaulted to False
+
     Returns
     -------
+    file_h5 : h5py.File
+        the open file
+
     data : dictionary
         A dictionary of data sets with the tag keys
     """
@@ -321,9 +532,215 @@ def get_data_hdf(file):
         if isinstance(dset, h5py.Dataset):
             data[dset.name] = dset.name
 
-    file_h5 = h5py.File(file, 'r')
-    file_h5.visititems(func)
-    return file_h5, data
+    with filepool.open_file(file, swmr) as file_h5:
+        # only the names are needed, so the metadata of the data sets is not read
+        file_h5.visititems(func)
+        yield file_h5, data
+
+
+def get_chunk_filters(dataset):
+    """
+    This function returns the filters of a compressed data set, if its chunks can be decompressed in parallel.
+
+    Parameters
+    ----------
+    dataset : h5py.Dataset
+        a data set
+
+    Returns
+    -------
+    filters : list
+        a list of filter ids in order of the filter pipeline, or None if the data set is not compressed with gzip, or
+        uses a filter other than gzip and shuffle
+    """
+    if dataset.chunks is None:
+        return None
+    dcpl = dataset.id.get_create_plist()
+    filters = [dcpl.get_filter(i)[0] for i in range(dcpl.get_nfilters())]
+    if h5py.h5z.FILTER_DEFLATE not in filters or any(filter not in CHUNK_FILTERS for filter in filters):
+        return None
+    return filters
+
+
+def decode_chunk(raw, filter_mask, filters, dtype, chunks):
+    """
+    This function decodes a raw chunk read with read_direct_chunk.
+
+    Parameters
+    ----------
+    raw : bytes
+        the chunk as stored in the file
+
+    filter_mask : int
+        the mask of filters that were not applied to the chunk
+
+    filters : list
+        a list of filter ids in order of the filter pipeline
+
+    dtype : numpy.dtype
+        type of the data set
+
+    chunks : tuple
+        shape of the chunk
+
+    Returns
+    -------
+    chunk : ndarray
+        the decoded chunk
+    """
+    for i in reversed(range(len(filters))):
+        if filter_mask & (1 << i):
+            continue
+        if filters[i] == h5py.h5z.FILTER_DEFLATE:
+            raw = zlib.decompress(raw)
+        else:
+            # shuffle stores the n-th bytes of all elements together
+            raw = np.frombuffer(raw, np.uint8).reshape(dtype.itemsize, -1).T.tobytes()
+    return np.frombuffer(raw, dtype).reshape(chunks)
+
+
+def get_decompress_pool(workers):
+    """
+    This function returns the pool of threads decompressing chunks, with at least the given number of threads, or
+    None if the thread pool is not available, i.e. python 2 without futures package.
+    """
+    try:
+        from concurrent.futures import ThreadPoolExecutor
+    except ImportError:
+        return None
+    # the threads are not inherited by a child process
+    if decompress_pool['pid'] != os.getpid() or decompress_pool['workers'] < workers:
+        decompress_pool['executor'] = ThreadPoolExecutor(workers)
+        decompress_pool['workers'] = workers
+        decompress_pool['pid'] = os.getpid()
+    return decompress_pool['executor']
+
+
+def read_chunks(dataset, filters, buffer, start, stop, workers=DECOMPRESS_WORKERS):
+    """
+    This function reads the chunks of data set covering frames from start to stop into the buffer.
+
+    The raw chunks are read with read_direct_chunk, and are decompressed by a pool of threads. The zlib decompression
+    releases the interpreter lock, so the chunks are decompressed in parallel.
+
+    Parameters
+    ----------
+    dataset : h5py.Dataset
+        a compressed data set of frames
+
+    filters : list
+        a list of filter ids in order of the filter pipeline
+
+    buffer : ndarray
+        an array the frames are read into
+
+    start : int
+        index of the first frame, aligned with chunks
+
+    stop : int
+        index after the last frame
+
+    workers : int
+        number of threads decompressing the chunks; defaulted to DECOMPRESS_WORKERS
+
+    Returns
+    -------
+    None
+    """
+    chunks = dataset.chunks
+    shape = dataset.shape
+    ends = (stop,) + shape[1:]
+
+    def get_regions(offset):
+        # the region of buffer covered by the chunk, and the part of the chunk inside the data set
+        target = []
+        source = []
+        for d in range(len(shape)):
+            end = min(offset[d] + chunks[d], ends[d])
+            base = start if d == 0 else 0
+            target.append(slice(offset[d] - base, end - base))
+            source.append(slice(0, end - offset[d]))
+        return tuple(target), tuple(source)
+
+    def decode(offset, raw, filter_mask):
+        target, source = get_regions(offset)
+        buffer[target] = decode_chunk(raw, filter_mask, filters, dataset.dtype, chunks)[source]
+
+    executor = get_decompress_pool(workers)
+    futures = []
+    for offset in itertools.product(*[range(start if d == 0 else 0, ends[d], chunks[d]) for d in range(len(shape))]):
+        try:
+            filter_mask, raw = dataset.id.read_direct_chunk(offset)
+        except RuntimeError:
+            # the chunk was not written
+            buffer[get_regions(offset)[0]] = dataset.fillvalue
+            continue
+        futures.append(executor.submit(decode, offset, raw, filter_mask))
+    for future in futures:
+        future.result()
+
+
+def get_hdf_reader(dataset, copy=False, workers=DECOMPRESS_WORKERS):
+    """
+    This function returns a reader of frames from hdf data set.
+
+    The data set is read in blocks of frames aligned with the data set chunks, so each chunk is read and decompressed
+    once. If the data set is not chunked, the blocks are READ_BLOCK_SIZE bytes. A block is read with read_direct into
+    a buffer that is allocated once and reused for the following blocks, and the frames are returned as views of the
+    buffer. If more than one worker is given, and the thread pool is available, the chunks of a data set compressed with
+    gzip are read raw, and decompressed in parallel into the buffer.
+
+    Parameters
+    ----------
+    dataset : h5py.Dataset
+        a data set of frames, the first dimension indexing the frames
+
+    copy : bool
+        if True, the reader returns copies of the frames, otherwise the returned frames are valid until the next read;
+        defaulted to False
+
+    workers : int
+        number of threads decompressing chunks of a compressed data set; defaulted to DECOMPRESS_WORKERS
+
+    Returns
+    -------
+    read : function
+        a function taking index of the first frame and index after the last frame, and returning a stack of frames
+    """
+    frame_shape = dataset.shape[1:]
+    if dataset.chunks is not None:
+        chunk_frames = dataset.chunks[0]
+    else:
+        frame_size = max(1, int(np.prod(frame_shape)) * dataset.dtype.itemsize)
+        chunk_frames = max(1, READ_BLOCK_SIZE // frame_size)
+    filters = None
+    if workers > 1 and get_decompress_pool(workers) is not None:
+        filters = get_chunk_filters(dataset)
+    block = {'buffer' : None, 'start' : 0, 'stop' : 0}
+
+    def read(start, stop):
+        if start < block['start'] or stop > block['stop']:
+            # read the chunks covering the requested frames; the data set may grow if it is followed in SWMR mode
+            num_frames = dataset.shape[0]
+            block_start = start - start % chunk_frames
+            block_stop = stop + (-stop) % chunk_frames
+            block_stop = min(max(block_stop, block_start + chunk_frames), num_frames)
+            buffer = block['buffer']
+            if buffer is None or buffer.shape[0] < block_stop - block_start:
+                buffer = np.empty((block_stop - block_start,) + frame_shape, dataset.dtype)
+                block['buffer'] = buffer
+            if filters is not None:
+                read_chunks(dataset, filters, buffer, block_start, block_stop, workers)
+            else:
+                dataset.read_direct(buffer, np.s_[block_start:block_stop], np.s_[0:block_stop - block_start])
+            block['start'] = block_start
+            block['stop'] = block_stop
+        frames = block['buffer'][start - block['start']:stop - block['start']]
+        if copy:
+            frames = frames.copy()
+        return frames
+
+    return read
 
 
 def get_data_ge(logger, file):
@@ -341,7 +758,7 @@ def get_data_ge(logger, file):
         A dictionary of data sets with the tag keys
     """
     fp = open(file, 'rb')
-    offset = 8192
+    offset = GE_HEADER_SIZE
 
     fp.seek(18)
     size, nframes = st.unpack('<ih',fp.read(6))
@@ -362,6 +779,42 @@ def get_data_ge(logger, file):
     return fp, int(nframes_calc), size*size
 
 
+def get_ge_reader(file, num_frames, frame_size):
+    """
+    This function returns a reader of frames from GE file.
+
+    The file is memory mapped and viewed as an array of frames, so the returned frames are views of the mapped file,
+    and no frame is copied when read. The pages are read ahead, as the frames are read sequentially.
+
+    Parameters
+    ----------
+    file : str
+        File Name
+
+    num_frames : int
+        number of frames in the file
+
+    frame_size : int
+        number of pixels in a frame
+
+    Returns
+    -------
+    read : function
+        a function taking index of the first frame and index after the last frame, and returning a stack of frames
+    """
+    with open(file, 'rb') as fp:
+        # the mapping stays valid after the file is closed
+        mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+        mapped.madvise(mmap.MADV_SEQUENTIAL)
+    frames = np.frombuffer(mapped, '<u2', num_frames * frame_size, GE_HEADER_SIZE).reshape(num_frames, frame_size)
+
+    def read(start, stop):
+        return frames[start:stop]
+
+    return read
+
+
 def copy_list(list):
     """
     This function takes a list and returns a hardcopy.
@@ -57,24 +57,43 @@ quality check are returned back.
 
 """
 import os.path
+import glob
 import json
 import sys
-import numpy as np
-from multiprocessing import Queue, Process
+from multiprocessing import Queue, Process, cpu_count
 import dquality.common.utilities as utils
+import dquality.common.framebuffer as framebuffer
+import dquality.common.transport as transport
 import dquality.handler as handler
 from dquality.common.containers import Data
 import dquality.common.report as report
+import dquality.common.qualitychecks as calc
+from dquality.common.cache import ResultsCache
 import dquality.common.constants as const
 import time
+if sys.version[0] == '2':
+    import Queue as queue
+else:
+    import queue as queue
+
+# time in seconds between checks for new frames in a followed file
+FOLLOW_INTERVAL = .1
+
+# time in seconds between checks whether the handler process is alive, while its results are awaited
+HANDLER_POLL_INTERVAL = 1
 
 __author__ = "Barbara Frosik"
 __copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
 __docformat__ = 'restructuredtext en'
 __all__ = ['init',
+           'get_data_items',
            'verify_file_hdf',
            'verify_file_ge',
-           'verify']
+           'verify_file',
+           'verify',
+           'verify_files',
+           'get_results_file',
+           'reevaluate']
 
 
 def init(config):
@@ -115,6 +134,15 @@ def init(config):
     consumers : dict
         a dictionary containing consumer processes to run, and their parameters
 
+    processing : Processing
+        parameters of frames processing, see utilities.get_processing
+
+    cache_dir : str
+        a directory where the verification results cache is located, None if the results are not cached
+
+    save_results : bool
+        True if the values of quality checks of each frame are saved in a results file along the report
+
     """
 
     conf = utils.get_config(config)
@@ -172,10 +200,161 @@ def init(config):
         with open(consumersfile) as consumers_file:
             consumers = json.loads(consumers_file.read())
 
-    return logger, data_tags, limits, quality_checks, file_type, report_type, report_dir, consumers
+    processing = utils.get_processing(conf, logger)
+
+    # configure the hdf metadata cache and file pool; the results are cached in the same directory
+    cache_dir = utils.init_hdf(conf, logger)
+
+    try:
+        save_results = conf['save_results'] == 'True'
+    except KeyError:
+        save_results = False
+
+    return logger, data_tags, limits, quality_checks, file_type, report_type, report_dir, consumers, processing, \
+           cache_dir, save_results
+
+
+def get_data_items(read, num_frames, data_type, batch_size=None, replay_fps=None):
+    """
+    This function is a generator of Data instances holding frames of a data set.
+
+    If the batch size is not configured, each Data instance holds a single frame. Otherwise it holds a stack of
+    frames, up to batch size frames. The frames are read as fast as they are consumed, unless the replay rate is
+    configured, in which case the frames are released at that rate to simulate acquisition.
+
+    Parameters
+    ----------
+    read : function
+        a function reading frames of the data set; it takes index of the first frame and index after the last frame,
+        and returns a stack of frames
+
+    num_frames : int
+        number of frames in the data set
+
+    data_type : str
+        data type of the frames, i.e. 'data', 'data_dark', or 'data_white'
+
+    batch_size : int
+        number of frames in a stack, or None if frames are read one by one
+
+    replay_fps : float
+        a rate in frames per second the frames are released at, or None if released at full speed
+
+    Returns
+    -------
+    data : Data
+        a Data instance, yielded for each frame or stack of frames
+    """
+    start = time.time()
+
+    def wait(index):
+        # the schedule is kept from the start, so the delays in reading do not accumulate
+        if replay_fps is not None:
+            delay = start + index / replay_fps - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+    if batch_size is None:
+        for i in range(num_frames):
+            wait(i)
+            yield Data(const.DATA_STATUS_DATA, read(i, i + 1)[0], data_type)
+    else:
+        for i in range(0, num_frames, batch_size):
+            wait(i)
+            yield Data(const.DATA_STATUS_BATCH, read(i, min(i + batch_size, num_frames)), data_type)
+
+
+def follow_data_set(dt, next_dts, follow_timeout, process):
+    """
+    This function follows a data set of a file written in SWMR mode.
+
+    The frames are processed as they are appended, until any of the next data sets is started, or no frame is appended
+    for follow_timeout seconds. When the next data set is started, the data set is checked once more, so the frames
+    appended before the next data set was started are processed.
+
+    Parameters
+    ----------
+    dt : h5py.Dataset
+        the followed data set of frames
+
+    next_dts : list
+        a list of data sets written after the followed data set
+
+    follow_timeout : float
+        a time in seconds to wait for new frames
+
+    process : function
+        a function taking index of the first appended frame and index after the last appended frame
+
+    Returns
+    -------
+    None
+    """
+    done = {'frames': 0}
+
+    def process_appended():
+        # returns True if any frame was appended since the last call
+        dt.refresh()
+        num_frames = dt.shape[0]
+        if num_frames == done['frames']:
+            return False
+        process(done['frames'], num_frames)
+        done['frames'] = num_frames
+        return True
+
+    last_frame_time = time.time()
+    while True:
+        if process_appended():
+            last_frame_time = time.time()
+            continue
+        started = False
+        for next_dt in next_dts:
+            next_dt.refresh()
+            started = started or next_dt.shape[0] > 0
+        if started:
+            # the frames appended between the refreshes of the data set and the next data set
+            process_appended()
+            break
+        if time.time() - last_frame_time > follow_timeout:
+            break
+        time.sleep(FOLLOW_INTERVAL)
+
+
+def stop_handler(p, aggregateq, frame_buffer):
+    """
+    This function waits for the handler process to finish after the verification of a file failed.
+
+    The end of data marker must be enqueued before calling this function. The results of the handler are discarded. If
+    the handler process exited without results, it is not waited for.
+
+    Parameters
+    ----------
+    p : Process
+        the handler process
+
+    aggregateq : Queue
+        a queue the handler enqueues the results into
 
+    frame_buffer : FrameBuffer
+        a shared memory frame buffer, or None if frames are passed by value
 
-def verify_file_hdf(logger, file, data_tags, limits, quality_checks, report_type, report_dir, consumers):
+    Returns
+    -------
+    None
+    """
+    while p.is_alive():
+        try:
+            aggregateq.get(timeout=HANDLER_POLL_INTERVAL)
+            break
+        except queue.Empty:
+            pass
+    p.join()
+    if frame_buffer is not None:
+        frame_buffer.close(True)
+
+
+def verify_file_hdf(logger, file, data_tags, limits, quality_checks, report_type, report_dir, consumers,
+                    processing=None, aggregates=None):
     """
     This method handles verification of data in hdf type file.
 
@@ -210,61 +389,94 @@ def verify_file_hdf(logger, file, data_tags, limits, quality_checks, report_type
     consumers : dict
         a dictionary containing consumer processes to run, and their parameters
 
+    processing : Processing
+        parameters of frames processing, see utilities.get_processing, defaulted to None, meaning none is configured.
+        If follow_timeout is configured, the file is written in SWMR mode while it is verified. The data sets are
+        followed in order, and the verification ends when no frame is appended for follow_timeout seconds
+
+    aggregates : dict
+        a dictionary the stores holding result values are added to, keyed by data type, defaulted to None
+
     Returns
     -------
     bad_indexes : dict
         a dictionary of bad indexes per data type
 
     """
+    def process_frames(read, num_frames, data_type):
+        for data in get_data_items(read, num_frames, data_type, processing.batch_size, processing.replay_fps):
+            if frame_buffer is not None:
+                frame_buffer.put(data)
+            dataq.put(data)
+
     def process_data(data_type):
         data_tag = data_tags[data_type]
         dt = fp[data_tag]
-        for i in range(0,dt.shape[0]):
-            data = Data(const.DATA_STATUS_DATA, dt[i], data_type)
-            dataq.put(data)
-            # add delay to slow down flow up, so the flow down (results)
-            # are handled in synch
-            time.sleep(.1)
+        # the frames are passed on before the next read, unless the queue pickles them in a background thread
+        read = utils.get_hdf_reader(dt, not transport.is_supported())
+        process_frames(read, dt.shape[0], data_type)
 
-    fp, tags = utils.get_data_hdf(file)
-    dataq = Queue()
-    aggregateq = Queue()
+    def follow_data(data_type, next_types):
+        dt = fp[data_tags[data_type]]
+        read = utils.get_hdf_reader(dt, not transport.is_supported())
 
-    p = Process(target=handler.handle_data, args=(dataq, limits, aggregateq, quality_checks, consumers))
-    p.start()
+        def process_appended(offset, stop):
+            process_frames(lambda start, stop: read(offset + start, offset + stop), stop - offset, data_type)
 
-    # assume a fixed order of data types; this will determine indexes on the data
-    if 'data_dark' in data_tags:
-        process_data('data_dark')
-    if 'data_white' in data_tags:
-        process_data('data_white')
-    if 'data' in data_tags:
-        process_data('data')
+        follow_data_set(dt, [fp[data_tags[next_type]] for next_type in next_types], processing.follow_timeout,
+                        process_appended)
 
-    dataq.put(Data(const.DATA_STATUS_END))
+    if processing is None:
+        processing = utils.Processing()
+    dataq = transport.get_data_queue()
+    aggregateq = Queue()
 
+    frame_buffer = None
+    if processing.frame_buffer_slots is not None:
+        frame_buffer = framebuffer.FrameBuffer(processing.frame_buffer_slots)
 
+    report_writer = None
     if report_type != const.REPORT_NONE:
-        if report_dir is None:
-            report_file = file.rsplit(".",)[0] + '.report'
-        else:
-            file = file.rsplit(".",)[0]
-            file_path = file.rsplit("/",)
-            report_file = report_dir + "/" + file_path[len(file_path-1)]+ '.report'
+        report_file = get_report_file(file, const.FILE_TYPE_HDF, report_dir)
+        report_writer = report.ReportWriter(logger, report_file, report_type, file)
+
+    p = Process(target=handler.handle_data,
+                args=(dataq, limits, aggregateq, quality_checks, None, consumers, None, processing.num_workers,
+                      frame_buffer, processing.reorder_window, report_writer))
+    p.start()
+
+    # assume a fixed order of data types; this will determine indexes on the data
+    types = [type for type in ['data_dark', 'data_white', 'data'] if type in data_tags]
+    failed = True
+    try:
+        with utils.get_data_hdf(file, processing.follow_timeout is not None) as (fp, tags):
+            for i in range(len(types)):
+                if processing.follow_timeout is None:
+                    process_data(types[i])
+                else:
+                    follow_data(types[i], types[i + 1:])
+        failed = False
+    finally:
+        # the handler and its quality check processes finish on the end of data marker, also if reading failed
+        dataq.put(Data(const.DATA_STATUS_END))
+        if failed:
+            stop_handler(p, aggregateq, frame_buffer)
 
     # receive the results
     bad_indexes = {}
     aggregate = aggregateq.get()
-
-    if report_file is not None:
-        report.report_results(logger, aggregate, None, report_file, report_type)
+    if frame_buffer is not None:
+        frame_buffer.close(True)
     report.add_bad_indexes(aggregate, bad_indexes)
+    if aggregates is not None:
+        aggregates.update(aggregate)
 
     logger.info('data verifier evaluated ' + file + ' file')
     return bad_indexes
 
 
-def verify_file_ge(logger, file, limits, quality_checks, report_type, report_dir, consumers):
+def verify_file_ge(logger, file, limits, quality_checks, report_type, report_dir, consumers, processing=None,
+                   aggregates=None):
     """
     This method handles verification of data in a ge file type.
     This method creates and starts a new handler process. The handler is initialized with data queue,
@@ -295,6 +507,12 @@ def verify_file_ge(logger, file, limits, quality_checks, report_type, report_dir
     consumers : dict
         a dictionary containing consumer processes to run, and their parameters
 
+    processing : Processing
+        parameters of frames processing, see utilities.get_processing, defaulted to None, meaning none is configured
+
+    aggregates : dict
+        a dictionary the stores holding result values are added to, keyed by data type, defaulted to None
+
     Returns
     -------
     bad_indexes : dict
@@ -308,37 +526,238 @@ def verify_file_ge(logger, file, limits, quality_checks, report_type, report_dir
     if fp is None:
         return None
 
-    dataq = Queue()
+    if processing is None:
+        processing = utils.Processing()
+    dataq = transport.get_data_queue()
     aggregateq = Queue()
 
-    p = Process(target=handler.handle_data, args=(dataq, limits, aggregateq, quality_checks, consumers))
+    frame_buffer = None
+    if processing.frame_buffer_slots is not None:
+        frame_buffer = framebuffer.FrameBuffer(processing.frame_buffer_slots)
+
+    report_writer = None
+    if report_type != const.REPORT_NONE:
+        report_file = get_report_file(file, const.FILE_TYPE_GE, report_dir)
+        report_writer = report.ReportWriter(logger, report_file, report_type, file)
+
+    p = Process(target=handler.handle_data,
+                args=(dataq, limits, aggregateq, quality_checks, None, consumers, None, processing.num_workers,
+                      frame_buffer, processing.reorder_window, report_writer))
     p.start()
 
-    for i in range(0,nframes):
-        img = np.fromfile(fp,'uint16', fsize)
-        dataq.put(Data(const.DATA_STATUS_DATA, img, type))
-        time.sleep(.2)
-    dataq.put(Data(const.DATA_STATUS_END))
+    fp.close()
+    failed = True
+    try:
+        read = utils.get_ge_reader(file, nframes, fsize)
+        for data in get_data_items(read, nframes, type, processing.batch_size, processing.replay_fps):
+            if frame_buffer is not None:
+                frame_buffer.put(data)
+            dataq.put(data)
+        failed = False
+    finally:
+        # the handler and its quality check processes finish on the end of data marker, also if reading failed
+        dataq.put(Data(const.DATA_STATUS_END))
+        if failed:
+            stop_handler(p, aggregateq, frame_buffer)
 
     # receive the results
     bad_indexes = {}
     aggregate = aggregateq.get()
+    if frame_buffer is not None:
+        frame_buffer.close(True)
     report.add_bad_indexes(aggregate, bad_indexes)
+    if aggregates is not None:
+        aggregates.update(aggregate)
 
-    if report_type != const.REPORT_NONE:
-        if report_dir is None:
-            report_file = file + '.report'
-        else:
-            file_path = file.rsplit("/",)
-            report_file = report_dir + "/" + file_path[len(file_path)-1]+ '.report'
+    logger.info('data verifier evaluated ' + file + ' file')
 
-        report.report_results(logger, aggregate, file, report_file, report_type)
+    return bad_indexes
 
-    logger.info('data verifier evaluated ' + file + ' file')
 
+def get_report_file(file, file_type, report_dir):
+    """
+    This function returns name of the report file of the given data file.
+
+    Parameters
+    ----------
+    file : str
+        a data file name including path
+
+    file_type : int
+        data file type, the extension of hdf files is replaced
+
+    report_dir : str
+        a directory where report files are located, or None if they are located along the data files
+
+    Returns
+    -------
+    report_file : str
+        the report file name
+    """
+    if file_type == const.FILE_TYPE_HDF:
+        file = file.rsplit(".",)[0]
+    if report_dir is not None:
+        file_path = file.rsplit("/",)
+        file = report_dir + "/" + file_path[len(file_path)-1]
+    return file + '.report'
+
+
+def write_report(logger, file, file_type, report_type, report_dir, aggregates):
+    """
+    This function writes the report of the given data file from the stores of results, when the data was not
+    verified, but the results were taken from the cache.
+
+    Parameters
+    ----------
+    logger : Logger
+        logger instance
+
+    file : str
+        a data file name including path
+
+    file_type : int
+        data file type
+
+    report_type : int
+        report type, currently supporting 'none, 'errors', and 'full'
+
+    report_dir : str
+        a directory where report files are located, or None if they are located along the data files
+
+    aggregates : dict <data_type : ResultsStore>
+        dictionary with stores holding result values keyed by data type
+
+    Returns
+    -------
+    None
+    """
+    report_writer = report.ReportWriter(logger, get_report_file(file, file_type, report_dir), report_type, file)
+    for type in sorted(aggregates):
+        report_writer.write_store(type, aggregates[type])
+    report_writer.close()
+
+
+def get_results_file(file, report_dir):
+    """
+    This function returns name of the file the values of quality checks of each frame of the given data file are saved
+    in.
+
+    Parameters
+    ----------
+    file : str
+        a data file name including path
+
+    report_dir : str
+        a directory where report files are located, or None if they are located along the data files
+
+    Returns
+    -------
+    results_file : str
+        the results file name
+    """
+    if report_dir is not None:
+        file = os.path.join(report_dir, os.path.basename(file))
+    return file + '.results.npz'
+
+
+def verify_file(logger, file, data_tags, limits, quality_checks, file_type, report_type, report_dir, consumers,
+                processing=None, cache_dir=None, save_results=False):
+    """
+    This function verifies data in a given file, calling the verification function for the file type.
+
+    The parameters following the file name are in order returned by init function. If the cache directory is
+    configured, and the file with the same path, size and modification time was verified before with the same
+    configuration, the data is not read. If the limits did not change, the cached bad indexes are returned, otherwise
+    the cached values of the basic quality checks are evaluated against the limits. A file followed in SWMR mode is not
+    cached. If save_results is True, the values of quality checks of each frame are saved in a results file, that can
+    be evaluated against different limits with reevaluate function.
+
+    Returns
+    -------
+    bad_indexes : Dict
+        A dictionary containing indexes of slices that did not pass quality check. The key is a type of data.
+        (i.e. data_dark, data_white,data)
+    """
+    def verify_data(aggregates=None):
+        if file_type == const.FILE_TYPE_HDF:
+            return verify_file_hdf(logger, file, data_tags, limits, quality_checks, report_type, report_dir,
+                                   consumers, processing, aggregates)
+        elif file_type == const.FILE_TYPE_GE:
+            return verify_file_ge(logger, file, limits, quality_checks, report_type, report_dir, consumers,
+                                  processing, aggregates)
+
+    def get_results(aggregates):
+        results = {}
+        for type in aggregates:
+            results[type] = aggregates[type].get_rows()[:3]
+        return results
+
+    results = None
+    if cache_dir is None or (processing is not None and processing.follow_timeout is not None):
+        aggregates = {}
+        bad_indexes = verify_data(aggregates)
+        results = get_results(aggregates)
+    else:
+        config = json.dumps([file_type, data_tags, quality_checks], sort_keys=True)
+        cache = ResultsCache(cache_dir)
+        id, cached_limits, bad_indexes = cache.get(file, config)
+        if id is not None and cached_limits == limits:
+            if save_results:
+                results = cache.get_results(id)
+            if report_type != const.REPORT_NONE:
+                # the report is written again, as it may not exist, or be of other report type
+                write_report(logger, file, file_type, report_type, report_dir,
+                             reevaluate_results(limits, quality_checks, cache.get_results(id)))
+        elif id is not None and all(calc.get_sat_high(cached_limits.get(type, {})) ==
+                                    calc.get_sat_high(limits.get(type, {})) for type in quality_checks):
+            # the stored values are valid for the new limits
+            aggregates = reevaluate_results(limits, quality_checks, cache.get_results(id))
+            bad_indexes = {}
+            report.add_bad_indexes(aggregates, bad_indexes)
+            cache.update(id, limits, bad_indexes)
+            results = get_results(aggregates)
+            if report_type != const.REPORT_NONE:
+                write_report(logger, file, file_type, report_type, report_dir, aggregates)
+            logger.info('data verifier evaluated cached results of ' + file + ' file')
+        else:
+            aggregates = {}
+            bad_indexes = verify_data(aggregates)
+            if bad_indexes is not None:
+                cache.add(file, config, limits, bad_indexes, aggregates)
+            results = get_results(aggregates)
+        cache.close()
+
+    if save_results and bad_indexes is not None:
+        report.write_results_file(get_results_file(file, report_dir), limits, results)
     return bad_indexes
 
 
+def reevaluate_results(limits, quality_checks, results):
+    """
+    This function evaluates the values of quality checks of each frame against the given limits.
+
+    Parameters
+    ----------
+    limits : dict
+        a dictionary of limits values
+
+    quality_checks : dict
+        a dictinary specifying quality checks structure
+
+    results : dict
+        a dictionary keyed by data type of tuples of arrays: frame index, quality check id and value of each result
+
+    Returns
+    -------
+    aggregates : dict <data_type : ResultsStore>
+        dictionary with stores holding result values keyed by data type
+    """
+    aggregates = {}
+    for type in results:
+        aggregates[type] = calc.reevaluate_results(type, limits[type], quality_checks[type], *results[type]).store
+    return aggregates
+
+
 def verify(conf, file):
     """
     This function verifies data in a given file.
@@ -368,14 +787,159 @@ def verify(conf, file):
         (i.e. data_dark, data_white,data)
     """
 
-    logger, data_tags, limits, quality_checks, file_type, report_type, report_dir, consumers  = init(conf)
+    params = init(conf)
+    logger = params[0]
     if not os.path.isfile(file):
         logger.error(
             'parameter error: file ' +
             file + ' does not exist')
         sys.exit(-1)
 
-    if file_type == const.FILE_TYPE_HDF:
-        return verify_file_hdf(logger, file, data_tags, limits, quality_checks, report_type, report_dir, consumers)
-    elif file_type == const.FILE_TYPE_GE:
-        return verify_file_ge(logger, file, limits, quality_checks, report_type, report_dir, consumers)
+    return verify_file(logger, file, *params[1:])
+
+
+def verify_files_worker(fileq, resultq, logger, params):
+    """
+    This function verifies files taken from a queue, until it takes None.
+
+    Parameters
+    ----------
+    fileq : Queue
+        a queue of file names to verify
+
+    resultq : Queue
+        a queue the file name and bad indexes of each verified file are put into
+
+    logger: Logger
+        Logger instance.
+
+    params : tuple
+        the parameters of verify_file following the file name
+
+    Returns
+    -------
+    None
+    """
+    while True:
+        file = fileq.get()
+        if file is None:
+            break
+        try:
+            bad_indexes = verify_file(logger, file, *params)
+        except Exception as e:
+            logger.error('verification of file ' + file + ' failed: ' + str(e))
+            bad_indexes = None
+        resultq.put((file, bad_indexes))
+
+
+def verify_files(conf, files, num_file_workers=None):
+    """
+    This function verifies data in many files concurrently.
+
+    The files are verified by a bounded pool of processes, each verifying one file at a time. If the number of quality
+    check processes is not configured, the cpus are divided between the files verified at the same time.
+
+    Parameters
+    ----------
+    conf : str
+        name of the configuration file including path
+
+    files : str or list
+        a file name or a glob pattern, or a list of file names or glob patterns
+
+    num_file_workers : int
+        number of files verified at the same time, defaulted to None, meaning number of cpus, but not more than
+        number of files
+
+    Returns
+    -------
+    bad_indexes : Dict
+        A dictionary keyed by file name, containing dictionaries of indexes of slices that did not pass quality check
+        keyed by a type of data, or None if the file could not be verified.
+    """
+    logger, data_tags, limits, quality_checks, file_type, report_type, report_dir, consumers, processing, cache_dir, \
+        save_results = init(conf)
+    if not isinstance(files, list):
+        files = [files]
+    bad_indexes = {}
+    file_list = []
+    for pattern in files:
+        found = sorted(glob.glob(pattern))
+        if len(found) == 0:
+            logger.warning('parameter error: no file matches ' + pattern)
+        for file in found:
+            if os.path.isfile(file) and file not in bad_indexes:
+                file_list.append(file)
+                bad_indexes[file] = None
+
+    if len(file_list) == 0:
+        return bad_indexes
+
+    if num_file_workers is None:
+        num_file_workers = cpu_count()
+    num_file_workers = min(num_file_workers, len(file_list))
+
+    # the cpus are divided between the files, unless the number of quality check processes per file is configured
+    if processing.num_workers is None:
+        processing = processing._replace(num_workers=max(1, cpu_count() // num_file_workers))
+    params = (data_tags, limits, quality_checks, file_type, report_type, report_dir, consumers, processing, cache_dir,
+              save_results)
+
+    fileq = Queue()
+    resultq = Queue()
+    for file in file_list:
+        fileq.put(file)
+    workers = []
+    for _ in range(num_file_workers):
+        fileq.put(None)
+        p = Process(target=verify_files_worker, args=(fileq, resultq, logger, params))
+        p.start()
+        workers.append(p)
+
+    for _ in range(len(file_list)):
+        file, file_bad_indexes = resultq.get()
+        bad_indexes[file] = file_bad_indexes
+    for p in workers:
+        p.join()
+
+    logger.info('data verifier evaluated ' + str(len(file_list)) + ' files')
+    return bad_indexes
+
+
+def reevaluate(conf, results_file):
+    """
+    This function evaluates the values of quality checks saved in a results file against the configured limits.
+
+    The data is not read. The number of saturated pixels depends on the saturation limit, so if the limit changed,
+    the saved number is used, and a warning is logged.
+
+    Parameters
+    ----------
+    conf : str
+        name of the configuration file including path
+
+    results_file : str
+        a results file saved by the data verifier
+
+    Returns
+    -------
+    bad_indexes : Dict
+        A dictionary containing indexes of slices that did not pass quality check. The key is a type of data.
+        (i.e. data_dark, data_white,data)
+    """
+    logger, data_tags, limits, quality_checks = init(conf)[:4]
+    if not os.path.isfile(results_file):
+        logger.error(
+            'parameter error: file ' +
+            results_file + ' does not exist')
+        sys.exit(-1)
+
+    saved_limits, results = report.read_results_file(results_file)
+    for type in results:
+        if calc.get_sat_high(saved_limits.get(type, {})) != calc.get_sat_high(limits.get(type, {})):
+            logger.warning('the saturated pixels of ' + type + ' were counted with different saturation limit')
+
+    bad_indexes = {}
+    report.add_bad_indexes(reevaluate_results(limits, quality_checks, results), bad_indexes)
+    logger.info('data verifier evaluated results file ' + results_file)
+    return bad_indexes
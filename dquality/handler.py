@@ -54,24 +54,31 @@ and handles results of the checks.
 
 """
 
-from multiprocessing import Queue, Process
+import logging
+from multiprocessing import Queue, Process, cpu_count
+import numpy as np
+import time
 import dquality.common.constants as const
 import dquality.common.qualitychecks as calc
-from dquality.common.containers import Aggregate, Consumer_adapter
-import sys
-from collections import deque
-if sys.version[0] == '2':
-    import Queue as queue
-else:
-    import queue as queue
+from dquality.common.containers import Aggregate, Consumer_adapter, Data, Result, Results, ReorderBuffer
+import dquality.common.transport as transport
+try:
+    from multiprocessing.connection import wait
+except ImportError:
+    wait = None
 
 __author__ = "Barbara Frosik"
 __copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
 __docformat__ = 'restructuredtext en'
 __all__ = ['init_consumers',
-           'send_to_consumers',
+           'init_workers',
+           'stop_workers',
+           'wait_for_queues',
            'handle_data']
 
+# the errors of quality check processes are logged, as the processes have no configured logger
+logger = logging.getLogger(__name__)
+
 
 def init_consumers(consumers):
     """
@@ -102,70 +109,167 @@ def init_consumers(consumers):
     return consumers_q
 
 
-def send_to_consumers(waiting_q, consumers_q, results):
+def quality_worker(taskq, resultsq, limits, quality_checks, frame_buffer=None):
     """
-    This function receives frames in a real time and delivers them to the consumer processes.
+    This function is a body of a long-lived quality check process.
 
-    It reads consumer processes parameters from the 'consumers' dictionary, adds installation directory to the path for
-    each consumer process, and starts the processes with retrieved arguments.
+    It dequeues tasks from the 'taskq' queue and runs the quality checks applicable to the data type of the received
+    frame. If the data is a stack of frames, the checks are evaluated for all frames at once, and results for each
+    frame are enqueued. The results are enqueued into 'resultsq' queue. The process exits when it dequeues data
+    indicating end status. If the frame is passed in a shared memory slot, the checks run on the slot view, and the
+    slot is released when the checks are done. If a quality check raises an exception, for example if the limits for
+    the check are not configured, the frames are reported as failed, with no results.
 
     Parameters
     ----------
-    waiting_q : deque
-        an instance of collection.deque used to pass frames and the results
+    taskq : Queue
+        a queue delivering tasks; a task is a tuple of frame data and frame index
+
+    resultsq : Queue
+        a queue to which the results are enqueued
 
-    consumer_q : list
-        a list of Queues on which the frames are delivered to consumers
+    limits : dictionary
+        a dictionary of limits keyed by data type
+
+    quality_checks : dict
+        a dictionary of quality checks lists keyed by data type
 
-    results : Results
-       a Results container that holds results for the frame
+    frame_buffer : FrameBuffer
+        a shared memory frame buffer, or None if frames are passed by value
 
     Returns
     -------
     none
     """
-    index = results.index
-    tempq = deque()
-
-    def send_data(data):
-        if data.status == const.DATA_STATUS_DATA:
-            data.failed = results.failed
-        for consumerq in consumers_q:
-            consumerq.put(data)
-
-    search = True
-    while search:
-        data = waiting_q.pop()
-        if data.status == const.DATA_STATUS_END:
-            if len(tempq) == 0:
-                if len(waiting_q) == 0:
-                    send_data(data)
-                else:
-                    waiting_q.append_left(data)
-            else:
-                waiting_q.append_left(data)
-                while len(tempq) > 0:
-                    waiting_q.append(tempq.popleft())
-            search = False
-        elif data.status == const.DATA_STATUS_MISSING:
-            # send missing frames
-            if data.index < index:
-                send_data(data)
-            else:
-                tempq.appendleft(data)
+    while True:
+        task = taskq.get()
+        if task == const.DATA_STATUS_END:
+            break
+        data, index = task
+        if data.status == const.DATA_STATUS_BATCH:
+            run_checks = calc.run_batch_quality_checks
         else:
-            if data.index == results.index:
-                send_data(data)
-                search = False
+            run_checks = calc.run_quality_checks
+        if data.slot is not None:
+            data.slice = frame_buffer.get(data)
+        try:
+            run_checks(data, index, resultsq, limits[data.type], quality_checks[data.type])
+        except Exception:
+            # the frames that could not be evaluated are reported as failed, so the handler receives results for
+            # each frame, and the process remains in the pool; the error result is stored, so the frames stay failed
+            # when the stored results are evaluated again
+            logger.exception('quality checks of ' + str(data.type) + ' frame ' + str(index) + ' raised an error')
+            if data.status == const.DATA_STATUS_BATCH:
+                num_frames = data.slice.shape[0]
             else:
-                #put on temp queue
-                tempq.appendleft(data)
-    while len(tempq) > 0:
-        waiting_q.append(tempq.popleft())
+                num_frames = 1
+            for i in range(num_frames):
+                error = Result(0.0, const.QUALITYCHECK_ERROR, const.QUALITYERROR_CHECK)
+                resultsq.put(Results(data.type, index + i, True, {const.QUALITYCHECK_ERROR : error}))
+        finally:
+            if data.slot is not None:
+                data.slice = None
+                frame_buffer.release(data)
+    if frame_buffer is not None:
+        frame_buffer.close()
+
+
+def init_workers(num_workers, resultsq, limits, quality_checks, frame_buffer=None):
+    """
+    This function starts a pool of quality check processes.
+
+    The processes are started once and run for the life of the handler. Each process receives frames on a shared
+    task queue, and enqueues the results into 'resultsq' queue.
+
+    Parameters
+    ----------
+    num_workers : int
+        number of quality check processes to start
 
+    resultsq : Queue
+        a queue to which the results are enqueued
 
+    limits : dictionary
+        a dictionary of limits keyed by data type
+
+    quality_checks : dict
+        a dictionary of quality checks lists keyed by data type
+
+    frame_buffer : FrameBuffer
+        a shared memory frame buffer, or None if frames are passed by value
+
+    Returns
+    -------
+    taskq : Queue
+        a queue used to deliver tasks to the quality check processes
+
+    workers : list
+        a list of started processes
+    """
+    taskq = transport.get_data_queue()
+    workers = []
+    for _ in range(num_workers):
+        p = Process(target=quality_worker, args=(taskq, resultsq, limits, quality_checks, frame_buffer))
+        p.start()
+        workers.append(p)
+    return taskq, workers
 
-def handle_data(dataq, limits, reportq, quality_checks, aggregate_limit, consumers=None, feedback_obj=None):
+
+def stop_workers(taskq, workers):
+    """
+    This function stops the pool of quality check processes.
+
+    It enqueues end of data marker for each process and waits for the processes to exit.
+
+    Parameters
+    ----------
+    taskq : Queue
+        a queue used to deliver tasks to the quality check processes
+
+    workers : list
+        a list of started processes
+
+    Returns
+    -------
+    none
+    """
+    for _ in workers:
+        taskq.put(const.DATA_STATUS_END)
+    for p in workers:
+        p.join()
+
+
+def wait_for_queues(queues):
+    """
+    This function blocks until at least one of the given queues has data.
+
+    The function waits on the pipes underlying the queues, so the calling process does not use cpu while waiting, and
+    wakes up as soon as data arrives. If waiting on multiple pipes is not supported by the python version, the queues
+    are polled.
+
+    Parameters
+    ----------
+    queues : list
+        a list of multiprocessing Queues
+
+    Returns
+    -------
+    ready : list
+        a list of queues that have data
+    """
+    if wait is None:
+        while True:
+            ready = [q for q in queues if not q.empty()]
+            if len(ready) > 0:
+                return ready
+            time.sleep(.005)
+
+    readers = dict((q._reader, q) for q in queues)
+    return [readers[reader] for reader in wait(list(readers))]
+
+
+def handle_data(dataq, limits, reportq, quality_checks, aggregate_limit, consumers=None, feedback_obj=None,
+                num_workers=None, frame_buffer=None, reorder_window=None, report_writer=None):
     """
     This function creates and initializes all variables and handles data received on a 'dataq' queue.
 
@@ -181,13 +285,17 @@ def handle_data(dataq, limits, reportq, quality_checks, aggregate_limit, consume
     queue for quality checks results passing, queue for statistical quality checks results passing,
     and initializing variables.
 
-    This function has a loop that retrieves data from the data queue, runs a sequence of
-    validation methods on the data, and retrieves results from the results queues.
+    This function has a loop that retrieves data from the data queue, delivers the data to a pool of quality check
+    processes that run a sequence of validation methods on the data, and retrieves results from the results queues.
+    The pool is started once, and the processes are reused for all frames. The data can be a single frame, or a
+    stack of frames, in which case the frames are assigned consecutive indexes, and the results are handled for each
+    frame.
     Each result object contains information whether the data was out of limits, in addition
     to the value and index. Each result is additionally evaluated with relation to the previously
     accumulated results.
 
-    The loop is interrupted when the data queue received end of data element, and all
+    The loop waits on the data queue and the results queue at the same time, and wakes up when either of them has
+    data. The loop is interrupted when the data queue received end of data element, and all
     processes produced results.
 
 
@@ -207,21 +315,39 @@ def handle_data(dataq, limits, reportq, quality_checks, aggregate_limit, consume
         keys are ids of the basic quality check methods, and values are lists of statistical methods ids;
         the statistical methods use result from the "key" basic quality method.
 
+    aggregate_limit : int
+        -1 if the results are not aggregated, a positive number limiting the aggregated results to the given number
+        of recent frames, or None if not limited
+
     consumers : dict
         a dictionary containing consumer processes to run, and their parameters
 
     feedback_obj : Feedback
         a Feedback container that contains information for the real-time feedback. Defaulted to None.
 
+    num_workers : int
+        number of quality check processes in the pool. Defaulted to None, in which case number of cpus is used.
+
+    frame_buffer : FrameBuffer
+        a shared memory frame buffer the frames are passed in. Defaulted to None, in which case frames are passed by
+        value.
+
+    reorder_window : int
+        a number of frames a frame can be delivered to consumers ahead of a frame that still waits for results.
+        Defaulted to None, in which case the frames are delivered to consumers in order.
+
+    report_writer : ReportWriter
+        a writer the results of each frame are reported to as they are handled. Defaulted to None, in which case the
+        results are not reported.
+
     Returns
     -------
     None
     """
-    consumers_q = None
-    waiting_q = None
+    reorder_buffer = None
     if consumers is not None:
         consumers_q = init_consumers(consumers)
-        waiting_q = deque()
+        reorder_buffer = ReorderBuffer(consumers_q, frame_buffer, reorder_window)
 
     feedbackq = None
     if feedback_obj is not None:
@@ -234,58 +360,89 @@ def handle_data(dataq, limits, reportq, quality_checks, aggregate_limit, consume
     for type in types:
         aggregates[type] = Aggregate(type, quality_checks[type], aggregate_limit, feedbackq)
 
+    def handle_results(results):
+        # the statistical checks are run here, against the aggregate that holds all results handled so far
+        type = results.type
+        calc.run_statistical_checks(limits[type], aggregates[type], quality_checks[type], results)
+        aggregates[type].handle_results(results)
+        if report_writer is not None:
+            report_writer.write(results)
+        if reorder_buffer is not None:
+            reorder_buffer.add_results(results)
+
     resultsq = Queue()
+    if num_workers is None:
+        num_workers = cpu_count()
+    taskq, workers = init_workers(num_workers, resultsq, limits, quality_checks, frame_buffer)
     interrupted = False
     index = 0
-    num_processes = 0
+    num_pending = 0
     while not interrupted:
-        try:
-            data = dataq.get(timeout=0.005)
+        ready = wait_for_queues([dataq, resultsq])
+        if dataq in ready:
+            data = dataq.get()
             if data.status == const.DATA_STATUS_END:
                 interrupted = True
-                while num_processes > 0:
+                while num_pending > 0:
                     results = resultsq.get()
-                    aggregates[results.type].handle_results(results)
-                    num_processes -= 1
+                    handle_results(results)
+                    num_pending -= 1
                 if feedbackq is not None:
                     for _ in range(len(aggregates)):
                         feedbackq.put(const.DATA_STATUS_END)
-                if waiting_q is not None:
-                    waiting_q.appendleft(data)
-                    send_to_consumers(waiting_q, consumers_q, results)
+                if reorder_buffer is not None:
+                    reorder_buffer.close(data)
 
             elif data.status == const.DATA_STATUS_MISSING:
-                if waiting_q is not None:
+                if reorder_buffer is not None:
                     data.index = index
-                    waiting_q.appendleft(data)
+                    reorder_buffer.add_frame(data)
                 index += 1
 
+            elif data.status == const.DATA_STATUS_BATCH:
+                if data.slot is None:
+                    stack = data.slice
+                else:
+                    stack = frame_buffer.get(data)
+                num_frames = stack.shape[0]
+                if reorder_buffer is not None:
+                    # the consumers receive single frames
+                    for i in range(num_frames):
+                        frame = Data(const.DATA_STATUS_DATA, np.array(stack[i]), data.type)
+                        frame.index = index + i
+                        reorder_buffer.add_frame(frame)
+                # the view of a shared memory slot must not outlive the segment
+                del stack
+                taskq.put((data, index))
+                num_pending += num_frames
+                index += num_frames
+
             else:
-                if waiting_q is not None:
+                if reorder_buffer is not None:
                     data.index = index
-                    waiting_q.appendleft(data)
-                type = data.type
-                p = Process(target=calc.run_quality_checks,
-                            args=(data, index, resultsq, aggregates[type], limits[type], quality_checks[type]))
-                p.start()
-                num_processes += 1
+                    reorder_buffer.add_frame(data)
+                    if data.slot is not None:
+                        # hold the slot until the frame is delivered to consumers
+                        frame_buffer.retain(data)
+                taskq.put((data, index))
+                num_pending += 1
                 index += 1
 
-        except queue.Empty:
-            pass
-
         while not resultsq.empty():
             results = resultsq.get_nowait()
-            aggregates[results.type].handle_results(results)
-            num_processes -= 1
-            if consumers is not None:
-                send_to_consumers(waiting_q, consumers_q, results)
+            handle_results(results)
+            num_pending -= 1
+
+    stop_workers(taskq, workers)
+    if frame_buffer is not None:
+        frame_buffer.close()
+    if report_writer is not None:
+        report_writer.close()
 
     if reportq is not None:
         results = {}
         for type in aggregates:
             if not aggregates[type].is_empty():
-                results[type] = {'bad_indexes': aggregates[type].bad_indexes, 'good_indexes': aggregates[type].good_indexes,
-                           'results': aggregates[type].results}
+                results[type] = aggregates[type].store
         reportq.put(results)
 
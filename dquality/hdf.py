@@ -57,11 +57,11 @@ not configured, it is assumed no file structure verification is requested.
 
 """
 import sys
-import h5py
 import json
 import os.path
 
 import dquality.common.utilities as utils
+from dquality.common.hdfindex import get_index
 
 __author__ = "Barbara Frosik"
 __copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
@@ -116,6 +116,9 @@ def init(config):
         logger.error('configured verification type ' + type + ' is not supported')
         sys.exit(-1)
 
+    # configure the hdf metadata cache and file pool
+    utils.init_hdf(conf, logger)
+
     return logger, tags, type
 
 
@@ -160,8 +163,8 @@ def structure(file, required_tags, logger):
 
     Parameters
     ----------
-    file : str
-        File Name including path
+    file : str or HdfIndex
+        File Name including path, or index of the file
 
     schema : str
         Schema file name
@@ -197,41 +200,45 @@ def structure(file, required_tags, logger):
                   str(dset.shape) + ' but should be ' + str(required_dim))
             res.res = False
 
-    def func(name, dset):
-        if isinstance(dset, h5py.Dataset):
-            tag = dset.name
-            tag_attribs = required_tags.get(tag)
-            if tag_attribs is not None:
-                tag_list.remove(tag)
-                attrib_list = utils.key_list(tag_attribs)
-                for key in tag_attribs:
-                    if len(attrib_list) > 0:
-                        if key == 'dim':
-                            attrib_list.remove(key)
-                            check_dim(dset, tag_attribs)
-                        else:
-                            attr = dset.attrs.get(key)
-                            if attr is not None:
+    def func(tag, dset):
+        tag_attribs = required_tags.get(tag)
+        if tag_attribs is not None:
+            tag_list.remove(tag)
+            attrib_list = utils.key_list(tag_attribs)
+            for key in tag_attribs:
+                if len(attrib_list) > 0:
+                    if key == 'dim':
+                        attrib_list.remove(key)
+                        check_dim(dset, tag_attribs)
+                    else:
+                        attr = dset.attrs.get(key)
+                        if attr is not None:
+                            if isinstance(attr, bytes):
                                 attr_str = attr.decode('utf-8')
-                                if attr_str != tag_attribs.get(key):
-                                    logger.warning('incorrect attribute in ' +
-                                          tag + ': is ' +
-                                          key + ':' +
-                                          attr_str + ' but should be ' +
-                                          key + ':' +
-                                          tag_attribs.get(key))
-                                    res.res = False
-                                attrib_list.remove(key)
-                report_items(
-                    attrib_list,
-                    'the following attributes are missing in tag ',
-                    tag,
-                    logger)
+                            else:
+                                attr_str = str(attr)
+                            if attr_str != tag_attribs.get(key):
+                                logger.warning('incorrect attribute in ' +
+                                      tag + ': is ' +
+                                      key + ':' +
+                                      attr_str + ' but should be ' +
+                                      key + ':' +
+                                      tag_attribs.get(key))
+                                res.res = False
+                            attrib_list.remove(key)
+            report_items(
+                attrib_list,
+                'the following attributes are missing in tag ',
+                tag,
+                logger)
 
     res = Result()
     tag_list = utils.key_list(required_tags)
-    file_h5 = h5py.File(file, 'r')
-    file_h5.visititems(func)
+    index = get_index(file, tag_list)
+    for tag in utils.key_list(required_tags):
+        dset = index.get(tag)
+        if dset is not None:
+            func(tag, dset)
     if res.res:
         return True
     else:
@@ -250,8 +257,8 @@ def tags(file, required_tags, logger):
 
     Parameters
     ----------
-    file : str
-        File Name including path
+    file : str or HdfIndex
+        File Name including path, or index of the file
 
     schema : str
         Schema file name
@@ -280,14 +287,7 @@ def tags(file, required_tags, logger):
             return self.result
 
     result = Result()
-    filetags = []
-
-    def func(name, dset):
-        if isinstance(dset, h5py.Dataset):
-            filetags.append(dset.name)
-
-    file_h5 = h5py.File(file, 'r')
-    file_h5.visititems(func)
+    filetags = get_index(file, tag_list)
 
     for tag in tag_list:
         if tag not in filetags:
@@ -297,7 +297,7 @@ def tags(file, required_tags, logger):
     return result.is_verified()
 
 
-def verify(conf, file):
+def verify(conf, file, index=None):
     """
     This is the main function called when the structureverifier
     application starts. It reads the configuration file for
@@ -311,6 +311,9 @@ def verify(conf, file):
     file : str
         File Name to verify including path
 
+    index : HdfIndex
+        index of the file, if already built, defaulted to None, meaning the index is taken from the metadata cache
+
     Returns
     -------
     boolean
@@ -323,13 +326,16 @@ def verify(conf, file):
             file + ' does not exist')
         sys.exit(-1)
 
+    if index is None:
+        index = file
+
     if type == 'hdf_structure':
-        ret = structure(file, required_tags, logger)
+        ret = structure(index, required_tags, logger)
         if ret:
             logger.info('All required tags exist and meet conditions')
             return ret
     elif type == 'hdf_tags':
-        ret = tags(file, required_tags, logger)
+        ret = tags(index, required_tags, logger)
         if ret:
             logger.info('All required tags exist')
             return ret
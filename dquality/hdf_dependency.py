@@ -59,8 +59,8 @@ An error will be reported back to UI via PV.
 import os
 import sys
 import json
-import h5py
 import dquality.common.utilities as utils
+from dquality.common.hdfindex import get_index
 from dquality.common.utilities import lt, le, eq, ge, gt
 
 
@@ -108,6 +108,9 @@ def init(config):
     with open(dependencies) as file:
         dep = json.loads(file.read())
 
+    # configure the hdf metadata cache and file pool
+    utils.init_hdf(conf, logger)
+
     return logger, dep
 
 
@@ -140,8 +143,8 @@ def find_value(tag, dset):
     tag : str
         a simple hd5 tag or extended
 
-    dset : dataset
-        hd5 dataset corresonding to the tag parameter
+    dset : DatasetInfo
+        metadata of hd5 dataset corresonding to the tag parameter
 
     Returns
     -------
@@ -166,8 +169,8 @@ def verify_list(file, list, relation, logger):
     list), and a placeholder for the value. The first tag from the
     list is retained as an anchor.
 
-    The function travers through all tags in the given file. If the
-    tag name is found in the tags dictionary, the ```find_value```
+    The function looks up the tags in the file index. If the
+    tag name is found in the index, the ```find_value```
     method is called to retrieve a defined valueu referenced by the
     tag. The value is then added to the TagValue instance for this tag.
 
@@ -179,8 +182,8 @@ def verify_list(file, list, relation, logger):
 
     Parameters
     ----------
-    file : file
-        an hd5 file to be verified
+    file : str or HdfIndex
+        an hd5 file to be verified, or index of the file
 
     list : list
         list of extended or simple hd5 tags
@@ -201,23 +204,16 @@ def verify_list(file, list, relation, logger):
     for long_tag in list:
         tags[long_tag.split()[0]] = TagValue(long_tag)
 
-    def func(name, dset):
-        if len(list) != 0 and isinstance(dset, h5py.Dataset):
-            tag = dset.name
-            try:
-                full_tag = tags[tag].tag
-                list.remove(full_tag)
-                value = find_value(full_tag, dset)
-                tags[tag].set_value(value)
-                if full_tag == anchor_tag.tag:
-                    anchor_tag.set_value(value)
-                    del tags[tag]
-
-            except KeyError:
-                pass
-
-    file_h5 = h5py.File(file, 'r')
-    file_h5.visititems(func)
+    index = get_index(file, utils.key_list(tags))
+    for tag in utils.key_list(tags):
+        dset = index.get(tag)
+        if dset is not None:
+            full_tag = tags[tag].tag
+            value = find_value(full_tag, dset)
+            tags[tag].set_value(value)
+            if full_tag == anchor_tag.tag:
+                anchor_tag.set_value(value)
+                del tags[tag]
 
     res = True
     for tag in tags:
@@ -233,7 +229,7 @@ def verify_list(file, list, relation, logger):
     return res
 
 
-def verify(conf, file):
+def verify(conf, file, index=None):
     """
     This function reads the json "*dependencies*" file from the 
     :download:`dqconfig.ini <../../../config/default/dqconfig.ini>` file.
@@ -272,6 +268,9 @@ def verify(conf, file):
     file : str
         File Name to verify including path
 
+    index : HdfIndex
+        index of the file, if already built, defaulted to None, meaning the index is taken from the metadata cache
+
     Returns
     -------
     boolean
@@ -283,13 +282,20 @@ def verify(conf, file):
             file + ' does not exist')
         sys.exit(-1)
 
+    # look up the tags of all dependencies at once
+    paths = []
+    for relation in dependencies:
+        for tag_list in dependencies[relation]:
+            paths.extend([long_tag.split()[0] for long_tag in tag_list])
+    index = get_index(file if index is None else index, paths)
+
     res = True
     i = 0
 
     for relation in dependencies:
         batch = dependencies[relation]
         for tag_list in batch:
-            if not verify_list(file, tag_list, relation, logger):
+            if not verify_list(index, tag_list, relation, logger):
                 res = False
 
     if res:
@@ -122,6 +122,9 @@ def init(config):
     consumers : dict
         a dictionary containing consumer processes to run, and their parameters
 
+    processing : Processing
+        parameters of frames processing, see utilities.get_processing
+
     """
     conf = utils.get_config(config)
     if conf is None:
@@ -184,7 +187,13 @@ def init(config):
         with open(consumersfile) as consumers_file:
             consumers = json.loads(consumers_file.read())
 
-    return logger, data_tags, limits, quality_checks, extensions, file_type, report_type, report_dir, consumers
+    processing = utils.get_processing(conf, logger)
+
+    # configure the hdf metadata cache and file pool
+    utils.init_hdf(conf, logger)
+
+    return logger, data_tags, limits, quality_checks, extensions, file_type, report_type, report_dir, consumers, \
+           processing
 
 
 def directory(directory, patterns):
@@ -262,7 +271,8 @@ def verify(conf, folder, num_files):
         A dictionary containing indexes of slices that did not pass quality check. The key is a file.
 
     """
-    logger, data_tags, limits, quality_checks, extensions, file_type, report_type, report_dir, consumers = init(conf)
+    logger, data_tags, limits, quality_checks, extensions, file_type, report_type, report_dir, consumers, \
+        processing = init(conf)
     if folder.endswith('**'):
         check_folder = folder[0:-2]
     else:
@@ -304,9 +314,11 @@ def verify(conf, folder, num_files):
             else:
                 file_count += 1
                 if file_type == const.FILE_TYPE_GE:
-                    bad_indexes[file] = dataver.verify_file_ge(logger, file, limits, quality_checks, report_type, report_dir, consumers)
+                    bad_indexes[file] = dataver.verify_file_ge(logger, file, limits, quality_checks, report_type, report_dir,
+                                                               consumers, processing)
                 else:
-                    bad_indexes[file] = dataver.verify_file_hdf(logger, file, data_tags, limits, quality_checks, report_type, report_dir, consumers)
+                    bad_indexes[file] = dataver.verify_file_hdf(logger, file, data_tags, limits, quality_checks, report_type,
+                                                                report_dir, consumers, processing)
                 print (file)
                 print ('bad indexes: ', bad_indexes[file])
                 logger.info('monitor evaluated ' + file + ' file')
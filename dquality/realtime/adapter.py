@@ -69,6 +69,8 @@ __all__ = ['start_process',
            'parse_config',
            'pack_data']
 
+# shared memory frame buffer the frames are packed into, set when the process is started
+frame_buffer = None
 
 
 def start_process(dataq, logger, *args):
@@ -99,8 +101,12 @@ def start_process(dataq, logger, *args):
     aggregate_limit = args[3]
     consumers = args[4]
     feedback = args[5]
+    processing = args[7]
+    global frame_buffer
+    frame_buffer = args[8]
+    report_writer = args[9]
 
-    feedback_obj = containers.Feedback(feedback)
+    feedback_obj = containers.Feedback(feedback, processing.feedback_interval)
     if const.FEEDBACK_LOG in feedback:
         feedback_obj.set_logger(logger)
 
@@ -109,7 +115,9 @@ def start_process(dataq, logger, *args):
         detector = args[6]
         feedback_obj.set_feedback_pv(feedback_pvs, detector)
 
-    p = Process(target=handle_data, args=(dataq, limits, reportq, quality_checks, aggregate_limit, consumers, feedback_obj))
+    p = Process(target=handle_data, args=(dataq, limits, reportq, quality_checks, aggregate_limit, consumers, feedback_obj,
+                                              processing.num_workers, frame_buffer, processing.reorder_window,
+                                              report_writer))
     p.start()
 
 
@@ -129,6 +137,10 @@ def parse_config(config):
     no_frames : int
         number of frames that will be processed
 
+    aggregate_limit : int
+        number of recent frames the aggregated results are limited to, -1 if the results are not aggregated;
+        defaults to no_frames
+
     detector : str
         a string defining the first prefix in area detector, it has to match the area detector configuration
 
@@ -173,7 +185,7 @@ def parse_config(config):
         print ('configuration error: detector_image parameter not configured.')
         return None
 
-    return int(no_frames), aggregate_limit, detector, detector_basic, detector_image
+    return int(no_frames), int(aggregate_limit), detector, detector_basic, detector_image
 
 
 def pack_data(slice, type):
@@ -190,7 +202,10 @@ def pack_data(slice, type):
 
     """
     if slice is not None:
-        return containers.Data(const.DATA_STATUS_DATA, slice, type)
+        data = containers.Data(const.DATA_STATUS_DATA, slice, type)
+        if frame_buffer is not None:
+            frame_buffer.put(data)
+        return data
     elif type == 'missing':
         return containers.Data(const.DATA_STATUS_MISSING)
     else:
@@ -210,7 +225,10 @@ def pack_data_with_decor(slice, type, acq_time):
 
     """
     if slice is not None:
-        return containers.Data(const.DATA_STATUS_DATA, slice, type, acq_time)
+        data = containers.Data(const.DATA_STATUS_DATA, slice, type, acq_time)
+        if frame_buffer is not None:
+            frame_buffer.put(data)
+        return data
     elif type == 'missing':
         return containers.Data(const.DATA_STATUS_MISSING)
     else:
@@ -67,9 +67,9 @@ sequence. (i.e. [('data_dark', 4), ('data_white', 14), ('data', 614), ('data_dar
 
 from epics import caget, PV
 from epics.ca import CAThread
-from multiprocessing import Queue
 import numpy as np
 import dquality.realtime.adapter as adapter
+import dquality.common.transport as transport
 import sys
 if sys.version[0] == '2':
     import Queue as tqueue
@@ -101,7 +101,7 @@ class Feed:
         thread_dataq : this queue delivers counter number on change from call back thread
         Other fields are initialized.
         """
-        self.process_dataq = Queue()
+        self.process_dataq = transport.get_data_queue()
         self.exitq = tqueue.Queue()
         self.thread_dataq = tqueue.Queue()
         self.sizex = 0
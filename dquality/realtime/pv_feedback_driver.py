@@ -75,7 +75,7 @@ class FbDriver(Driver):
         super(FbDriver, self).__init__()
         self.counters = counters
 
-    def write(self, pv, index):
+    def write(self, pv, index, count=1):
         """
         This function override write method fro Driver.
 
@@ -87,7 +87,9 @@ class FbDriver(Driver):
         pv : str
             a name of the pv, contains information about the data type and quality check (i.e. data_white_mean)
         index : int
-            index of failed frame
+            index of the last failed frame
+        count : int
+            number of failed frames
 
         Returns
         -------
@@ -97,8 +99,8 @@ class FbDriver(Driver):
         """
         status = True
         self.setParam(pv+'_ind', index)
-        self.counters[pv] += 1
-        # this method is called on failed quality check, increase counter for this pv
+        # this method is called on failed quality checks, increase counter for this pv
+        self.counters[pv] += count
         self.setParam(pv+'_ctr', self.counters[pv])
         self.updatePVs()
         return status
@@ -66,6 +66,7 @@ from multiprocessing import Queue
 import json
 import sys
 import dquality.common.utilities as utils
+import dquality.common.framebuffer as framebuffer
 import dquality.common.report as report
 from dquality.realtime.feed import Feed
 import dquality.common.constants as const
@@ -106,6 +107,9 @@ def init(config):
     consumers : dict
         a dictionary parsed from json file representing consumers
 
+    processing : Processing
+        parameters of frames processing, see utilities.get_processing
+
     """
 
     conf = utils.get_config(config)
@@ -147,7 +151,9 @@ def init(config):
         with open(consumersfile) as consumers_file:
             consumers = json.loads(consumers_file.read())
 
-    return logger, limits, quality_checks, feedback, report_type, consumers
+    processing = utils.get_processing(conf, logger)
+
+    return logger, limits, quality_checks, feedback, report_type, consumers, processing
 
 
 class RT:
@@ -183,7 +189,7 @@ class RT:
                 decor[const.QUALITYCHECK_RATE_SAT] = detector + ":" + detector_basic +":AcquireTime"
             return decor
 
-        logger, limits, quality_checks, feedback, report_type, consumers = init(config)
+        logger, limits, quality_checks, feedback, report_type, consumers, processing = init(config)
         no_frames, aggregate_limit, detector, detector_basic, detector_image = adapter.parse_config(config)
 
         aggregateq = Queue()
@@ -195,16 +201,23 @@ class RT:
         else:
             self.feed = FeedDecorator(decor)
 
-        aggregate_limit = no_frames
-        args = limits, aggregateq, quality_checks, aggregate_limit, consumers, feedback, detector
+        frame_buffer = None
+        if processing.frame_buffer_slots is not None:
+            frame_buffer = framebuffer.FrameBuffer(processing.frame_buffer_slots)
+
+        report_writer = None
+        if report_file is not None and report_type != const.REPORT_NONE:
+            report_writer = report.ReportWriter(logger, report_file, report_type)
+
+        args = limits, aggregateq, quality_checks, aggregate_limit, consumers, feedback, detector, processing, \
+               frame_buffer, report_writer
         ack = self.feed.feed_data(no_frames, detector, detector_basic, detector_image, logger, sequence, *args)
         if ack == 1:
             bad_indexes = {}
 
             aggregate = aggregateq.get()
-
-            if report_file is not None:
-                report.report_results(logger, aggregate, None, report_file, report_type)
+            if frame_buffer is not None:
+                frame_buffer.close(True)
             report.add_bad_indexes(aggregate, bad_indexes)
 
             return bad_indexes
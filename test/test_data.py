@@ -1,11 +1,17 @@
 import os
+import json
 import time
 import shutil
+from multiprocessing import Event, Process
+import h5py
+import numpy as np
 import test.test_utils.modify_settings as mod
 import test.test_utils.verify_results as res
 import dquality.check as check
 
 import dquality.data as data
+import dquality.common.constants as const
+import dquality.common.utilities as utils
 
 logfile = os.path.join(os.getcwd(),"default.log")
 config_test = os.path.join(os.getcwd(),"test/dqconfig_test.ini")
@@ -104,3 +110,267 @@ def test_ge():
     assert 3 in bad_data
     assert 4 in bad_data
     clean()
+
+def test_batch_size_error():
+    config = init('j')
+    mod.add_line_to_file(config, "'batch_size' = 0")
+    # the data.init will exit with -1
+    try:
+        data.init(config)
+    except:
+        pass
+    time.sleep(1)
+    assert res.is_text_in_file(logfile, 'parameter error: batch_size must be a positive number')
+    clean()
+
+
+def test_reorder_window_error():
+    config = init('j')
+    mod.add_line_to_file(config, "'reorder_window' = none")
+    # the data.init will exit with -1
+    try:
+        data.init(config)
+    except:
+        pass
+    time.sleep(1)
+    assert res.is_text_in_file(logfile, 'parameter error: reorder_window must be a positive number')
+    clean()
+
+
+def test_feedback_interval_error():
+    config = init('j')
+    mod.add_line_to_file(config, "'feedback_interval' = -1")
+    # the data.init will exit with -1
+    try:
+        data.init(config)
+    except:
+        pass
+    time.sleep(1)
+    assert res.is_text_in_file(logfile, 'parameter error: feedback_interval must be a positive number')
+    clean()
+
+
+def test_processing():
+    config = init('j')
+    mod.add_line_to_file(config, "'batch_size' = 4")
+    mod.add_line_to_file(config, "'replay_fps' = 2.5")
+    processing = data.init(config)[8]
+    assert processing == utils.Processing(batch_size=4, replay_fps=2.5)
+    clean()
+
+
+def test_data_items():
+    frames = list(range(7))
+    read = lambda start, stop: frames[start:stop]
+    items = list(data.get_data_items(read, len(frames), 'data'))
+    assert [item.slice for item in items] == frames
+    items = list(data.get_data_items(read, len(frames), 'data', 3))
+    assert [item.slice for item in items] == [[0, 1, 2], [3, 4, 5], [6]]
+    assert items[0].status == const.DATA_STATUS_BATCH
+
+
+def test_data_items_replay():
+    frames = list(range(5))
+    read = lambda start, stop: frames[start:stop]
+    start = time.time()
+    items = list(data.get_data_items(read, len(frames), 'data', None, 50.0))
+    assert len(items) == len(frames)
+    assert time.time() - start >= 4 / 50.0
+
+
+def test_hdf_reader(tmpdir):
+    frames = np.arange(10 * 4 * 4, dtype='uint16').reshape(10, 4, 4)
+    with h5py.File(str(tmpdir.join('data.h5')), 'w') as fp:
+        fp.create_dataset('chunked', data=frames, chunks=(3, 4, 4), compression='gzip')
+        fp.create_dataset('contiguous', data=frames)
+        for name in ['chunked', 'contiguous']:
+            read = utils.get_hdf_reader(fp[name], True)
+            items = list(data.get_data_items(read, len(frames), 'data'))
+            assert all((items[i].slice == frames[i]).all() for i in range(len(frames)))
+            items = list(data.get_data_items(read, len(frames), 'data', 4))
+            assert np.array_equal(np.concatenate([item.slice for item in items]), frames)
+
+
+def test_chunk_reader(tmpdir):
+    frames = np.arange(10 * 5 * 4, dtype='>u2').reshape(10, 5, 4)
+    with h5py.File(str(tmpdir.join('data.h5')), 'w') as fp:
+        fp.create_dataset('shuffled', data=frames, chunks=(3, 2, 3), compression='gzip', shuffle=True)
+        fp.create_dataset('lzf', data=frames, chunks=(3, 5, 4), compression='lzf')
+        sparse = fp.create_dataset('sparse', frames.shape, frames.dtype, chunks=(3, 5, 4), compression='gzip',
+                                   fillvalue=7)
+        sparse[0:3] = frames[0:3]
+        assert utils.get_chunk_filters(fp['shuffled']) == [h5py.h5z.FILTER_SHUFFLE, h5py.h5z.FILTER_DEFLATE]
+        assert utils.get_chunk_filters(fp['lzf']) is None
+        for name in ['shuffled', 'lzf', 'sparse']:
+            read = utils.get_hdf_reader(fp[name], True, 2)
+            items = list(data.get_data_items(read, len(frames), 'data', 4))
+            assert np.array_equal(np.concatenate([item.slice for item in items]), fp[name][()])
+
+
+def test_ge_reader(tmpdir):
+    frames = np.arange(3 * 16, dtype='<u2').reshape(3, 16)
+    file = str(tmpdir.join('data.ge'))
+    with open(file, 'wb') as fp:
+        fp.write(b'\0' * utils.GE_HEADER_SIZE)
+        fp.write(frames.tobytes())
+    read = utils.get_ge_reader(file, 3, 16)
+    items = list(data.get_data_items(read, 3, 'data', 2))
+    assert np.array_equal(np.concatenate([item.slice for item in items]), frames)
+    assert items[0].slice.base is not None
+
+
+def write_data_file(file, bad_frame):
+    frames = np.full((20, 16, 16), 2.5, dtype='float32')
+    frames[bad_frame] += 5
+    with h5py.File(file, 'w') as fp:
+        fp.create_dataset('/exchange/data', data=frames, chunks=(4, 16, 16))
+        fp.create_dataset('/exchange/data_dark', data=np.full((5, 16, 16), 50, dtype='float32'))
+        fp.create_dataset('/exchange/data_white', data=np.full((10, 16, 16), 3000, dtype='float32'))
+
+
+def test_verify_files(tmpdir):
+    config = init('k')
+    files = [str(tmpdir.join('data' + str(i) + '.h5')) for i in range(3)]
+    for i in range(len(files)):
+        write_data_file(files[i], 10 + i)
+    bad_indexes = data.verify_files(config, str(tmpdir.join('*.h5')), 2)
+    assert sorted(bad_indexes.keys()) == files
+    for file in files:
+        assert bad_indexes[file] == data.verify(config, file)
+    clean()
+
+
+def test_verify_files_broken(tmpdir):
+    config = init('k')
+    files = [str(tmpdir.join('data' + str(i) + '.h5')) for i in range(3)]
+    for i in range(len(files)):
+        write_data_file(files[i], 10 + i)
+    # the broken file has no data_white data set
+    with h5py.File(files[1], 'a') as fp:
+        del fp['/exchange/data_white']
+    bad_indexes = data.verify_files(config, str(tmpdir.join('*.h5')), 2)
+    assert bad_indexes[files[1]] is None
+    assert bad_indexes[files[0]] == data.verify(config, files[0])
+    assert bad_indexes[files[2]] == data.verify(config, files[2])
+    clean()
+
+
+def write_swmr_file(file, started):
+    with h5py.File(file, 'w', libver='latest') as fp:
+        datasets = {}
+        for type in ['data_dark', 'data_white', 'data']:
+            datasets[type] = fp.create_dataset('/exchange/' + type, (0, 16, 16), 'float32', maxshape=(None, 16, 16),
+                                               chunks=(1, 16, 16))
+        fp.swmr_mode = True
+        started.set()
+        for type, num_frames, value in [('data_dark', 5, 50), ('data_white', 10, 3000), ('data', 20, 2.5)]:
+            for i in range(num_frames):
+                time.sleep(.01)
+                datasets[type].resize((i + 1, 16, 16))
+                datasets[type][i] = value
+                datasets[type].flush()
+
+
+def test_verify_follow(tmpdir):
+    config = init('l')
+    mod.add_line_to_file(config, "'follow_timeout' = 1")
+    file = str(tmpdir.join('data.h5'))
+    started = Event()
+    p = Process(target=write_swmr_file, args=(file, started))
+    p.start()
+    started.wait()
+    bad_indexes = data.verify(config, file)
+    p.join()
+    with open(str(tmpdir.join('data.report'))) as report:
+        summary = json.loads(report.readlines()[-1])['summary']
+    assert [summary[type]['evaluated'] for type in ['data_dark', 'data_white', 'data']] == [5, 10, 20]
+    assert bad_indexes == data.verify(config_test, file)
+    clean()
+
+
+class FollowedDataSet:
+    # a data set which size changes on refresh to the next of the given sizes
+    def __init__(self, sizes):
+        self.sizes = sizes
+        self.shape = (0,)
+
+    def refresh(self):
+        if len(self.sizes) > 0:
+            self.shape = (self.sizes.pop(0),)
+
+
+def test_follow_data_set():
+    # a frame is appended to the followed data set after its refresh, and the next data set is started before the
+    # refresh of the next data set
+    dt = FollowedDataSet([5, 5, 6])
+    processed = []
+    data.follow_data_set(dt, [FollowedDataSet([1])], 10, lambda start, stop: processed.append((start, stop)))
+    assert processed == [(0, 5), (5, 6)]
+
+
+def read_report(report_file):
+    # returns indexes of the reported failed frames keyed by data type, checked against the summary
+    lines = [json.loads(line) for line in open(report_file)]
+    bad_indexes = {}
+    for line in lines[:-1]:
+        if line['failed']:
+            bad_indexes.setdefault(line['type'], []).append(line['index'])
+    summary = lines[-1]['summary']
+    for type in summary:
+        assert summary[type]['bad'] == len(bad_indexes.get(type, []))
+        bad_indexes.setdefault(type, [])
+    return dict((type, sorted(bad_indexes[type])) for type in bad_indexes)
+
+
+def test_verify_cache(tmpdir):
+    config = init('m')
+    mod.add_line_to_file(config, "'cache_dir' = " + str(tmpdir))
+    file = str(tmpdir.join('data.h5'))
+    write_data_file(file, 10)
+    bad_indexes = data.verify(config, file)
+    assert bad_indexes == data.verify(config_test, file)
+    report_file = str(tmpdir.join('data.report'))
+    assert read_report(report_file) == bad_indexes
+    # the cached results are returned, the data is not read, and the report is written from the cached results
+    os.remove(report_file)
+    assert data.verify(config, file) == bad_indexes
+    assert read_report(report_file) == bad_indexes
+
+    # the cached values are evaluated against the changed limits
+    with open(limits) as limits_file:
+        new_limits = json.loads(limits_file.read())
+    new_limits['data']['mean']['high_limit'] = 2.0
+    limits_file = str(tmpdir.join('limits.json'))
+    with open(limits_file, 'w') as f:
+        f.write(json.dumps(new_limits))
+    mod.replace_text_in_file(config, 'test/schemas/limits.json', limits_file)
+    config_new = str(tmpdir.join('conf.ini'))
+    shutil.copyfile(config, config_new)
+    mod.replace_text_in_file(config_new, "'cache_dir'", "#'cache_dir'")
+    new_bad_indexes = data.verify(config, file)
+    assert read_report(report_file) == new_bad_indexes
+    assert new_bad_indexes != bad_indexes
+    assert new_bad_indexes == data.verify(config_new, file)
+    clean()
+
+
+def test_reevaluate(tmpdir):
+    config = init('n')
+    mod.add_line_to_file(config, "'save_results' = True")
+    file = str(tmpdir.join('data.h5'))
+    write_data_file(file, 10)
+    bad_indexes = data.verify(config, file)
+    results_file = data.get_results_file(file, None)
+    assert data.reevaluate(config, results_file) == bad_indexes
+
+    with open(limits) as limits_file:
+        new_limits = json.loads(limits_file.read())
+    new_limits['data']['mean']['high_limit'] = 2.0
+    limits_file = str(tmpdir.join('limits.json'))
+    with open(limits_file, 'w') as f:
+        f.write(json.dumps(new_limits))
+    mod.replace_text_in_file(config, 'test/schemas/limits.json', limits_file)
+    new_bad_indexes = data.reevaluate(config, results_file)
+    assert new_bad_indexes != bad_indexes
+    assert new_bad_indexes == data.verify(config, file)
+    clean()
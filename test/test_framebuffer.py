@@ -0,0 +1,37 @@
+import numpy as np
+from multiprocessing import Process, Queue
+import dquality.common.constants as const
+from dquality.common.containers import Data
+import dquality.common.framebuffer as framebuffer
+
+
+def check_frames(frame_buffer, dataq, meansq):
+    while True:
+        data = dataq.get()
+        if data.status == const.DATA_STATUS_END:
+            break
+        meansq.put((data.slot, np.mean(frame_buffer.get(data))))
+        frame_buffer.release(data)
+    frame_buffer.close()
+
+
+def test_slots_reused():
+    if not framebuffer.is_supported():
+        return
+    frame_buffer = framebuffer.FrameBuffer(2)
+    dataq = Queue()
+    meansq = Queue()
+    p = Process(target=check_frames, args=(frame_buffer, dataq, meansq))
+    p.start()
+    for i in range(6):
+        data = Data(const.DATA_STATUS_DATA, np.full((16, 16), i, dtype='uint16'), 'data')
+        frame_buffer.put(data)
+        assert data.slice is None
+        dataq.put(data)
+    dataq.put(Data(const.DATA_STATUS_END))
+    for i in range(6):
+        slot, mean = meansq.get()
+        assert slot == i % 2
+        assert mean == i
+    p.join()
+    frame_buffer.close(True)
@@ -0,0 +1,183 @@
+import json
+import logging
+import numpy as np
+from multiprocessing import Process, Queue
+import dquality.common.constants as const
+from dquality.common.containers import Data, Feedback, Result, Results, ReorderBuffer
+import dquality.common.framebuffer as framebuffer
+import dquality.common.report as report
+import dquality.common.transport as transport
+import dquality.handler as handler
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+def get_frame(index, status=const.DATA_STATUS_DATA):
+    data = Data(status, None, 'data')
+    data.index = index
+    return data
+
+
+def get_delivered(q):
+    delivered = []
+    while not q.empty():
+        data = q.get()
+        if data.status == const.DATA_STATUS_END:
+            delivered.append('end')
+        else:
+            delivered.append(data.index)
+    return delivered
+
+
+def test_reorder():
+    q = queue.Queue()
+    reorder_buffer = ReorderBuffer([q])
+    for i in range(4):
+        reorder_buffer.add_frame(get_frame(i))
+    reorder_buffer.add_frame(get_frame(4, const.DATA_STATUS_MISSING))
+    reorder_buffer.add_frame(get_frame(5))
+    reorder_buffer.add_results(Results('data', 2, False, {}))
+    reorder_buffer.add_results(Results('data', 1, True, {}))
+    assert get_delivered(q) == []
+    reorder_buffer.add_results(Results('data', 0, False, {}))
+    delivered = []
+    while not q.empty():
+        delivered.append(q.get())
+    assert [data.index for data in delivered] == [0, 1, 2]
+    assert [data.failed for data in delivered] == [False, True, False]
+    reorder_buffer.add_results(Results('data', 3, False, {}))
+    assert get_delivered(q) == [3, 4]
+    reorder_buffer.add_results(Results('data', 5, False, {}))
+    reorder_buffer.close(Data(const.DATA_STATUS_END))
+    assert get_delivered(q) == [5, 'end']
+
+
+def test_reorder_window():
+    q = queue.Queue()
+    reorder_buffer = ReorderBuffer([q], window=2)
+    for i in range(5):
+        reorder_buffer.add_frame(get_frame(i))
+    reorder_buffer.add_results(Results('data', 1, False, {}))
+    reorder_buffer.add_results(Results('data', 4, False, {}))
+    assert get_delivered(q) == [4]
+    reorder_buffer.add_results(Results('data', 0, False, {}))
+    reorder_buffer.add_results(Results('data', 2, False, {}))
+    reorder_buffer.add_results(Results('data', 3, False, {}))
+    reorder_buffer.close(Data(const.DATA_STATUS_END))
+    assert get_delivered(q) == [0, 1, 2, 3, 'end']
+
+
+def test_feedback(capsys):
+    feedbackq = queue.Queue()
+    for index in range(5):
+        result = Result(200.0 + index, const.QUALITYCHECK_MEAN, const.QUALITYERROR_HIGH)
+        result.index = index
+        result.type = 'data'
+        feedbackq.put(result)
+    result = Result(-1.0, const.QUALITYCHECK_STD, const.QUALITYERROR_LOW)
+    result.index = 3
+    result.type = 'data_white'
+    feedbackq.put(result)
+    feedbackq.put(const.DATA_STATUS_END)
+    Feedback([const.FEEDBACK_CONSOLE], 10).quality_feedback(feedbackq)
+    lines = capsys.readouterr().out.splitlines()
+    assert lines == ['5 failed frames of data mean, last failed frame 4 result is 204.0',
+                     'failed frame 3 result of st_dev is -1.0']
+
+
+limits = {'data' : {'mean' : {'low_limit' : 0, 'high_limit' : 100},
+                    'sat' : {'low_limit' : 0, 'high_limit' : 1000},
+                    'rate_sat' : {'low_limit' : 0, 'high_limit' : 1000}}}
+means = [10, 20, 200, 30, 40, 300, 50]
+
+
+def run_handler(data_list, quality_checks, frame_buffer=None, report_writer=None):
+    dataq = transport.get_data_queue()
+    reportq = Queue()
+    p = Process(target=handler.handle_data,
+                args=(dataq, limits, reportq, quality_checks, None, None, None, 2, frame_buffer, None, report_writer))
+    p.start()
+    for data in data_list:
+        if frame_buffer is not None:
+            frame_buffer.put(data)
+        dataq.put(data)
+    dataq.put(Data(const.DATA_STATUS_END))
+    report = reportq.get(timeout=60)
+    p.join()
+    if frame_buffer is not None:
+        frame_buffer.close(True)
+    return report['data']
+
+
+def get_frames():
+    return [np.full((16, 16), mean, dtype='uint16') for mean in means]
+
+
+def test_handle_data():
+    quality_checks = {'data' : [const.QUALITYCHECK_MEAN, const.QUALITYCHECK_SAT]}
+    data_list = [Data(const.DATA_STATUS_DATA, frame, 'data') for frame in get_frames()]
+    report = run_handler(data_list, quality_checks)
+    assert report.get_bad_indexes().tolist() == [2, 5]
+    assert report.get_good_indexes().tolist() == [0, 1, 3, 4, 6]
+
+
+def test_handle_data_batch():
+    quality_checks = {'data' : [const.QUALITYCHECK_MEAN, const.QUALITYCHECK_SAT]}
+    stack = np.array(get_frames())
+    data_list = [Data(const.DATA_STATUS_BATCH, stack[i:i + 3], 'data') for i in range(0, len(means), 3)]
+    frame_buffer = None
+    if framebuffer.is_supported():
+        frame_buffer = framebuffer.FrameBuffer(2)
+    report = run_handler(data_list, quality_checks, frame_buffer)
+    assert report.get_bad_indexes().tolist() == [2, 5]
+    assert report.get_good_indexes().tolist() == [0, 1, 3, 4, 6]
+
+
+def test_handle_data_frame_buffer():
+    if not framebuffer.is_supported():
+        return
+    quality_checks = {'data' : [const.QUALITYCHECK_MEAN, const.QUALITYCHECK_SAT]}
+    data_list = [Data(const.DATA_STATUS_DATA, frame, 'data') for frame in get_frames()]
+    report = run_handler(data_list, quality_checks, framebuffer.FrameBuffer(2))
+    assert report.get_bad_indexes().tolist() == [2, 5]
+    assert report.get_good_indexes().tolist() == [0, 1, 3, 4, 6]
+
+
+def test_handle_data_check_error():
+    # the rate saturation check fails on frames without acquisition time
+    quality_checks = {'data' : [const.QUALITYCHECK_MEAN, const.QUALITYCHECK_RATE_SAT]}
+    data_list = [Data(const.DATA_STATUS_DATA, frame, 'data') for frame in get_frames()]
+    report = run_handler(data_list, quality_checks)
+    assert report.get_bad_indexes().tolist() == list(range(len(means)))
+
+
+def test_quality_worker_error(caplog):
+    # the error of the rate saturation check is logged, and the frame is reported as failed
+    quality_checks = {'data' : [const.QUALITYCHECK_MEAN, const.QUALITYCHECK_RATE_SAT]}
+    taskq = queue.Queue()
+    resultsq = queue.Queue()
+    taskq.put((Data(const.DATA_STATUS_DATA, get_frames()[0], 'data'), 3))
+    taskq.put(const.DATA_STATUS_END)
+    handler.quality_worker(taskq, resultsq, limits, quality_checks, None)
+    results = resultsq.get_nowait()
+    assert results.index == 3 and results.failed
+    # the error is kept as a result, so the frame stays failed when the stored results are evaluated again
+    assert [(result.quality_id, result.error) for result in results.results] == \
+           [(const.QUALITYCHECK_ERROR, const.QUALITYERROR_CHECK)]
+    assert len(caplog.records) == 1
+    assert caplog.records[0].exc_info is not None
+    assert 'data frame 3' in caplog.records[0].getMessage()
+
+
+def test_handle_data_report(tmpdir):
+    quality_checks = {'data' : [const.QUALITYCHECK_MEAN, const.QUALITYCHECK_SAT]}
+    data_list = [Data(const.DATA_STATUS_DATA, frame, 'data') for frame in get_frames()]
+    report_file = str(tmpdir.join('data.report'))
+    report_writer = report.ReportWriter(logging.getLogger(), report_file, const.REPORT_ERRORS, 'data.h5')
+    run_handler(data_list, quality_checks, report_writer=report_writer)
+    lines = [json.loads(line) for line in open(report_file)]
+    assert sorted(line['index'] for line in lines[:-1]) == [2, 5]
+    assert all(line['failed'] for line in lines[:-1])
+    assert lines[-1] == {'file' : 'data.h5', 'summary' : {'data' : {'evaluated' : len(means), 'bad' : 2}}}
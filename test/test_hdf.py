@@ -1,10 +1,21 @@
 import os
+import json
+import sys
+import subprocess
+import logging
 import time
 import shutil
+import h5py
+import pytest
+import numpy as np
 import test.test_utils.modify_settings as mod
 import test.test_utils.verify_results as res
 
 import dquality.hdf as hdf
+import dquality.hdf_dependency as dependency
+import dquality.common.hdfindex as hdfindex
+import dquality.common.filepool as filepool
+from dquality.common.hdfindex import HdfIndex, get_index, get_plan
 
 logfile = os.path.join(os.getcwd(),"default.log")
 config_test = os.path.join(os.getcwd(),"test/dqconfig_test.ini")
@@ -158,3 +169,147 @@ def test_struct_no_missing():
     assert res.is_text_in_file(logfile, 'All required tags exist and meet conditions')
     clean
 
+
+def write_metadata_file(file):
+    with h5py.File(file, 'w') as fp:
+        dset = fp.create_dataset('/exchange/data', (5, 512, 64), 'uint16')
+        dset.attrs['axes'] = np.bytes_(b'theta:y:x')
+        dset.attrs['units'] = np.bytes_(b'counts')
+        fp['/exchange/theta'] = np.arange(5.0)
+        fp['/measurement/instrument/detector/dimension_x'] = 512
+
+
+def test_index(tmpdir):
+    file = str(tmpdir.join('data.h5'))
+    write_metadata_file(file)
+    index = HdfIndex(file)
+    with h5py.File(file, 'r') as fp:
+        index.add_file(fp)
+    assert sorted(index.names()) == ['/exchange/data', '/exchange/theta',
+                                     '/measurement/instrument/detector/dimension_x']
+    assert index.get('/exchange/data').shape == (5, 512, 64)
+    # the value of the large data set is not kept in the index
+    assert index.get('/exchange/data').small_value is None
+    assert index.get('/exchange/data').value.shape == (5, 512, 64)
+    assert index.get('/measurement/instrument/detector/dimension_x').value == 512
+    logger = logging.getLogger(__name__)
+    required_tags = {'/exchange/data' : {'dim' : [5, 512, 64], 'axes' : 'theta:y:x'}, '/exchange/missing' : {}}
+    assert hdf.structure(index, {'/exchange/data' : required_tags['/exchange/data']}, logger)
+    assert not hdf.tags(index, required_tags, logger)
+    assert dependency.verify_list(index, ['/exchange/data dim 0', '/exchange/theta dim 0'], 'equal', logger)
+    assert not dependency.verify_list(index, ['/exchange/data dim 2', '/measurement/instrument/detector/dimension_x'],
+                                      'equal', logger)
+
+
+def test_lookup_plan(tmpdir):
+    file = str(tmpdir.join('data.h5'))
+    write_metadata_file(file)
+    paths = ['/exchange/data', '/exchange/data/x', '/exchange', '/process/a', '/process/b']
+    plan = get_plan(paths)
+    assert get_plan(reversed(paths)) is plan
+    assert sorted(plan.tree['exchange']) == ['data']
+    index = get_index(file, paths)
+    assert index.names() == ['/exchange/data']
+    assert index.missing == set(['/exchange/data/x', '/exchange', '/process/a', '/process/b'])
+    # the theta data set is not in the schema
+    assert '/exchange/theta' not in index
+    os.remove(file)
+    # all paths were looked up, so the file is not opened again
+    get_index(index, ['/exchange/data', '/process/b'])
+
+
+def append_data_set(file, name):
+    # the file is appended by another process, as by an acquisition
+    subprocess.check_call([sys.executable, '-c', 'import h5py, numpy; h5py.File("%s", "a")["%s"] = numpy.arange(3)'
+                           % (file, name)])
+
+
+def test_large_value(tmpdir):
+    file = str(tmpdir.join('data.h5'))
+    write_metadata_file(file)
+    with h5py.File(file, 'a') as fp:
+        fp['/exchange/angles'] = np.arange(2000.0)
+    index = get_index(file, ['/exchange/angles'])
+    info = index.get('/exchange/angles')
+    assert info.small_value is None
+    # the value is read from the file when requested, also by an index loaded from the cache
+    assert np.array_equal(dependency.find_value('/exchange/angles', info), np.arange(2000.0))
+    loaded = HdfIndex.from_dict(json.loads(json.dumps(index.to_dict())))
+    assert np.array_equal(loaded.get('/exchange/angles').value, np.arange(2000.0))
+
+
+def test_metadata_cache(tmpdir):
+    file = str(tmpdir.join('data.h5'))
+    write_metadata_file(file)
+    hdfindex.set_cache_dir(str(tmpdir))
+    try:
+        index = get_index(file, ['/exchange/data', '/exchange/missing'])
+        assert get_index(file, ['/exchange/data']) is index
+        # the index stored in the cache directory is used when not in memory
+        hdfindex.metadata_cache.entries.clear()
+        cached = get_index(file, ['/exchange/data', '/exchange/missing'])
+        assert cached is not index
+        assert cached.get('/exchange/data').shape == (5, 512, 64)
+        assert cached.missing == set(['/exchange/missing'])
+        # a changed file is indexed again
+        append_data_set(file, '/exchange/missing')
+        assert '/exchange/missing' in get_index(file, ['/exchange/data', '/exchange/missing'])
+    finally:
+        hdfindex.set_cache_dir(None)
+
+
+def test_index_to_dict(tmpdir):
+    file = str(tmpdir.join('data.h5'))
+    write_metadata_file(file)
+    with h5py.File(file, 'a') as fp:
+        fp['/exchange/data'].attrs['description'] = 'projections'
+        fp['/exchange/names'] = np.array([b'a', b'bc'])
+        fp['/exchange/compound'] = np.zeros(2, dtype=[('a', '<i4'), ('b', '<f8', (2,))])
+    index = HdfIndex(file)
+    with h5py.File(file, 'r') as fp:
+        index.add_file(fp)
+    # the index is stored as JSON, and loaded without unpickling
+    loaded = HdfIndex.from_dict(json.loads(json.dumps(index.to_dict())))
+    assert loaded.complete and sorted(loaded.names()) == sorted(index.names())
+    for name in index.names():
+        info = index.get(name)
+        loaded_info = loaded.get(name)
+        assert loaded_info.shape == info.shape
+        assert loaded_info.dtype == info.dtype
+        assert loaded_info.chunks == info.chunks
+        assert sorted(loaded_info.attrs) == sorted(info.attrs)
+        for key in info.attrs:
+            assert loaded_info.attrs[key] == info.attrs[key]
+        assert np.array_equal(loaded_info.small_value, info.small_value)
+    assert loaded.get('/exchange/data').attrs['axes'] == b'theta:y:x'
+    assert loaded.get('/measurement/instrument/detector/dimension_x').value == 512
+
+    # the references cannot be stored without pickling
+    with h5py.File(file, 'a') as fp:
+        fp['/exchange/theta'].attrs['data'] = fp['/exchange/data'].ref
+    index = HdfIndex(file)
+    with h5py.File(file, 'r') as fp:
+        index.add_file(fp)
+    with pytest.raises(ValueError):
+        index.to_dict()
+
+
+def test_file_pool(tmpdir):
+    file1 = str(tmpdir.join('data1.h5'))
+    file2 = str(tmpdir.join('data2.h5'))
+    write_metadata_file(file1)
+    write_metadata_file(file2)
+    pool = filepool.FilePool(1, 1 << 16)
+    with pool.open(file1) as fp1:
+        with pool.open(file2) as fp2:
+            # the file in use is not closed
+            assert fp1.id.valid and fp2.id.valid
+            # the open file does not prevent other processes from writing it
+            append_data_set(file1, '/exchange/appended')
+        with pool.open(file1) as fp:
+            assert fp is fp1
+    # the least recently used file is closed when the pool is full
+    assert fp1.id.valid and not fp2.id.valid
+    assert fp1.id.get_access_plist().get_cache()[2] == 1 << 16
+    pool.close()
+    assert not fp1.id.valid
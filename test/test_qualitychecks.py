@@ -0,0 +1,152 @@
+import numpy as np
+import dquality.common.constants as const
+import dquality.common.qualitychecks as calc
+from dquality.common.containers import Aggregate, Data, Result, Results, ResultsStore
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+limits = {'mean' : {'low_limit' : 0, 'high_limit' : 100},
+          'stat_mean' : {'low_limit' : -5, 'high_limit' : 5},
+          'sat' : {'low_limit' : 0, 'high_limit' : 200},
+          'sat_points' : {'low_limit' : 0, 'high_limit' : 10}}
+quality_checks = [const.QUALITYCHECK_MEAN, const.QUALITYCHECK_SAT, const.STAT_MEAN, const.ACC_SAT]
+
+
+def get_results(index, mean, sat):
+    results = {const.QUALITYCHECK_MEAN : Result(mean, const.QUALITYCHECK_MEAN, const.NO_ERROR),
+               const.QUALITYCHECK_SAT : Result(sat, const.QUALITYCHECK_SAT, const.NO_ERROR)}
+    return Results('data', index, False, results)
+
+
+def run(aggregate, index, mean, sat):
+    results = get_results(index, mean, sat)
+    calc.run_statistical_checks(limits, aggregate, quality_checks, results)
+    aggregate.handle_results(results)
+    return results
+
+
+def test_running_statistics():
+    aggregate = Aggregate('data', quality_checks, None)
+    means = [10.0, 12.0, 11.0, 13.0]
+    for i in range(len(means)):
+        run(aggregate, i, means[i], 1)
+    statistics = aggregate.get_statistics(const.QUALITYCHECK_MEAN)
+    assert statistics.count == 4
+    assert statistics.min == 10.0
+    assert statistics.max == 13.0
+    assert np.isclose(statistics.mean, np.mean(means))
+    assert np.isclose(statistics.get_variance(), np.var(means))
+    assert aggregate.get_statistics(const.QUALITYCHECK_SAT).sum == 4
+
+
+def test_stat_mean():
+    aggregate = Aggregate('data', quality_checks, None)
+    for i in range(5):
+        assert not run(aggregate, i, 10.0, 0).failed
+    results = run(aggregate, 5, 20.0, 0)
+    assert results.failed
+    assert 5 in aggregate.store.get_bad_indexes()
+
+
+def test_accumulated_saturation():
+    aggregate = Aggregate('data', quality_checks, None)
+    for i in range(3):
+        assert not run(aggregate, i, 10.0, 3).failed
+    results = run(aggregate, 3, 10.0, 3)
+    assert results.failed
+    assert results.results[-1].quality_id == const.ACC_SAT
+    assert results.results[-1].res == 12
+
+
+def test_all_statistical_checks():
+    # a frame failing both statistical checks has results of both
+    aggregate = Aggregate('data', quality_checks, None)
+    for i in range(3):
+        assert not run(aggregate, i, 10.0, 3).failed
+    results = run(aggregate, 3, 20.0, 3)
+    assert results.failed
+    assert [result.quality_id for result in results.results[-2:]] == [const.STAT_MEAN, const.ACC_SAT]
+    assert all(result.error != 0 for result in results.results[-2:])
+
+
+def test_reevaluate_check_error():
+    aggregate = Aggregate('data', quality_checks, None)
+    for i in range(3):
+        run(aggregate, i, 10.0, 0)
+    # the quality checks of frame 3 raised an error
+    error = Result(0.0, const.QUALITYCHECK_ERROR, const.QUALITYERROR_CHECK)
+    aggregate.handle_results(Results('data', 3, True, {const.QUALITYCHECK_ERROR : error}))
+    run(aggregate, 4, 200.0, 0)
+    assert aggregate.store.get_bad_indexes().tolist() == [3, 4]
+    index, check, value = aggregate.store.get_rows()[:3]
+    reevaluated = calc.reevaluate_results('data', limits, quality_checks, index, check, value)
+    assert reevaluated.store.get_bad_indexes().tolist() == [3, 4]
+
+
+def test_window():
+    aggregate = Aggregate('data', quality_checks, 3)
+    means = [10.0, 11.0, 12.0, 13.0, 14.0, 15.0, 16.0]
+    for i in range(len(means)):
+        assert not run(aggregate, i, means[i], 0).failed
+    statistics = aggregate.get_statistics(const.QUALITYCHECK_MEAN)
+    assert statistics.count == len(means)
+    assert np.isclose(statistics.get_mean(), 15.0)
+    assert np.isclose(statistics.get_variance(), np.var(means[-3:]))
+    assert aggregate.store.get_good_indexes().tolist() == [4, 5, 6]
+    assert len(aggregate.get_results(const.QUALITYCHECK_MEAN)) == 3
+
+
+def test_results_store():
+    store = ResultsStore(capacity=2)
+    for i in range(20):
+        results = get_results(i, float(i), 0)
+        results.failed = i % 7 == 3
+        store.add(results)
+    assert store.num_frames == 20
+    assert store.get_bad_indexes().tolist() == [3, 10, 17]
+    assert len(store.get_good_indexes()) == 17
+    assert store.is_failed([3, 4]).tolist() == [True, False]
+    index, check, value, error = store.get_rows([10])
+    assert index.tolist() == [10, 10]
+    assert check.tolist() == sorted([const.QUALITYCHECK_MEAN, const.QUALITYCHECK_SAT])
+    assert len(store.get_values(const.QUALITYCHECK_MEAN)) == 17
+
+
+def test_batch():
+    batch_limits = {'mean' : {'low_limit' : 0, 'high_limit' : 100},
+                    'std' : {'low_limit' : 0, 'high_limit' : 50},
+                    'sum' : {'low_limit' : 0, 'high_limit' : 10000},
+                    'sat' : {'low_limit' : 0, 'high_limit' : 150},
+                    'frame_sat' : {'low_limit' : 0, 'high_limit' : 3}}
+    checks = [const.QUALITYCHECK_MEAN, const.QUALITYCHECK_STD, const.QUALITYCHECK_SUM, const.QUALITYCHECK_SAT,
+              const.QUALITYCHECK_FRAME_SAT]
+    stack = np.random.RandomState(0).randint(0, 200, (6, 8, 8)).astype('uint16')
+    batchq = queue.Queue()
+    calc.run_batch_quality_checks(Data(const.DATA_STATUS_BATCH, stack, 'data'), 10, batchq, batch_limits, checks)
+    for i in range(stack.shape[0]):
+        frameq = queue.Queue()
+        calc.run_quality_checks(Data(const.DATA_STATUS_DATA, stack[i], 'data'), 10 + i, frameq, batch_limits, checks)
+        expected = frameq.get()
+        results = batchq.get()
+        assert results.index == expected.index
+        assert results.failed == expected.failed
+        for result, expected_result in zip(results.results, expected.results):
+            assert result.quality_id == expected_result.quality_id
+            assert result.error == expected_result.error
+            assert np.isclose(result.res, expected_result.res)
+    assert batchq.empty()
+
+
+def test_features():
+    frames = np.random.RandomState(1).randint(0, 1000, (3, 300, 250)).astype('uint16')
+    features = calc.calculate_features(frames, 900)
+    assert features.num_pixels == 300 * 250
+    assert np.array_equal(features.sum, frames.sum(axis=(1, 2)))
+    assert np.allclose(features.get_mean(), frames.mean(axis=(1, 2)))
+    assert np.allclose(features.get_std(), frames.std(axis=(1, 2)))
+    assert np.array_equal(features.min, frames.min(axis=(1, 2)))
+    assert np.array_equal(features.max, frames.max(axis=(1, 2)))
+    assert np.array_equal(features.sat, (frames > 900).sum(axis=(1, 2)))
+    assert calc.calculate_features(frames).sat is None
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from multiprocessing import Process
+import dquality.common.constants as const
+from dquality.common.containers import Data
+import dquality.common.transport as transport
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+def echo(inq, outq):
+    while True:
+        data = inq.get()
+        outq.put(data)
+        if data.status == const.DATA_STATUS_END:
+            break
+
+
+def test_data_pipe():
+    if not transport.is_supported():
+        return
+    inq = transport.DataPipe()
+    outq = transport.DataPipe()
+    p = Process(target=echo, args=(inq, outq))
+    p.start()
+    frames = [np.arange(512 * 512, dtype='uint16').reshape(512, 512) * i for i in range(3)]
+    # the put blocks until the frame is received, so each frame is read back before the next one is sent
+    for frame in frames:
+        inq.put(Data(const.DATA_STATUS_DATA, frame, 'data'))
+        data = outq.get(timeout=10)
+        assert data.type == 'data'
+        assert data.slice.flags.writeable
+        assert np.array_equal(data.slice, frame)
+    inq.put(Data(const.DATA_STATUS_END))
+    assert outq.get(timeout=10).status == const.DATA_STATUS_END
+    assert outq.empty()
+    with pytest.raises(queue.Empty):
+        outq.get_nowait()
+    with pytest.raises(queue.Empty):
+        outq.get(timeout=0.01)
+    p.join()
+
+
+def test_data_pipe_closed():
+    if not transport.is_supported():
+        return
+    pipe = transport.DataPipe()
+    # the sender closes the pipe after sending the header, before the frame buffer
+    pipe._writer.send((b'', [16]))
+    pipe._writer.close()
+    with pytest.raises(EOFError):
+        pipe.get(timeout=10)